@@ -7,6 +7,12 @@ from parsec.api.protocol.base import (
     packb,
     unpackb,
 )
+from parsec.api.protocol.multiplexing import (
+    MAX_REQ_ID,
+    MAX_CONCURRENT_MULTIPLEXED_REQUESTS,
+    pack_multiplexed_message,
+    unpack_multiplexed_message,
+)
 from parsec.api.protocol.types import (
     UserID,
     DeviceID,
@@ -103,10 +109,18 @@ from parsec.api.protocol.realm import (
     realm_start_reencryption_maintenance_serializer,
     realm_finish_reencryption_maintenance_serializer,
 )
-from parsec.api.protocol.block import block_create_serializer, block_read_serializer
+from parsec.api.protocol.block import (
+    BLOCK_READ_BATCH_MAX_SIZE,
+    block_create_serializer,
+    block_read_serializer,
+    block_read_batch_serializer,
+)
 from parsec.api.protocol.vlob import (
+    VLOB_READ_BATCH_MAX_SIZE,
+    VLOB_POLL_CHANGES_MAX_LIMIT,
     vlob_create_serializer,
     vlob_read_serializer,
+    vlob_read_batch_serializer,
     vlob_update_serializer,
     vlob_poll_changes_serializer,
     vlob_list_versions_serializer,
@@ -128,6 +142,10 @@ __all__ = (
     "InvalidMessageError",
     "packb",
     "unpackb",
+    "MAX_REQ_ID",
+    "MAX_CONCURRENT_MULTIPLEXED_REQUESTS",
+    "pack_multiplexed_message",
+    "unpack_multiplexed_message",
     "HandshakeError",
     "HandshakeFailedChallenge",
     "HandshakeBadAdministrationToken",
@@ -220,16 +238,21 @@ __all__ = (
     "realm_start_reencryption_maintenance_serializer",
     "realm_finish_reencryption_maintenance_serializer",
     # Vlob
+    "VLOB_READ_BATCH_MAX_SIZE",
+    "VLOB_POLL_CHANGES_MAX_LIMIT",
     "vlob_create_serializer",
     "vlob_read_serializer",
+    "vlob_read_batch_serializer",
     "vlob_update_serializer",
     "vlob_poll_changes_serializer",
     "vlob_list_versions_serializer",
     "vlob_maintenance_get_reencryption_batch_serializer",
     "vlob_maintenance_save_reencryption_batch_serializer",
     # Block
+    "BLOCK_READ_BATCH_MAX_SIZE",
     "block_create_serializer",
     "block_read_serializer",
+    "block_read_batch_serializer",
     # List of cmds
     "AUTHENTICATED_CMDS",
     "INVITED_CMDS",
@@ -1,10 +1,19 @@
 # Parsec Cloud (https://parsec.cloud) Copyright (c) AGPLv3 2019 Scille SAS
 
-from parsec.serde import fields
+from parsec.serde import fields, validate
 from parsec.api.protocol.base import BaseReqSchema, BaseRepSchema, CmdSerializer
 
 
-__all__ = ("block_create_serializer", "block_read_serializer")
+__all__ = (
+    "BLOCK_READ_BATCH_MAX_SIZE",
+    "block_create_serializer",
+    "block_read_serializer",
+    "block_read_batch_serializer",
+)
+
+
+# Maximum number of blocks that can be read with a single `block_read_batch` command
+BLOCK_READ_BATCH_MAX_SIZE = 100
 
 
 class BlockCreateReqSchema(BaseReqSchema):
@@ -29,3 +38,18 @@ class BlockReadRepSchema(BaseRepSchema):
 
 
 block_read_serializer = CmdSerializer(BlockReadReqSchema, BlockReadRepSchema)
+
+
+class BlockReadBatchReqSchema(BaseReqSchema):
+    realm_id = fields.UUID(required=True)
+    block_ids = fields.List(
+        fields.UUID(), required=True, validate=validate.Length(max=BLOCK_READ_BATCH_MAX_SIZE)
+    )
+
+
+class BlockReadBatchRepSchema(BaseRepSchema):
+    # Blocks not found in the realm are simply omitted
+    blocks = fields.Map(fields.UUID(), fields.Bytes(required=True), required=True)
+
+
+block_read_batch_serializer = CmdSerializer(BlockReadBatchReqSchema, BlockReadBatchRepSchema)
@@ -27,10 +27,12 @@ AUTHENTICATED_CMDS = {
     # Block
     "block_create",
     "block_read",
+    "block_read_batch",
     # Vlob
     "vlob_poll_changes",
     "vlob_create",
     "vlob_read",
+    "vlob_read_batch",
     "vlob_update",
     "vlob_list_versions",
     "vlob_maintenance_get_reencryption_batch",
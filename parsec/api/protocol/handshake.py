@@ -123,6 +123,8 @@ class HandshakeAuthenticatedAnswerSchema(BaseSchema):
     device_id = DeviceIDField(required=True)
     rvk = fields.VerifyKey(required=True)
     answer = fields.Bytes(required=True)
+    # Request-id based multiplexing of the messages (see `multiplexing.py`)
+    multiplexing = fields.Boolean(required=False)
 
 
 class HandshakeInvitedAnswerSchema(BaseSchema):
@@ -193,6 +195,7 @@ class HandshakeResultSchema(BaseSchema):
     handshake = fields.CheckedConstant("result", required=True)
     result = fields.String(required=True)
     help = fields.String(missing=None)
+    multiplexing = fields.Boolean(missing=False)
 
 
 handshake_result_serializer = serializer_factory(HandshakeResultSchema)
@@ -213,6 +216,9 @@ class ServerHandshake:
         self.client_api_version = None
         self.backend_api_version = None
 
+        # Set once the multiplexing has been accepted
+        self.multiplexing = False
+
         # State
         self.state = "stalled"
 
@@ -343,12 +349,21 @@ class ServerHandshake:
                 raise HandshakeFailedChallenge("Invalid answer signature") from exc
 
         self.state = "result"
-        return handshake_result_serializer.dumps({"handshake": "result", "result": "ok"})
+        result = {"handshake": "result", "result": "ok"}
+        # Only peers that asked for multiplexing know about this field
+        if self.answer_data.get("multiplexing"):
+            self.multiplexing = True
+            result["multiplexing"] = True
+        return handshake_result_serializer.dumps(result)
 
 
 class BaseClientHandshake:
     SUPPORTED_API_VERSIONS = None  # Overwritten by subclasses
 
+    # Whether multiplexing is requested, and then accepted by the backend
+    request_multiplexing = False
+    multiplexing = False
+
     def __init__(self):
         self.challenge_data = None
         self.backend_api_version = None
@@ -385,6 +400,8 @@ class BaseClientHandshake:
                     f"Bad `result` handshake: {data['result']} ({data['help']})"
                 )
 
+        self.multiplexing = self.request_multiplexing and data["multiplexing"]
+
 
 class AuthenticatedClientHandshake(BaseClientHandshake):
     SUPPORTED_API_VERSIONS = (API_V2_VERSION,)
@@ -397,26 +414,30 @@ class AuthenticatedClientHandshake(BaseClientHandshake):
         device_id: DeviceID,
         user_signkey: SigningKey,
         root_verify_key: VerifyKey,
+        multiplexing: bool = False,
     ):
         self.organization_id = organization_id
         self.device_id = device_id
         self.user_signkey = user_signkey
         self.root_verify_key = root_verify_key
+        self.request_multiplexing = multiplexing
 
     def process_challenge_req(self, req: bytes) -> bytes:
         self.load_challenge_req(req)
         answer = self.user_signkey.sign(self.challenge_data["challenge"])
-        return self.HANDSHAKE_ANSWER_SERIALIZER.dumps(
-            {
-                "handshake": "answer",
-                "type": self.HANDSHAKE_TYPE,
-                "client_api_version": self.client_api_version,
-                "organization_id": self.organization_id,
-                "device_id": self.device_id,
-                "rvk": self.root_verify_key,
-                "answer": answer,
-            }
-        )
+        data = {
+            "handshake": "answer",
+            "type": self.HANDSHAKE_TYPE,
+            "client_api_version": self.client_api_version,
+            "organization_id": self.organization_id,
+            "device_id": self.device_id,
+            "rvk": self.root_verify_key,
+            "answer": answer,
+        }
+        # Don't bother backends not aware of multiplexing
+        if self.request_multiplexing:
+            data["multiplexing"] = True
+        return self.HANDSHAKE_ANSWER_SERIALIZER.dumps(data)
 
 
 class APIV1_AuthenticatedClientHandshake(AuthenticatedClientHandshake):
@@ -0,0 +1,41 @@
+# Parsec Cloud (https://parsec.cloud) Copyright (c) AGPLv3 2019 Scille SAS
+
+import struct
+from typing import Tuple
+
+from parsec.api.protocol.base import MessageSerializationError
+
+
+__all__ = (
+    "MAX_REQ_ID",
+    "MAX_CONCURRENT_MULTIPLEXED_REQUESTS",
+    "pack_multiplexed_message",
+    "unpack_multiplexed_message",
+)
+
+
+# When multiplexing has been negotiated during the handshake, each message
+# is prefixed by the id of the request it belongs to. This allows multiple
+# requests to be in-flight on the same connection, the replies being sent
+# in any order. A request without payload cancels the in-flight request
+# with the same id (no reply is sent for it).
+_REQ_ID_HEADER = struct.Struct("!I")
+MAX_REQ_ID = 2 ** 32 - 1
+# Maximum number of requests the backend processes concurrently for a
+# multiplexed connection, hence the number of channels worth opening on it
+MAX_CONCURRENT_MULTIPLEXED_REQUESTS = 32
+
+
+def pack_multiplexed_message(req_id: int, raw: bytes) -> bytes:
+    return _REQ_ID_HEADER.pack(req_id) + raw
+
+
+def unpack_multiplexed_message(raw: bytes) -> Tuple[int, bytes]:
+    """
+    Raises:
+        MessageSerializationError
+    """
+    if len(raw) < _REQ_ID_HEADER.size:
+        raise MessageSerializationError("Missing request id in multiplexed message")
+    req_id, = _REQ_ID_HEADER.unpack_from(raw)
+    return req_id, raw[_REQ_ID_HEADER.size :]
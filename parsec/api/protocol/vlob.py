@@ -6,8 +6,11 @@ from parsec.api.protocol.types import DeviceIDField
 
 
 __all__ = (
+    "VLOB_READ_BATCH_MAX_SIZE",
+    "VLOB_POLL_CHANGES_MAX_LIMIT",
     "vlob_create_serializer",
     "vlob_read_serializer",
+    "vlob_read_batch_serializer",
     "vlob_update_serializer",
     "vlob_poll_changes_serializer",
     "vlob_list_versions_serializer",
@@ -18,6 +21,10 @@ __all__ = (
 
 _validate_version = validate.Range(min=1)
 
+# Maximum number of vlobs that can be read with a single `vlob_read_batch` command
+VLOB_READ_BATCH_MAX_SIZE = 1000
+VLOB_POLL_CHANGES_MAX_LIMIT = 1000
+
 
 class VlobCreateReqSchema(BaseReqSchema):
     realm_id = fields.UUID(required=True)
@@ -57,6 +64,33 @@ class VlobReadRepSchema(BaseRepSchema):
 vlob_read_serializer = CmdSerializer(VlobReadReqSchema, VlobReadRepSchema)
 
 
+class VlobReadBatchReqSchema(BaseReqSchema):
+    realm_id = fields.UUID(required=True)
+    encryption_revision = fields.Integer(required=True)
+    vlob_ids = fields.List(
+        fields.UUID(), required=True, validate=validate.Length(max=VLOB_READ_BATCH_MAX_SIZE)
+    )
+    # Read the versions at this timestamp instead of the last versions
+    timestamp = fields.DateTime(allow_none=True, missing=None)
+
+
+class VlobReadBatchItemSchema(BaseSchema):
+    vlob_id = fields.UUID(required=True)
+    version = fields.Integer(required=True, validate=_validate_version)
+    blob = fields.Bytes(required=True)
+    author = DeviceIDField(required=True)
+    timestamp = fields.DateTime(required=True)
+
+
+class VlobReadBatchRepSchema(BaseRepSchema):
+    # Vlobs not found in the realm (or without version at the given
+    # timestamp) are simply omitted
+    vlobs = fields.List(fields.Nested(VlobReadBatchItemSchema), required=True)
+
+
+vlob_read_batch_serializer = CmdSerializer(VlobReadBatchReqSchema, VlobReadBatchRepSchema)
+
+
 class VlobUpdateReqSchema(BaseReqSchema):
     encryption_revision = fields.Integer(required=True)
     vlob_id = fields.UUID(required=True)
@@ -75,11 +109,19 @@ vlob_update_serializer = CmdSerializer(VlobUpdateReqSchema, VlobUpdateRepSchema)
 class VlobPollChangesReqSchema(BaseReqSchema):
     realm_id = fields.UUID(required=True)
     last_checkpoint = fields.Integer(required=True)
+    # Without limit, all the changes since the checkpoint are returned
+    limit = fields.Integer(
+        allow_none=True,
+        missing=None,
+        validate=validate.Range(min=1, max=VLOB_POLL_CHANGES_MAX_LIMIT),
+    )
 
 
 class VlobPollChangesRepSchema(BaseRepSchema):
     changes = fields.Map(fields.UUID(), fields.Integer(required=True), required=True)
     current_checkpoint = fields.Integer(required=True)
+    # If set, changes after `current_checkpoint` are still to be polled
+    has_more = fields.Boolean(missing=False)
 
 
 vlob_poll_changes_serializer = CmdSerializer(VlobPollChangesReqSchema, VlobPollChangesRepSchema)
@@ -41,6 +41,13 @@ class Transport:
         self.logger = logger.bind(conn_id=self.conn_id)
         self._ws_events = ws.events()
         self._handshake = None
+        # Messages are prefixed by a request id once multiplexing has been
+        # negotiated during the handshake, see `parsec.api.protocol.multiplexing`
+        self.multiplexed = False
+        # Multiple tasks can send on a multiplexed transport
+        self._send_lock = trio.Lock()
+        # Keep the partially received message so `recv` can be cancelled safely
+        self._recv_data = bytearray()
 
     # Application handshake interface
     # TODO: Investigate a better place for providing an access to the peer API version
@@ -88,7 +95,8 @@ class Transport:
 
     async def _net_send(self, wsmsg):
         try:
-            await self.stream.send_all(self.ws.send(wsmsg))
+            async with self._send_lock:
+                await self.stream.send_all(self.ws.send(wsmsg))
 
         except BrokenResourceError as exc:
             raise TransportError(*exc.args) from exc
@@ -139,9 +147,10 @@ class Transport:
     async def aclose(self) -> None:
         try:
             try:
-                await self.stream.send_all(
-                    self.ws.send(CloseConnection(code=CloseReason.NORMAL_CLOSURE))
-                )
+                async with self._send_lock:
+                    await self.stream.send_all(
+                        self.ws.send(CloseConnection(code=CloseReason.NORMAL_CLOSURE))
+                    )
             except LocalProtocolError:
                 # TODO: exception occurs when ws.state is already closed...
                 pass
@@ -162,7 +171,6 @@ class Transport:
         Raises:
             TransportError
         """
-        data = bytearray()
         while True:
             if self.keepalive:
                 with trio.move_on_after(self.keepalive) as cancel_scope:
@@ -186,8 +194,9 @@ class Transport:
             elif isinstance(event, BytesMessage):
                 # TODO: check that data doesn't go over MAX_BIN_LEN (1 MB)
                 # Msgpack will refuse to unpack it so we should fail early on if that happens
-                data += event.data
+                self._recv_data += event.data
                 if event.message_finished:
+                    data, self._recv_data = self._recv_data, bytearray()
                     return data
 
             elif isinstance(event, Ping):
@@ -13,6 +13,9 @@ from parsec.api.transport import TransportError, TransportClosedByPeer, Transpor
 from parsec.api.protocol import (
     packb,
     unpackb,
+    pack_multiplexed_message,
+    unpack_multiplexed_message,
+    MAX_CONCURRENT_MULTIPLEXED_REQUESTS,
     ProtocolError,
     MessageSerializationError,
     InvalidMessageError,
@@ -28,6 +31,9 @@ from parsec.backend.postgresql import components_factory as postgresql_component
 
 logger = get_logger()
 
+# Maximum number of requests received but not yet replied for a multiplexed connection
+MAX_PENDING_MULTIPLEXED_REQUESTS = 4 * MAX_CONCURRENT_MULTIPLEXED_REQUESTS
+
 
 def _filter_binary_fields(data):
     return {k: v if not isinstance(v, bytes) else b"[...]" for k, v in data.items()}
@@ -153,7 +159,10 @@ class BackendApp:
                                 cancel_scope.cancel()
 
                         client_ctx.event_bus_ctx.connect(BackendEvent.USER_REVOKED, _on_revoked)
-                        await self._handle_client_loop(transport, client_ctx)
+                        try:
+                            await self._handle_client_loop(transport, client_ctx)
+                        finally:
+                            self.events.unsubscribe(client_ctx)
 
             elif isinstance(client_ctx, InvitedClientContext):
                 await self.invite.claimer_joined(
@@ -208,48 +217,93 @@ class BackendApp:
         # Retrieve the allowed commands according to api version and auth type
         api_cmds = self.apis[client_ctx.handshake_type]
 
+        if transport.multiplexed:
+            await self._handle_multiplexed_client_loop(transport, client_ctx, api_cmds)
+            return
+
         raw_req = None
         while True:
             # raw_req can be already defined if we received a new request
             # while processing a command
             raw_req = raw_req or await transport.recv()
-            req = unpackb(raw_req)
-            if get_log_level() <= LOG_LEVEL_DEBUG:
-                client_ctx.logger.debug("Request", req=_filter_binary_fields(req))
             try:
-                cmd = req.get("cmd", "<missing>")
-                if not isinstance(cmd, str):
-                    raise KeyError()
-
-                cmd_func = api_cmds[cmd]
-
-            except KeyError:
-                rep = {"status": "unknown_command", "reason": "Unknown command"}
+                rep = await self._process_request(client_ctx, api_cmds, raw_req)
 
-            else:
-                try:
-                    rep = await cmd_func(client_ctx, req)
-
-                except InvalidMessageError as exc:
-                    rep = {
-                        "status": "bad_message",
-                        "errors": exc.errors,
-                        "reason": "Invalid message.",
-                    }
-
-                except ProtocolError as exc:
-                    rep = {"status": "bad_message", "reason": str(exc)}
-
-                except CancelledByNewRequest as exc:
-                    # Long command handling such as message_get can be cancelled
-                    # when the peer send a new request
-                    raw_req = exc.new_raw_req
-                    continue
+            except CancelledByNewRequest as exc:
+                # Long command handling such as message_get can be cancelled
+                # when the peer send a new request
+                raw_req = exc.new_raw_req
+                continue
 
-            if get_log_level() <= LOG_LEVEL_DEBUG:
-                client_ctx.logger.debug("Response", rep=_filter_binary_fields(rep))
-            else:
-                client_ctx.logger.info("Request", cmd=cmd, status=rep["status"])
             raw_rep = packb(rep)
             await transport.send(raw_rep)
             raw_req = None
+
+    async def _handle_multiplexed_client_loop(self, transport, client_ctx, api_cmds):
+        # Requests are processed concurrently and replied in any order
+        limiter = trio.Semaphore(MAX_CONCURRENT_MULTIPLEXED_REQUESTS)
+        # Requests waiting for the limiter are bounded as well, but the loop
+        # keeps receiving until then so cancellations (which free up some
+        # room) are not stuck behind the waiting requests
+        pending_limiter = trio.Semaphore(MAX_PENDING_MULTIPLEXED_REQUESTS)
+        cancel_scopes = {}
+
+        async def _handle_request(req_id, raw_req, cancel_scope):
+            try:
+                rep = None
+                # Only the processing can be cancelled: interrupting the send
+                # would corrupt the connection for all the other requests
+                with cancel_scope:
+                    async with limiter:
+                        rep = await self._process_request(client_ctx, api_cmds, raw_req)
+                if rep is not None:
+                    await transport.send(pack_multiplexed_message(req_id, packb(rep)))
+            finally:
+                if cancel_scopes.get(req_id) is cancel_scope:
+                    del cancel_scopes[req_id]
+                pending_limiter.release()
+
+        async with trio.open_service_nursery() as nursery:
+            while True:
+                req_id, raw_req = unpack_multiplexed_message(await transport.recv())
+
+                # Empty request means the peer is no longer interested in the reply
+                if not raw_req:
+                    cancel_scope = cancel_scopes.pop(req_id, None)
+                    if cancel_scope:
+                        cancel_scope.cancel()
+                    continue
+
+                await pending_limiter.acquire()
+                cancel_scope = cancel_scopes[req_id] = trio.CancelScope()
+                nursery.start_soon(_handle_request, req_id, raw_req, cancel_scope)
+
+    async def _process_request(self, client_ctx, api_cmds, raw_req):
+        req = unpackb(raw_req)
+        if get_log_level() <= LOG_LEVEL_DEBUG:
+            client_ctx.logger.debug("Request", req=_filter_binary_fields(req))
+        try:
+            cmd = req.get("cmd", "<missing>")
+            if not isinstance(cmd, str):
+                raise KeyError()
+
+            cmd_func = api_cmds[cmd]
+
+        except KeyError:
+            rep = {"status": "unknown_command", "reason": "Unknown command"}
+
+        else:
+            try:
+                rep = await cmd_func(client_ctx, req)
+
+            except InvalidMessageError as exc:
+                rep = {"status": "bad_message", "errors": exc.errors, "reason": "Invalid message."}
+
+            except ProtocolError as exc:
+                rep = {"status": "bad_message", "reason": str(exc)}
+
+        if get_log_level() <= LOG_LEVEL_DEBUG:
+            client_ctx.logger.debug("Response", rep=_filter_binary_fields(rep))
+        else:
+            client_ctx.logger.info("Request", cmd=cmd, status=rep["status"])
+        return rep
@@ -1,9 +1,14 @@
 # Parsec Cloud (https://parsec.cloud) Copyright (c) AGPLv3 2019 Scille SAS
 
 from uuid import UUID
-
-from parsec.api.protocol import DeviceID, OrganizationID
-from parsec.api.protocol import block_create_serializer, block_read_serializer
+from typing import Dict, List
+
+from parsec.api.protocol import DeviceID, OrganizationID, HandshakeType
+from parsec.api.protocol import (
+    block_create_serializer,
+    block_read_serializer,
+    block_read_batch_serializer,
+)
 from parsec.backend.utils import catch_protocol_errors, api
 
 
@@ -54,6 +59,28 @@ class BaseBlockComponent:
 
         return block_read_serializer.rep_dump({"status": "ok", "block": block})
 
+    @api("block_read_batch", handshake_types=[HandshakeType.AUTHENTICATED])
+    @catch_protocol_errors
+    async def api_block_read_batch(self, client_ctx, msg):
+        msg = block_read_batch_serializer.req_load(msg)
+
+        try:
+            blocks = await self.read_batch(client_ctx.organization_id, client_ctx.device_id, **msg)
+
+        except BlockNotFoundError:
+            return block_read_batch_serializer.rep_dump({"status": "not_found"})
+
+        except BlockTimeoutError:
+            return block_read_batch_serializer.rep_dump({"status": "timeout"})
+
+        except BlockAccessError:
+            return block_read_batch_serializer.rep_dump({"status": "not_allowed"})
+
+        except BlockInMaintenanceError:
+            return block_read_batch_serializer.rep_dump({"status": "in_maintenance"})
+
+        return block_read_batch_serializer.rep_dump({"status": "ok", "blocks": blocks})
+
     @api("block_create")
     @catch_protocol_errors
     async def api_block_create(self, client_ctx, msg):
@@ -91,6 +118,24 @@ class BaseBlockComponent:
         """
         raise NotImplementedError()
 
+    async def read_batch(
+        self,
+        organization_id: OrganizationID,
+        author: DeviceID,
+        realm_id: UUID,
+        block_ids: List[UUID],
+    ) -> Dict[UUID, bytes]:
+        """
+        Blocks not part of the realm are not returned.
+
+        Raises:
+            BlockNotFoundError: if the realm doesn't exist
+            BlockTimeoutError
+            BlockAccessError
+            BlockInMaintenanceError
+        """
+        raise NotImplementedError()
+
     async def create(
         self,
         organization_id: OrganizationID,
@@ -1,9 +1,16 @@
 # Parsec Cloud (https://parsec.cloud) Copyright (c) AGPLv3 2019 Scille SAS
 
+import trio
 from uuid import UUID
+from typing import Dict, Iterable
 
 from parsec.api.protocol import OrganizationID
 from parsec.backend.config import BaseBlockStoreConfig
+from parsec.backend.block import BlockNotFoundError
+
+
+# Maximum number of concurrent reads performed by `BaseBlockStoreComponent.read_many`
+MAX_CONCURRENT_BLOCK_READS = 8
 
 
 class BaseBlockStoreComponent:
@@ -15,6 +22,31 @@ class BaseBlockStoreComponent:
         """
         raise NotImplementedError()
 
+    async def read_many(
+        self, organization_id: OrganizationID, ids: Iterable[UUID]
+    ) -> Dict[UUID, bytes]:
+        """
+        Blocks not found are not returned.
+
+        Raises:
+            BlockTimeoutError
+        """
+        blocks = {}
+        limiter = trio.CapacityLimiter(MAX_CONCURRENT_BLOCK_READS)
+
+        async def _read(id):
+            async with limiter:
+                try:
+                    blocks[id] = await self.read(organization_id, id)
+                except BlockNotFoundError:
+                    pass
+
+        async with trio.open_service_nursery() as nursery:
+            for id in ids:
+                nursery.start_soon(_read, id)
+
+        return blocks
+
     async def create(self, organization_id: OrganizationID, id: UUID, block: bytes) -> None:
         """
         Raises:
@@ -25,9 +57,15 @@ class BaseBlockStoreComponent:
 
 
 def blockstore_factory(
-    config: BaseBlockStoreConfig, postgresql_dbh=None
+    config: BaseBlockStoreConfig, postgresql_dbh=None, cache_size: int = 0
 ) -> BaseBlockStoreComponent:
-    if config.type == "MOCKED":
+    if cache_size:
+        from parsec.backend.cached_blockstore import CachedBlockStoreComponent
+
+        blockstore = blockstore_factory(config, postgresql_dbh)
+        return CachedBlockStoreComponent(blockstore, cache_size)
+
+    elif config.type == "MOCKED":
         from parsec.backend.memory import MemoryBlockStoreComponent
 
         return MemoryBlockStoreComponent()
@@ -49,6 +87,8 @@ def blockstore_factory(
                 config.s3_key,
                 config.s3_secret,
                 config.s3_endpoint_url,
+                config.s3_max_pool_connections,
+                config.s3_max_concurrency,
             )
         except ImportError as exc:
             raise ValueError("S3 block store is not available") from exc
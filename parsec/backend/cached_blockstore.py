@@ -0,0 +1,85 @@
+# Parsec Cloud (https://parsec.cloud) Copyright (c) AGPLv3 2019 Scille SAS
+
+from uuid import UUID
+from typing import Tuple
+from collections import OrderedDict
+from structlog import get_logger
+
+from parsec.api.protocol import OrganizationID
+from parsec.backend.blockstore import BaseBlockStoreComponent
+
+
+logger = get_logger()
+
+# Cache statistics are logged every `CACHE_STATS_LOG_INTERVAL` reads
+CACHE_STATS_LOG_INTERVAL = 1000
+
+
+class CachedBlockStoreComponent(BaseBlockStoreComponent):
+    """
+    Keep the most recently used blocks in memory, up to `max_size` bytes.
+
+    Blocks are immutable so cached data never needs to be invalidated. Note
+    this only caches the block data: access rights are checked by the block
+    component before the blockstore is reached. Blocks are only cached once
+    read, given a block being created can still be rejected by the block
+    component after the upload.
+    """
+
+    def __init__(self, blockstore: BaseBlockStoreComponent, max_size: int):
+        self.blockstore = blockstore
+        self.max_size = max_size
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._cache: "OrderedDict[Tuple[OrganizationID, UUID], bytes]" = OrderedDict()
+
+    @property
+    def hit_ratio(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def stats(self) -> dict:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hit_ratio,
+            "evictions": self.evictions,
+            "size": self.size,
+            "max_size": self.max_size,
+        }
+
+    def _cache_block(self, key: Tuple[OrganizationID, UUID], block: bytes) -> None:
+        if len(block) > self.max_size or key in self._cache:
+            return
+        self._cache[key] = block
+        self.size += len(block)
+        while self.size > self.max_size:
+            _, evicted = self._cache.popitem(last=False)
+            self.size -= len(evicted)
+            self.evictions += 1
+
+    def _log_stats(self) -> None:
+        if (self.hits + self.misses) % CACHE_STATS_LOG_INTERVAL == 0:
+            logger.info("Blockstore cache stats", **self.stats())
+
+    async def read(self, organization_id: OrganizationID, id: UUID) -> bytes:
+        key = (organization_id, id)
+        try:
+            block = self._cache[key]
+        except KeyError:
+            self.misses += 1
+            self._log_stats()
+        else:
+            self.hits += 1
+            self._log_stats()
+            self._cache.move_to_end(key)
+            return block
+
+        block = await self.blockstore.read(organization_id, id)
+        self._cache_block(key, block)
+        return block
+
+    async def create(self, organization_id: OrganizationID, id: UUID, block: bytes) -> None:
+        await self.blockstore.create(organization_id, id, block)
@@ -1,8 +1,12 @@
 # Parsec Cloud (https://parsec.cloud) Copyright (c) AGPLv3 2019 Scille SAS
 
+import os
 import ssl
 import trio
 import click
+import socket
+import multiprocessing
+from multiprocessing.connection import wait as wait_for_processes
 from structlog import get_logger
 from itertools import count
 from collections import defaultdict
@@ -21,6 +25,7 @@ from parsec.backend.config import (
     RAID0BlockStoreConfig,
     RAID1BlockStoreConfig,
     RAID5BlockStoreConfig,
+    BaseBlockStoreConfig,
 )
 from parsec.core.types import BackendAddr
 
@@ -179,6 +184,137 @@ class DevOption(click.Option):
         return value, args
 
 
+def _is_blockstore_process_local(config: BaseBlockStoreConfig) -> bool:
+    if isinstance(config, MockedBlockStoreConfig):
+        return True
+    return any(_is_blockstore_process_local(x) for x in getattr(config, "blockstores", ()))
+
+
+def _create_ssl_context(ssl_keyfile, ssl_certfile):
+    if not ssl_certfile and not ssl_keyfile:
+        return None
+    ssl_context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+    if ssl_certfile:
+        ssl_context.load_cert_chain(ssl_certfile, ssl_keyfile)
+    else:
+        ssl_context.load_default_certs()
+    return ssl_context
+
+
+def _open_listen_sockets(host, port):
+    # Mimic what `trio.open_tcp_listeners` does, but with regular sockets
+    # so they can be shared with the worker processes
+    addresses = socket.getaddrinfo(
+        host, port, type=socket.SOCK_STREAM, flags=socket.AI_PASSIVE | socket.AI_ADDRCONFIG
+    )
+    sockets = []
+    try:
+        for family, type, proto, _, sockaddr in addresses:
+            sock = socket.socket(family, type, proto)
+            sockets.append(sock)
+            if os.name != "nt":
+                sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            if family == socket.AF_INET6:
+                sock.setsockopt(socket.IPPROTO_IPV6, socket.IPV6_V6ONLY, 1)
+            sock.bind(sockaddr)
+            sock.listen(socket.SOMAXCONN)
+    except OSError:
+        for sock in sockets:
+            sock.close()
+        raise
+    return sockets
+
+
+async def _run_backend(host, port, ssl_context, config, listen_sockets=None):
+    async with backend_app_factory(config=config) as backend:
+
+        async def _serve_client(stream):
+            if ssl_context:
+                stream = trio.SSLStream(stream, ssl_context, server_side=True)
+
+            try:
+                await backend.handle_client(stream)
+
+            except Exception:
+                # If we are here, something unexpected happened...
+                logger.exception("Unexpected crash")
+                await stream.aclose()
+
+        if listen_sockets is None:
+            await trio.serve_tcp(_serve_client, port, host=host)
+        else:
+            listeners = [
+                trio.SocketListener(trio.socket.from_stdlib_socket(sock)) for sock in listen_sockets
+            ]
+            await trio.serve_listeners(_serve_client, listeners)
+
+
+def _run_worker(
+    listen_sockets,
+    config,
+    ssl_keyfile,
+    ssl_certfile,
+    log_level,
+    log_format,
+    log_file,
+    log_filter,
+    sentry_url,
+    debug,
+):
+    # Worker processes are spawned, hence start from a blank state
+    configure_logging(log_level, log_format, log_file, log_filter)
+    if sentry_url:
+        configure_sentry_logging(sentry_url)
+
+    with cli_exception_handler(debug):
+        ssl_context = _create_ssl_context(ssl_keyfile, ssl_certfile)
+        try:
+            trio_run(
+                _run_backend, None, None, ssl_context, config, listen_sockets, use_asyncio=True
+            )
+        except KeyboardInterrupt:
+            # Ctrl-C is also received by the main process which takes care of the goodbye
+            pass
+
+
+def _run_workers(workers, host, port, worker_args):
+    """
+    Run `workers` backend processes accepting connections on the same listening
+    sockets. Each process has its own PostgreSQL connections and events are
+    dispatched between them through PostgreSQL's LISTEN/NOTIFY.
+    """
+    listen_sockets = _open_listen_sockets(host, port)
+    # Spawn is the only start method available on all platforms
+    mp_context = multiprocessing.get_context("spawn")
+    processes = [
+        mp_context.Process(
+            target=_run_worker,
+            args=(listen_sockets, *worker_args),
+            name=f"parsec-backend-worker-{x}",
+        )
+        for x in range(workers)
+    ]
+    try:
+        for process in processes:
+            process.start()
+        # Stop everything as soon as a worker stops
+        wait_for_processes([process.sentinel for process in processes])
+
+    finally:
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+        for process in processes:
+            if process.pid is not None:
+                process.join()
+        for sock in listen_sockets:
+            sock.close()
+
+    exitcodes = [process.exitcode for process in processes]
+    if any(exitcodes):
+        raise RuntimeError(f"Backend worker has stopped unexpectedly (exit codes: {exitcodes})")
+
+
 @click.command(short_help="run the server", context_settings={"max_content_width": 400})
 @click.option(
     "--host",
@@ -197,6 +333,19 @@ class DevOption(click.Option):
     envvar="PARSEC_PORT",
     help="Port to listen on",
 )
+@click.option(
+    "--workers",
+    "-w",
+    default=1,
+    type=click.IntRange(min=1),
+    show_default=True,
+    envvar="PARSEC_WORKERS",
+    help=(
+        "Number of backend processes serving the clients on the same port"
+        " (requires a PostgreSQL database and a non-MOCKED blockstore,"
+        " note each process has its own pool of database connections)"
+    ),
+)
 @click.option(
     "--db",
     required=True,
@@ -253,6 +402,14 @@ Each configuration must be provided with the form
 integer and `<config>` the MOCKED/POSTGRESQL/S3/SWIFT config.
 """,
 )
+@click.option(
+    "--blockstore-cache-size",
+    default=0,
+    type=int,
+    show_default=True,
+    envvar="PARSEC_BLOCKSTORE_CACHE_SIZE",
+    help="Size (in bytes) of the in-memory cache of the most recently read blocks (0 to disable)",
+)
 @click.option(
     "--administration-token",
     required=True,
@@ -353,11 +510,13 @@ integer and `<config>` the MOCKED/POSTGRESQL/S3/SWIFT config.
 def run_cmd(
     host,
     port,
+    workers,
     db,
     db_drop_deleted_data,
     db_min_connections,
     db_max_connections,
     blockstore,
+    blockstore_cache_size,
     administration_token,
     backend_addr,
     email_host,
@@ -383,14 +542,7 @@ def run_cmd(
 
     with cli_exception_handler(debug):
 
-        if ssl_certfile or ssl_keyfile:
-            ssl_context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
-            if ssl_certfile:
-                ssl_context.load_cert_chain(ssl_certfile, ssl_keyfile)
-            else:
-                ssl_context.load_default_certs()
-        else:
-            ssl_context = None
+        ssl_context = _create_ssl_context(ssl_keyfile, ssl_certfile)
 
         if email_host:
             if not email_host_user:
@@ -414,33 +566,38 @@ def run_cmd(
             db_min_connections=db_min_connections,
             db_max_connections=db_max_connections,
             blockstore_config=blockstore,
+            blockstore_cache_size=blockstore_cache_size,
             email_config=email_config,
             backend_addr=backend_addr,
             debug=debug,
         )
 
-        async def _run_backend():
-            async with backend_app_factory(config=config) as backend:
-
-                async def _serve_client(stream):
-                    if ssl_context:
-                        stream = trio.SSLStream(stream, ssl_context, server_side=True)
-
-                    try:
-                        await backend.handle_client(stream)
-
-                    except Exception:
-                        # If we are here, something unexpected happened...
-                        logger.exception("Unexpected crash")
-                        await stream.aclose()
-
-                await trio.serve_tcp(_serve_client, port, host=host)
+        if workers > 1:
+            # Each worker would have its own in-memory data
+            if config.db_type == "MOCKED":
+                raise ValueError("--workers requires a PostgreSQL database")
+            if _is_blockstore_process_local(config.blockstore_config):
+                raise ValueError("--workers is not compatible with MOCKED blockstore")
 
         click.echo(
             f"Starting Parsec Backend on {host}:{port} (db={config.db_type}, "
-            f"blockstore={config.blockstore_config.type})"
+            f"blockstore={config.blockstore_config.type}, workers={workers})"
         )
         try:
-            trio_run(_run_backend, use_asyncio=True)
+            if workers > 1:
+                worker_args = (
+                    config,
+                    ssl_keyfile,
+                    ssl_certfile,
+                    log_level,
+                    log_format,
+                    log_file,
+                    log_filter,
+                    sentry_url,
+                    debug,
+                )
+                _run_workers(workers, host, port, worker_args)
+            else:
+                trio_run(_run_backend, host, port, ssl_context, config, use_asyncio=True)
         except KeyboardInterrupt:
             click.echo("bye ;-)")
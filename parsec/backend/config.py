@@ -10,6 +10,10 @@ class BaseBlockStoreConfig:
     pass
 
 
+DEFAULT_S3_MAX_POOL_CONNECTIONS = 32
+DEFAULT_S3_MAX_CONCURRENCY = 32
+
+
 @attr.s(frozen=True, auto_attribs=True)
 class RAID0BlockStoreConfig(BaseBlockStoreConfig):
     type = "RAID0"
@@ -40,6 +44,10 @@ class S3BlockStoreConfig(BaseBlockStoreConfig):
     s3_bucket: str
     s3_key: str
     s3_secret: str
+    # Size of the HTTP connection pool shared by the requests
+    s3_max_pool_connections: int = DEFAULT_S3_MAX_POOL_CONNECTIONS
+    # Maximum number of requests running concurrently (each one uses a worker thread)
+    s3_max_concurrency: int = DEFAULT_S3_MAX_CONCURRENCY
 
 
 @attr.s(frozen=True, auto_attribs=True)
@@ -91,6 +99,9 @@ class BackendConfig:
 
     debug: bool
 
+    # Size (in bytes) of the in-memory cache of the most recently read blocks
+    blockstore_cache_size: int = 0
+
     @property
     def db_type(self):
         if self.db_url.upper() == "MOCKED":
@@ -1,127 +1,169 @@
 # Parsec Cloud (https://parsec.cloud) Copyright (c) AGPLv3 2019 Scille SAS
 
 import trio
-
-from parsec.api.protocol import events_subscribe_serializer, events_listen_serializer, APIEvent
+from uuid import UUID
+from typing import Dict, Set, Tuple, Iterable, Union
+from functools import partial
+from collections import defaultdict
+
+from parsec.event_bus import EventBus, EventBusConnectionContext
+from parsec.api.protocol import (
+    OrganizationID,
+    UserID,
+    events_subscribe_serializer,
+    events_listen_serializer,
+    APIEvent,
+)
 from parsec.backend.utils import catch_protocol_errors, run_with_breathing_transport, api
 from parsec.backend.realm import BaseRealmComponent
 from parsec.backend.backend_events import BackendEvent
-from functools import partial
+from parsec.backend.client_context import AuthenticatedClientContext
 
 
 class EventsComponent:
-    def __init__(self, realm_component: BaseRealmComponent):
+    """
+    Route the backend events to the clients that subscribed to them.
+
+    Instead of having each subscribed client connecting its own callbacks to
+    the event bus (hence each event being processed by every connected
+    client), a single callback per event type is connected and the clients
+    are indexed by the organization/user/realm they are interested in.
+
+    The callbacks are never disconnected by the component itself, hence the
+    caller should provide an event bus connection context to stay in control
+    of their lifetime.
+    """
+
+    def __init__(
+        self,
+        realm_component: BaseRealmComponent,
+        event_bus: Union[EventBus, EventBusConnectionContext],
+    ):
         self._realm_component = realm_component
-
-    @api("events_subscribe")
-    @catch_protocol_errors
-    async def api_events_subscribe(self, client_ctx, msg):
-        msg = events_subscribe_serializer.req_load(msg)
-
-        def _on_roles_updated(event, backend_event, organization_id, author, realm_id, user, role):
-            if organization_id != client_ctx.organization_id or user != client_ctx.user_id:
-                return
-
+        self._organization_subscribers: Dict[
+            OrganizationID, Set[AuthenticatedClientContext]
+        ] = defaultdict(set)
+        self._user_subscribers: Dict[
+            Tuple[OrganizationID, UserID], Set[AuthenticatedClientContext]
+        ] = defaultdict(set)
+        self._realm_subscribers: Dict[
+            Tuple[OrganizationID, UUID], Set[AuthenticatedClientContext]
+        ] = defaultdict(set)
+
+        event_bus.connect(BackendEvent.PINGED, self._on_pinged)
+        event_bus.connect(
+            BackendEvent.REALM_VLOBS_UPDATED,
+            partial(self._on_realm_events, APIEvent.REALM_VLOBS_UPDATED),
+        )
+        event_bus.connect(
+            BackendEvent.REALM_MAINTENANCE_STARTED,
+            partial(self._on_realm_events, APIEvent.REALM_MAINTENANCE_STARTED),
+        )
+        event_bus.connect(
+            BackendEvent.REALM_MAINTENANCE_FINISHED,
+            partial(self._on_realm_events, APIEvent.REALM_MAINTENANCE_FINISHED),
+        )
+        event_bus.connect(BackendEvent.MESSAGE_RECEIVED, self._on_message_received)
+        event_bus.connect(BackendEvent.INVITE_STATUS_CHANGED, self._on_invite_status_changed)
+        event_bus.connect(BackendEvent.REALM_ROLES_UPDATED, self._on_roles_updated)
+
+    def _send_event(self, client_ctx: AuthenticatedClientContext, event_data: dict) -> None:
+        try:
+            client_ctx.send_events_channel.send_nowait(event_data)
+        except trio.WouldBlock:
+            client_ctx.logger.warning(f"event queue is full for {client_ctx}")
+
+    def _subscribe_realm(self, client_ctx: AuthenticatedClientContext, realm_id: UUID) -> None:
+        client_ctx.realms.add(realm_id)
+        self._realm_subscribers[(client_ctx.organization_id, realm_id)].add(client_ctx)
+
+    def _unsubscribe_realm(self, client_ctx: AuthenticatedClientContext, realm_id: UUID) -> None:
+        client_ctx.realms.discard(realm_id)
+        key = (client_ctx.organization_id, realm_id)
+        subscribers = self._realm_subscribers.get(key)
+        if subscribers is not None:
+            subscribers.discard(client_ctx)
+            if not subscribers:
+                del self._realm_subscribers[key]
+
+    def _set_realms(self, client_ctx: AuthenticatedClientContext, realms: Iterable[UUID]) -> None:
+        for realm_id in list(client_ctx.realms):
+            self._unsubscribe_realm(client_ctx, realm_id)
+        for realm_id in realms:
+            self._subscribe_realm(client_ctx, realm_id)
+
+    def unsubscribe(self, client_ctx: AuthenticatedClientContext) -> None:
+        """
+        Stop routing events to the client, must be called once it has disconnected.
+        """
+        self._set_realms(client_ctx, ())
+        for index, key in (
+            (self._organization_subscribers, client_ctx.organization_id),
+            (self._user_subscribers, (client_ctx.organization_id, client_ctx.user_id)),
+        ):
+            subscribers = index.get(key)
+            if subscribers is not None:
+                subscribers.discard(client_ctx)
+                if not subscribers:
+                    del index[key]
+
+    def _on_roles_updated(self, event, organization_id, author, realm_id, user, role):
+        for client_ctx in self._user_subscribers.get((organization_id, user), ()):
             if role is None:
-                client_ctx.realms.discard(realm_id)
+                self._unsubscribe_realm(client_ctx, realm_id)
             else:
-                client_ctx.realms.add(realm_id)
+                self._subscribe_realm(client_ctx, realm_id)
 
             # Note for this event we don't filter out the ones sent by the client's
             # device, there is two reason for this:
             # 1) A user cannot change it own role, so this case should never occur
             # 2) Returning this event inform the peer we are ready to send it
             #    `realm.vlobs_updated` events on this realm (especially useful during tests)
-            try:
-                client_ctx.send_events_channel.send_nowait(
-                    {"event": event, "realm_id": realm_id, "role": role}
-                )
-            except trio.WouldBlock:
-                client_ctx.logger.warning(f"event queue is full for {client_ctx}")
-
-        def _on_pinged(event, backend_event, organization_id, author, ping):
-            if organization_id != client_ctx.organization_id or author == client_ctx.device_id:
-                return
-
-            try:
-                client_ctx.send_events_channel.send_nowait({"event": event, "ping": ping})
-            except trio.WouldBlock:
-                client_ctx.logger.warning(f"event queue is full for {client_ctx}")
-
-        def _on_realm_events(event, backend_event, organization_id, author, realm_id, **kwargs):
-            if (
-                organization_id != client_ctx.organization_id
-                or author == client_ctx.device_id
-                or realm_id not in client_ctx.realms
-            ):
-                return
-
-            try:
-                client_ctx.send_events_channel.send_nowait(
-                    {"event": event, "realm_id": realm_id, **kwargs}
-                )
-            except trio.WouldBlock:
-                client_ctx.logger.warning(f"event queue is full for {client_ctx}")
-
-        def _on_message_received(event, backend_event, organization_id, author, recipient, index):
-            if organization_id != client_ctx.organization_id or recipient != client_ctx.user_id:
-                return
-
-            try:
-                client_ctx.send_events_channel.send_nowait({"event": event, "index": index})
-            except trio.WouldBlock:
-                client_ctx.logger.warning(f"event queue is full for {client_ctx}")
-
-        def _on_invite_status_changed(
-            event, backend_event, organization_id, greeter, token, status
-        ):
-            print("EVENT STATUS CHANGED ====>", organization_id, greeter, token, status)
-            if organization_id != client_ctx.organization_id or greeter != client_ctx.user_id:
-                return
-
-            try:
-                client_ctx.send_events_channel.send_nowait(
-                    {"event": event, "token": token, "invitation_status": status}
-                )
-            except trio.WouldBlock:
-                client_ctx.logger.warning(f"event queue is full for {client_ctx}")
+            self._send_event(
+                client_ctx,
+                {"event": APIEvent.REALM_ROLES_UPDATED, "realm_id": realm_id, "role": role},
+            )
 
-        # Drop previous event callbacks if any
-        client_ctx.event_bus_ctx.clear()
+    def _on_pinged(self, event, organization_id, author, ping):
+        for client_ctx in self._organization_subscribers.get(organization_id, ()):
+            if author != client_ctx.device_id:
+                self._send_event(client_ctx, {"event": APIEvent.PINGED, "ping": ping})
+
+    def _on_realm_events(self, api_event, event, organization_id, author, realm_id, **kwargs):
+        for client_ctx in self._realm_subscribers.get((organization_id, realm_id), ()):
+            if author != client_ctx.device_id:
+                self._send_event(client_ctx, {"event": api_event, "realm_id": realm_id, **kwargs})
+
+    def _on_message_received(self, event, organization_id, author, recipient, index):
+        for client_ctx in self._user_subscribers.get((organization_id, recipient), ()):
+            self._send_event(client_ctx, {"event": APIEvent.MESSAGE_RECEIVED, "index": index})
+
+    def _on_invite_status_changed(self, event, organization_id, greeter, token, status):
+        for client_ctx in self._user_subscribers.get((organization_id, greeter), ()):
+            self._send_event(
+                client_ctx,
+                {
+                    "event": APIEvent.INVITE_STATUS_CHANGED,
+                    "token": token,
+                    "invitation_status": status,
+                },
+            )
 
-        # Connect the new callbacks
-        client_ctx.event_bus_ctx.connect(BackendEvent.PINGED, partial(_on_pinged, APIEvent.PINGED))
-        client_ctx.event_bus_ctx.connect(
-            BackendEvent.REALM_VLOBS_UPDATED,
-            partial(_on_realm_events, APIEvent.REALM_VLOBS_UPDATED),
-        )
-        client_ctx.event_bus_ctx.connect(
-            BackendEvent.REALM_MAINTENANCE_STARTED,
-            partial(_on_realm_events, APIEvent.REALM_MAINTENANCE_STARTED),
-        )
-        client_ctx.event_bus_ctx.connect(
-            BackendEvent.REALM_MAINTENANCE_FINISHED,
-            partial(_on_realm_events, APIEvent.REALM_MAINTENANCE_FINISHED),
-        )
-        client_ctx.event_bus_ctx.connect(
-            BackendEvent.MESSAGE_RECEIVED, partial(_on_message_received, APIEvent.MESSAGE_RECEIVED)
-        )
-        client_ctx.event_bus_ctx.connect(
-            BackendEvent.INVITE_STATUS_CHANGED,
-            partial(_on_invite_status_changed, APIEvent.INVITE_STATUS_CHANGED),
-        )
+    @api("events_subscribe")
+    @catch_protocol_errors
+    async def api_events_subscribe(self, client_ctx, msg):
+        msg = events_subscribe_serializer.req_load(msg)
 
-        # Final event to keep up to date the list of realm we should listen on
-        client_ctx.event_bus_ctx.connect(
-            BackendEvent.REALM_ROLES_UPDATED,
-            partial(_on_roles_updated, APIEvent.REALM_ROLES_UPDATED),
-        )
+        # Subscribing multiple times has no effect given indexes are sets
+        self._organization_subscribers[client_ctx.organization_id].add(client_ctx)
+        # Subscribing to the user also keeps up to date the list of realm we should listen on
+        self._user_subscribers[(client_ctx.organization_id, client_ctx.user_id)].add(client_ctx)
 
         # Finally populate the list of realm we should listen on
         realms_for_user = await self._realm_component.get_realms_for_user(
             client_ctx.organization_id, client_ctx.user_id
         )
-        client_ctx.realms = set(realms_for_user.keys())
+        self._set_realms(client_ctx, realms_for_user.keys())
 
         return events_subscribe_serializer.rep_dump({"status": "ok"})
 
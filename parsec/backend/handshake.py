@@ -65,6 +65,7 @@ async def do_handshake(
         error_infos = {"reason": str(exc), "handshake_type": handshake.answer_type}
 
     await transport.send(result_req)
+    transport.multiplexed = handshake.multiplexing
 
     return context, error_infos
 
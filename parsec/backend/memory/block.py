@@ -1,6 +1,7 @@
 # Parsec Cloud (https://parsec.cloud) Copyright (c) AGPLv3 2019 Scille SAS
 
 from uuid import UUID
+from typing import Dict, List
 import attr
 
 from parsec.api.protocol import DeviceID, OrganizationID
@@ -72,6 +73,22 @@ class MemoryBlockComponent(BaseBlockComponent):
 
         return await self._blockstore_component.read(organization_id, block_id)
 
+    async def read_batch(
+        self,
+        organization_id: OrganizationID,
+        author: DeviceID,
+        realm_id: UUID,
+        block_ids: List[UUID],
+    ) -> Dict[UUID, bytes]:
+        self._check_realm_read_access(organization_id, realm_id, author.user_id)
+
+        realm_block_ids = []
+        for block_id in block_ids:
+            blockmeta = self._blockmetas.get((organization_id, block_id))
+            if blockmeta and blockmeta.realm_id == realm_id:
+                realm_block_ids.append(block_id)
+        return await self._blockstore_component.read_many(organization_id, realm_block_ids)
+
     async def create(
         self,
         organization_id: OrganizationID,
@@ -38,8 +38,12 @@ async def components_factory(config: BackendConfig, event_bus: EventBus):
     vlob = MemoryVlobComponent(_send_event)
     ping = MemoryPingComponent(_send_event)
     block = MemoryBlockComponent()
-    blockstore = blockstore_factory(config.blockstore_config)
-    events = EventsComponent(realm)
+    blockstore = blockstore_factory(
+        config.blockstore_config, cache_size=config.blockstore_cache_size
+    )
+    # Events component's callbacks are disconnected once the components are torn down
+    event_bus_ctx = event_bus.connection_context()
+    events = EventsComponent(realm, event_bus_ctx)
 
     components = {
         "events": events,
@@ -56,10 +60,11 @@ async def components_factory(config: BackendConfig, event_bus: EventBus):
     for component in (organization, user, invite, message, realm, vlob, ping, block):
         component.register_components(**components)
 
-    async with trio.open_service_nursery() as nursery:
-        nursery.start_soon(_dispatch_event)
-        try:
-            yield components
+    with event_bus_ctx:
+        async with trio.open_service_nursery() as nursery:
+            nursery.start_soon(_dispatch_event)
+            try:
+                yield components
 
-        finally:
-            nursery.cancel_scope.cancel()
+            finally:
+                nursery.cancel_scope.cancel()
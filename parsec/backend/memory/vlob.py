@@ -32,6 +32,12 @@ class Vlob:
     def current_version(self):
         return len(self.data)
 
+    def version_at(self, timestamp: pendulum.Pendulum) -> Optional[int]:
+        for i in range(self.current_version, 0, -1):
+            if self.data[i - 1][2] <= timestamp:
+                return i
+        return None
+
 
 class Reencryption:
     def __init__(self, realm_id, vlobs):
@@ -248,11 +254,8 @@ class MemoryVlobComponent(BaseVlobComponent):
             if timestamp is None:
                 version = vlob.current_version
             else:
-                for i in range(vlob.current_version, 0, -1):
-                    if vlob.data[i - 1][2] <= timestamp:
-                        version = i
-                        break
-                else:
+                version = vlob.version_at(timestamp)
+                if version is None:
                     raise VlobVersionError()
         try:
             return (version, *vlob.data[version - 1])
@@ -260,6 +263,33 @@ class MemoryVlobComponent(BaseVlobComponent):
         except IndexError:
             raise VlobVersionError()
 
+    async def read_batch(
+        self,
+        organization_id: OrganizationID,
+        author: DeviceID,
+        realm_id: UUID,
+        encryption_revision: int,
+        vlob_ids: List[UUID],
+        timestamp: Optional[pendulum.Pendulum] = None,
+    ) -> List[Tuple[UUID, int, bytes, DeviceID, pendulum.Pendulum]]:
+        self._check_realm_read_access(
+            organization_id, realm_id, author.user_id, encryption_revision
+        )
+
+        vlobs = []
+        for vlob_id in vlob_ids:
+            vlob = self._vlobs.get((organization_id, vlob_id))
+            if not vlob or vlob.realm_id != realm_id:
+                continue
+            if timestamp is None:
+                version = vlob.current_version
+            else:
+                version = vlob.version_at(timestamp)
+                if version is None:
+                    continue
+            vlobs.append((vlob_id, version, *vlob.data[version - 1]))
+        return vlobs
+
     async def update(
         self,
         organization_id: OrganizationID,
@@ -285,17 +315,33 @@ class MemoryVlobComponent(BaseVlobComponent):
         await self._update_changes(organization_id, author, vlob.realm_id, vlob_id, version)
 
     async def poll_changes(
-        self, organization_id: OrganizationID, author: DeviceID, realm_id: UUID, checkpoint: int
-    ) -> Tuple[int, Dict[UUID, int]]:
+        self,
+        organization_id: OrganizationID,
+        author: DeviceID,
+        realm_id: UUID,
+        checkpoint: int,
+        limit: Optional[int] = None,
+    ) -> Tuple[int, Dict[UUID, int], bool]:
         self._check_realm_read_access(organization_id, realm_id, author.user_id, None)
 
         changes = self._per_realm_changes[(organization_id, realm_id)]
-        changes_since_checkpoint = {
-            src_id: src_version
+        if limit is None:
+            changes_since_checkpoint = {
+                src_id: src_version
+                for src_id, (_, change_checkpoint, src_version) in changes.changes.items()
+                if change_checkpoint > checkpoint
+            }
+            return (changes.checkpoint, changes_since_checkpoint, False)
+
+        sorted_changes = sorted(
+            (change_checkpoint, src_id, src_version)
             for src_id, (_, change_checkpoint, src_version) in changes.changes.items()
             if change_checkpoint > checkpoint
-        }
-        return (changes.checkpoint, changes_since_checkpoint)
+        )
+        page = sorted_changes[:limit]
+        has_more = len(sorted_changes) > limit
+        new_checkpoint = page[-1][0] if has_more else changes.checkpoint
+        return (new_checkpoint, {src_id: src_version for _, src_id, src_version in page}, has_more)
 
     async def list_versions(
         self, organization_id: OrganizationID, author: DeviceID, vlob_id: UUID
@@ -2,6 +2,7 @@
 
 from triopg.exceptions import UniqueViolationError
 from uuid import UUID
+from typing import Dict, List
 import pendulum
 
 from parsec.api.protocol import DeviceID, OrganizationID
@@ -63,6 +64,33 @@ WHERE
 )
 
 
+_q_get_realm_read_right = Q(
+    f"""
+SELECT
+    {
+        q_user_can_read_vlob(
+            organization_id="$organization_id",
+            user_id="$user_id",
+            realm_id="$realm_id"
+        )
+    } as has_access
+"""
+)
+
+
+_q_get_realm_block_ids = Q(
+    f"""
+SELECT
+    block_id
+FROM block
+WHERE
+    realm = { q_realm_internal_id(organization_id="$organization_id", realm_id="$realm_id") }
+    AND block_id = ANY($block_ids::UUID[])
+    AND deleted_on IS NULL
+"""
+)
+
+
 _q_get_block_write_right_and_unicity = Q(
     f"""
 SELECT
@@ -98,6 +126,16 @@ VALUES (
 )
 
 
+# Done last in the transaction given it locks the organization's stats row
+_q_increment_data_size = Q(
+    f"""
+UPDATE organization_stats
+SET data_size = data_size + $size
+WHERE organization = { q_organization_internal_id("$organization_id") }
+"""
+)
+
+
 async def _check_realm(conn, organization_id, realm_id):
     try:
         rep = await get_realm_status(conn, organization_id, realm_id)
@@ -120,6 +158,29 @@ class PGBlockComponent(BaseBlockComponent):
         self._blockstore_component = blockstore_component
         self._vlob_component = vlob_component
 
+    async def _check_write_right_and_unicity(
+        self,
+        conn,
+        organization_id: OrganizationID,
+        author: DeviceID,
+        block_id: UUID,
+        realm_id: UUID,
+    ) -> None:
+        ret = await conn.fetchrow(
+            *_q_get_block_write_right_and_unicity(
+                organization_id=organization_id,
+                user_id=author.user_id,
+                realm_id=realm_id,
+                block_id=block_id,
+            )
+        )
+
+        if not ret["has_access"]:
+            raise BlockAccessError()
+
+        elif ret["exists"]:
+            raise BlockAlreadyExistsError()
+
     async def read(
         self, organization_id: OrganizationID, author: DeviceID, block_id: UUID
     ) -> bytes:
@@ -143,6 +204,34 @@ class PGBlockComponent(BaseBlockComponent):
 
         return await self._blockstore_component.read(organization_id, block_id)
 
+    async def read_batch(
+        self,
+        organization_id: OrganizationID,
+        author: DeviceID,
+        realm_id: UUID,
+        block_ids: List[UUID],
+    ) -> Dict[UUID, bytes]:
+        async with self.dbh.pool.acquire() as conn, conn.transaction():
+            # Realm and access are checked once for the whole batch
+            await _check_realm(conn, organization_id, realm_id)
+            has_access = await conn.fetchval(
+                *_q_get_realm_read_right(
+                    organization_id=organization_id, user_id=author.user_id, realm_id=realm_id
+                )
+            )
+            if not has_access:
+                raise BlockAccessError()
+
+            rows = await conn.fetch(
+                *_q_get_realm_block_ids(
+                    organization_id=organization_id, realm_id=realm_id, block_ids=block_ids
+                )
+            )
+
+        return await self._blockstore_component.read_many(
+            organization_id, [row["block_id"] for row in rows]
+        )
+
     async def create(
         self,
         organization_id: OrganizationID,
@@ -151,51 +240,61 @@ class PGBlockComponent(BaseBlockComponent):
         realm_id: UUID,
         block: bytes,
     ) -> None:
+        # Blockstore I/O can be slow (e.g. S3/Swift upload), so no database
+        # connection is held while it occurs. Otherwise a handful of concurrent
+        # uploads is enough to exhaust the connection pool and stall every
+        # other request (or even deadlock with `PGBlockStoreComponent` which
+        # needs a connection of its own).
+
+        # 1) Check access rights and block unicity
         async with self.dbh.pool.acquire() as conn, conn.transaction():
             await _check_realm(conn, organization_id, realm_id)
-
-            # 1) Check access rights and block unicity
-            ret = await conn.fetchrow(
-                *_q_get_block_write_right_and_unicity(
-                    organization_id=organization_id,
-                    user_id=author.user_id,
-                    realm_id=realm_id,
-                    block_id=block_id,
-                )
+            await self._check_write_right_and_unicity(
+                conn, organization_id, author, block_id, realm_id
             )
 
-            if not ret["has_access"]:
-                raise BlockAccessError()
+        # 2) Upload block data in blockstore under an arbitrary id
+        # Given block metadata and block data are stored on different
+        # storages, beeing atomic is not easy here :(
+        # For instance step 2) can be successful (or can be successful on
+        # *some* blockstores in case of a RAID blockstores configuration)
+        # but step 3) fails. To avoid deadlock in such case (i.e.
+        # blockstores with existing block raise `BlockAlreadyExistsError`)
+        # blockstore are idempotent (i.e. if a block id already exists a
+        # blockstore return success without any modification).
+        await self._blockstore_component.create(organization_id, block_id, block)
+
+        # 3) Insert the block metadata into the database
+        async with self.dbh.pool.acquire() as conn, conn.transaction():
+            # Realm status and access rights may have changed during the upload
+            await _check_realm(conn, organization_id, realm_id)
+            await self._check_write_right_and_unicity(
+                conn, organization_id, author, block_id, realm_id
+            )
 
-            elif ret["exists"]:
-                raise BlockAlreadyExistsError()
-
-            # 2) Upload block data in blockstore under an arbitrary id
-            # Given block metadata and block data are stored on different
-            # storages, beeing atomic is not easy here :(
-            # For instance step 2) can be successful (or can be successful on
-            # *some* blockstores in case of a RAID blockstores configuration)
-            # but step 4) fails. To avoid deadlock in such case (i.e.
-            # blockstores with existing block raise `BlockAlreadyExistsError`)
-            # blockstore are idempotent (i.e. if a block id already exists a
-            # blockstore return success without any modification).
-            await self._blockstore_component.create(organization_id, block_id, block)
-
-            # 3) Insert the block metadata into the database
-            ret = await conn.execute(
-                *_q_insert_block(
-                    organization_id=organization_id,
-                    block_id=block_id,
-                    realm_id=realm_id,
-                    author=author,
-                    size=len(block),
-                    created_on=pendulum.now(),
+            try:
+                ret = await conn.execute(
+                    *_q_insert_block(
+                        organization_id=organization_id,
+                        block_id=block_id,
+                        realm_id=realm_id,
+                        author=author,
+                        size=len(block),
+                        created_on=pendulum.now(),
+                    )
                 )
-            )
+
+            except UniqueViolationError as exc:
+                # Concurrent creation of the same block
+                raise BlockAlreadyExistsError() from exc
 
             if ret != "INSERT 0 1":
                 raise BlockError(f"Insertion error: {ret}")
 
+            await conn.execute(
+                *_q_increment_data_size(organization_id=organization_id, size=len(block))
+            )
+
 
 _q_get_block_data = Q(
     """
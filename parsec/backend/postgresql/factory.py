@@ -29,25 +29,30 @@ async def components_factory(config: BackendConfig, event_bus: EventBus):
     realm = PGRealmComponent(dbh)
     vlob = PGVlobComponent(dbh)
     ping = PGPingComponent(dbh)
-    blockstore = blockstore_factory(config.blockstore_config, postgresql_dbh=dbh)
+    blockstore = blockstore_factory(
+        config.blockstore_config, postgresql_dbh=dbh, cache_size=config.blockstore_cache_size
+    )
     block = PGBlockComponent(dbh, blockstore, vlob)
-    events = EventsComponent(realm)
+    # Events component's callbacks are disconnected once the components are torn down
+    event_bus_ctx = event_bus.connection_context()
+    events = EventsComponent(realm, event_bus_ctx)
 
-    async with trio.open_service_nursery() as nursery:
-        await dbh.init(nursery)
-        try:
-            yield {
-                "user": user,
-                "invite": invite,
-                "message": message,
-                "realm": realm,
-                "vlob": vlob,
-                "ping": ping,
-                "blockstore": blockstore,
-                "block": block,
-                "organization": organization,
-                "events": events,
-            }
+    with event_bus_ctx:
+        async with trio.open_service_nursery() as nursery:
+            await dbh.init(nursery)
+            try:
+                yield {
+                    "user": user,
+                    "invite": invite,
+                    "message": message,
+                    "realm": realm,
+                    "vlob": vlob,
+                    "ping": ping,
+                    "blockstore": blockstore,
+                    "block": block,
+                    "organization": organization,
+                    "events": events,
+                }
 
-        finally:
-            await dbh.teardown()
+            finally:
+                await dbh.teardown()
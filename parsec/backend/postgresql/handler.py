@@ -22,6 +22,7 @@ from parsec.backend.postgresql.tables import (
     STR_TO_INVITATION_STATUS,
     STR_TO_BACKEND_EVENTS,
 )
+from parsec.backend.postgresql.queries import QUERIES
 from parsec.backend.postgresql import migrations as migrations_module
 from parsec.backend.backend_events import BackendEvent
 
@@ -29,6 +30,8 @@ from parsec.backend.backend_events import BackendEvent
 logger = get_logger()
 
 CREATE_MIGRATION_TABLE_ID = 2
+# asyncpg's default size for the per-connection prepared statement cache
+DEFAULT_STATEMENT_CACHE_SIZE = 100
 MIGRATION_FILE_PATTERN = r"^(?P<id>\d{4})_(?P<name>\w*).sql$"
 
 
@@ -166,8 +169,16 @@ class PGHandler:
         self._task_status = await start_task(nursery, self._run_connections)
 
     async def _run_connections(self, task_status=trio.TASK_STATUS_IGNORED):
+        # Queries have a constant SQL text, hence asyncpg prepares each of them
+        # the first time it is run on a connection then reuses the prepared
+        # statement. The cache must be big enough to contain all the queries
+        # otherwise they would end up being evicted and prepared again and again.
+        statement_cache_size = DEFAULT_STATEMENT_CACHE_SIZE + len(QUERIES)
         async with triopg.create_pool(
-            self.url, min_size=self.min_connections, max_size=self.max_connections
+            self.url,
+            min_size=self.min_connections,
+            max_size=self.max_connections,
+            statement_cache_size=statement_cache_size,
         ) as self.pool:
             # This connection is dedicated to the notifications listening, so it
             # would only complicate stuff to include it into the connection pool
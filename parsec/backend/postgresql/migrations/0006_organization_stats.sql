@@ -0,0 +1,35 @@
+-- Parsec Cloud (https://parsec.cloud) Copyright (c) AGPLv3 2019 Scille SAS
+
+
+-------------------------------------------------------
+--  Migration
+-------------------------------------------------------
+
+-- Counters updated along with the user/vlob_atom/block insertions so that
+-- the stats don't have to be computed over the whole organization each time
+CREATE TABLE organization_stats (
+    organization INTEGER PRIMARY KEY REFERENCES organization (_id),
+    users INTEGER NOT NULL DEFAULT 0,
+    metadata_size BIGINT NOT NULL DEFAULT 0,
+    data_size BIGINT NOT NULL DEFAULT 0
+);
+
+INSERT INTO organization_stats (organization, users, metadata_size, data_size)
+SELECT
+    _id,
+    (
+        SELECT COUNT(*)
+        FROM user_
+        WHERE user_.organization = organization._id
+    ),
+    (
+        SELECT COALESCE(SUM(size), 0)
+        FROM vlob_atom
+        WHERE vlob_atom.organization = organization._id
+    ),
+    (
+        SELECT COALESCE(SUM(size), 0)
+        FROM block
+        WHERE block.organization = organization._id
+    )
+FROM organization;
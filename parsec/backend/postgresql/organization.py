@@ -37,6 +37,15 @@ ON CONFLICT (organization_id) DO
 )
 
 
+_q_insert_organization_stats = Q(
+    f"""
+INSERT INTO organization_stats (organization)
+VALUES ({ q_organization_internal_id("$organization_id") })
+ON CONFLICT DO NOTHING
+"""
+)
+
+
 _q_get_organization = Q(
     """
 SELECT bootstrap_token, root_verify_key, expiration_date
@@ -59,25 +68,14 @@ WHERE
 
 
 _q_get_stats = Q(
-    f"""
+    """
 SELECT
-    (
-        SELECT COUNT(*)
-        FROM user_
-        WHERE user_.organization = { q_organization_internal_id("$organization_id") }
-    ) users,
-    (
-        SELECT COALESCE(SUM(size), 0)
-        FROM vlob_atom
-        WHERE
-            organization = { q_organization_internal_id("$organization_id") }
-    ) metadata_size,
-    (
-        SELECT COALESCE(SUM(size), 0)
-        FROM block
-        WHERE
-            organization = { q_organization_internal_id("$organization_id") }
-    ) data_size
+    organization_stats.users,
+    organization_stats.metadata_size,
+    organization_stats.data_size
+FROM organization
+INNER JOIN organization_stats ON organization_stats.organization = organization._id
+WHERE organization_id = $organization_id
 """
 )
 
@@ -99,7 +97,7 @@ class PGOrganizationComponent(BaseOrganizationComponent):
     async def create(
         self, id: OrganizationID, bootstrap_token: str, expiration_date: Optional[Pendulum] = None
     ) -> None:
-        async with self.dbh.pool.acquire() as conn:
+        async with self.dbh.pool.acquire() as conn, conn.transaction():
             try:
                 result = await conn.execute(
                     *_q_insert_organization(
@@ -114,6 +112,8 @@ class PGOrganizationComponent(BaseOrganizationComponent):
             if result != "INSERT 0 1":
                 raise OrganizationAlreadyExistsError()
 
+            await conn.execute(*_q_insert_organization_stats(organization_id=id))
+
     async def get(self, id: OrganizationID) -> Organization:
         async with self.dbh.pool.acquire() as conn:
             return await self._get(conn, id)
@@ -166,9 +166,12 @@ class PGOrganizationComponent(BaseOrganizationComponent):
                 raise OrganizationError(f"Update error: {result}")
 
     async def stats(self, id: OrganizationID) -> OrganizationStats:
-        async with self.dbh.pool.acquire() as conn, conn.transaction():
-            await self._get(conn, id)  # Check organization exists
+        # Stats are maintained along with the users/vlobs/blocks creation,
+        # hence there is no need to go through the whole organization's data
+        async with self.dbh.pool.acquire() as conn:
             result = await conn.fetchrow(*_q_get_stats(organization_id=id))
+        if not result:
+            raise OrganizationNotFoundError()
         return OrganizationStats(
             users=result["users"],
             data_size=result["data_size"],
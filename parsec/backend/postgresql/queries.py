@@ -1,6 +1,12 @@
 # Parsec Cloud (https://parsec.cloud) Copyright (c) AGPLv3 2019 Scille SAS
 
 import re
+from typing import List
+
+
+# Queries are expected to be defined once at import time, so this ends up
+# containing all the queries the backend can run
+QUERIES: List["Q"] = []
 
 
 class Q:
@@ -25,6 +31,7 @@ class Q:
 
         self._sql = src
         self._stripped_sql = " ".join([x.strip() for x in src.split()])
+        QUERIES.append(self)
 
     @property
     def sql(self):
@@ -180,3 +187,31 @@ COALESCE(
     False
 )
 """
+
+
+def q_vlob_encryption_revision_internal_id(
+    encryption_revision,
+    organization_id=None,
+    organization=None,
+    realm_id=None,
+    realm=None,
+    table="vlob_encryption_revision",
+):
+    if realm is None:
+        assert realm_id is not None
+        assert organization_id is not None or organization is not None
+        _q_realm = q_realm_internal_id(
+            organization=organization, organization_id=organization_id, realm_id=realm_id
+        )
+    else:
+        _q_realm = realm
+
+    return f"""
+(
+    SELECT _id
+    FROM { table }
+    WHERE
+        { table }.realm = { _q_realm }
+        AND { table }.encryption_revision = { encryption_revision }
+)
+"""
@@ -106,6 +106,15 @@ VALUES (
 )
 
 
+_q_increment_users = Q(
+    f"""
+UPDATE organization_stats
+SET users = users + 1
+WHERE organization = { q_organization_internal_id("$organization_id") }
+"""
+)
+
+
 _q_insert_device = Q(
     f"""
 INSERT INTO device (
@@ -212,6 +221,8 @@ async def _create_user(
 
     await _create_device(conn, organization_id, first_device, first_device=True)
 
+    await conn.execute(*_q_increment_users(organization_id=organization_id))
+
     # TODO: should be no longer needed once APIv1 is removed
     await send_signal(
         conn,
@@ -4,7 +4,6 @@ import pendulum
 from triopg import UniqueViolationError
 from uuid import UUID
 from typing import List, Tuple, Dict, Optional
-from pypika import Parameter
 
 
 from parsec.backend.backend_events import BackendEvent
@@ -23,18 +22,385 @@ from parsec.backend.vlob import (
 )
 from parsec.backend.postgresql.handler import PGHandler, send_signal, retry_on_unique_violation
 from parsec.backend.postgresql.realm_queries.maintenance import get_realm_status, RealmNotFoundError
-from parsec.backend.postgresql.utils import Query
-from parsec.backend.postgresql.tables import (
-    STR_TO_REALM_ROLE,
-    t_vlob_encryption_revision,
+from parsec.backend.postgresql.queries import (
+    Q,
     q_device,
-    q_vlob_atom,
+    q_device_internal_id,
     q_organization_internal_id,
     q_realm_internal_id,
     q_user_internal_id,
-    q_device_internal_id,
     q_vlob_encryption_revision_internal_id,
 )
+from parsec.backend.postgresql.tables import STR_TO_REALM_ROLE
+
+
+_q_get_realm_role = Q(
+    f"""
+WITH cte_current_realm_roles AS (
+    SELECT DISTINCT ON(user_) user_, role
+    FROM  realm_user_role
+    WHERE realm = { q_realm_internal_id(organization_id="$organization_id", realm_id="$realm_id") }
+    ORDER BY user_, certified_on DESC
+)
+SELECT role
+FROM user_
+LEFT JOIN cte_current_realm_roles
+ON user_._id = cte_current_realm_roles.user_
+WHERE user_._id = { q_user_internal_id(organization_id="$organization_id", user_id="$user_id") }
+"""
+)
+
+
+_q_vlob_updated = Q(
+    f"""
+INSERT INTO realm_vlob_update (
+realm, index, vlob_atom
+)
+SELECT
+    { q_realm_internal_id(organization_id="$organization_id", realm_id="$realm_id") },
+    (
+        SELECT COALESCE(MAX(index) + 1, 1)
+        FROM realm_vlob_update
+        WHERE realm = { q_realm_internal_id(organization_id="$organization_id", realm_id="$realm_id") }
+    ),
+    $vlob_atom_internal_id
+RETURNING index
+"""
+)
+
+
+_q_get_realm_id_from_vlob_id = Q(
+    f"""
+SELECT
+    realm.realm_id
+FROM vlob_atom
+INNER JOIN vlob_encryption_revision
+ON  vlob_atom.vlob_encryption_revision = vlob_encryption_revision._id
+INNER JOIN realm
+ON vlob_encryption_revision.realm = realm._id
+WHERE
+    vlob_atom.organization = { q_organization_internal_id("$organization_id") }
+    AND vlob_atom.vlob_id = $vlob_id
+LIMIT 1
+"""
+)
+
+
+_q_vlob_create = Q(
+    f"""
+INSERT INTO vlob_atom (
+    organization,
+    vlob_encryption_revision,
+    vlob_id,
+    version,
+    blob,
+    size,
+    author,
+    created_on
+)
+SELECT
+    { q_organization_internal_id("$organization_id") },
+    {
+        q_vlob_encryption_revision_internal_id(
+            organization_id="$organization_id",
+            realm_id="$realm_id",
+            encryption_revision="$encryption_revision",
+        )
+    },
+    $vlob_id,
+    1,
+    $blob,
+    $blob_len,
+    { q_device_internal_id(organization_id="$organization_id", device_id="$author") },
+    $timestamp
+RETURNING _id
+"""
+)
+
+
+_q_vlob_read = Q(
+    f"""
+SELECT
+    version,
+    blob,
+    { q_device(_id="vlob_atom.author", select="device_id") } as author,
+    created_on
+FROM vlob_atom
+WHERE
+    vlob_encryption_revision = {
+        q_vlob_encryption_revision_internal_id(
+            organization_id="$organization_id",
+            realm_id="$realm_id",
+            encryption_revision="$encryption_revision",
+        )
+    }
+    AND vlob_id = $vlob_id
+ORDER BY version DESC
+LIMIT 1
+"""
+)
+
+
+_q_vlob_read_at_timestamp = Q(
+    f"""
+SELECT
+    version,
+    blob,
+    { q_device(_id="vlob_atom.author", select="device_id") } as author,
+    created_on
+FROM vlob_atom
+WHERE
+    vlob_encryption_revision = {
+        q_vlob_encryption_revision_internal_id(
+            organization_id="$organization_id",
+            realm_id="$realm_id",
+            encryption_revision="$encryption_revision",
+        )
+    }
+    AND vlob_id = $vlob_id
+    AND created_on <= $timestamp
+ORDER BY version DESC
+LIMIT 1
+"""
+)
+
+
+_q_vlob_read_version = Q(
+    f"""
+SELECT
+    version,
+    blob,
+    { q_device(_id="vlob_atom.author", select="device_id") } as author,
+    created_on
+FROM vlob_atom
+WHERE
+    vlob_encryption_revision = {
+        q_vlob_encryption_revision_internal_id(
+            organization_id="$organization_id",
+            realm_id="$realm_id",
+            encryption_revision="$encryption_revision",
+        )
+    }
+    AND vlob_id = $vlob_id
+    AND version = $version
+"""
+)
+
+
+_q_read_batch = Q(
+    f"""
+SELECT DISTINCT ON (vlob_id)
+    vlob_id,
+    version,
+    blob,
+    { q_device(_id="vlob_atom.author", select="device_id") } as author,
+    created_on
+FROM vlob_atom
+WHERE
+    vlob_encryption_revision = {
+        q_vlob_encryption_revision_internal_id(
+            organization_id="$organization_id",
+            realm_id="$realm_id",
+            encryption_revision="$encryption_revision",
+        )
+    }
+    AND vlob_id = ANY($vlob_ids::UUID[])
+    AND ($timestamp::TIMESTAMPTZ IS NULL OR created_on <= $timestamp)
+ORDER BY vlob_id, version DESC
+"""
+)
+
+
+_q_vlob_get_last_version = Q(
+    f"""
+SELECT
+    version,
+    created_on
+FROM vlob_atom
+WHERE
+    organization = { q_organization_internal_id("$organization_id") }
+    AND vlob_id = $vlob_id
+ORDER BY version DESC LIMIT 1
+"""
+)
+
+
+_q_vlob_update = Q(
+    f"""
+INSERT INTO vlob_atom (
+    organization,
+    vlob_encryption_revision,
+    vlob_id,
+    version,
+    blob,
+    size,
+    author,
+    created_on
+)
+SELECT
+    { q_organization_internal_id("$organization_id") },
+    {
+        q_vlob_encryption_revision_internal_id(
+            organization_id="$organization_id",
+            realm_id="$realm_id",
+            encryption_revision="$encryption_revision",
+        )
+    },
+    $vlob_id,
+    $version,
+    $blob,
+    $blob_len,
+    { q_device_internal_id(organization_id="$organization_id", device_id="$author") },
+    $timestamp
+RETURNING _id
+"""
+)
+
+
+# Done last in the transaction given it locks the organization's stats row
+_q_increment_metadata_size = Q(
+    f"""
+UPDATE organization_stats
+SET metadata_size = metadata_size + $size
+WHERE organization = { q_organization_internal_id("$organization_id") }
+"""
+)
+
+
+_q_poll_changes = Q(
+    f"""
+SELECT
+    index,
+    vlob_id,
+    vlob_atom.version
+FROM realm_vlob_update
+LEFT JOIN vlob_atom ON realm_vlob_update.vlob_atom = vlob_atom._id
+WHERE
+    realm = { q_realm_internal_id(organization_id="$organization_id", realm_id="$realm_id") }
+    AND index > $checkpoint
+ORDER BY index ASC
+LIMIT $limit
+"""
+)
+
+
+_q_list_versions = Q(
+    f"""
+SELECT
+    version,
+    { q_device(_id="vlob_atom.author", select="device_id") } as author,
+    created_on
+FROM vlob_atom
+WHERE
+    organization = { q_organization_internal_id("$organization_id") }
+    AND vlob_id = $vlob_id
+ORDER BY version DESC
+"""
+)
+
+
+_q_maintenance_get_reencryption_batch = Q(
+    f"""
+WITH cte_to_encrypt AS (
+    SELECT vlob_id, version, blob
+    FROM vlob_atom
+    WHERE vlob_encryption_revision = {
+        q_vlob_encryption_revision_internal_id(
+            organization_id="$organization_id",
+            realm_id="$realm_id",
+            encryption_revision="$encryption_revision - 1",
+        )
+    }
+),
+cte_encrypted AS (
+    SELECT vlob_id, version
+    FROM vlob_atom
+    WHERE vlob_encryption_revision = {
+        q_vlob_encryption_revision_internal_id(
+            organization_id="$organization_id",
+            realm_id="$realm_id",
+            encryption_revision="$encryption_revision",
+        )
+    }
+)
+SELECT
+    cte_to_encrypt.vlob_id,
+    cte_to_encrypt.version,
+    blob
+FROM cte_to_encrypt
+LEFT JOIN cte_encrypted
+ON cte_to_encrypt.vlob_id = cte_encrypted.vlob_id AND cte_to_encrypt.version = cte_encrypted.version
+WHERE cte_encrypted.vlob_id IS NULL
+LIMIT $size
+"""
+)
+
+
+_q_maintenance_save_reencryption_batch = Q(
+    f"""
+INSERT INTO vlob_atom(
+    organization,
+    vlob_encryption_revision,
+    vlob_id,
+    version,
+    blob,
+    size,
+    author,
+    created_on,
+    deleted_on
+)
+SELECT
+    organization,
+    {
+        q_vlob_encryption_revision_internal_id(
+            organization_id="$organization_id",
+            realm_id="$realm_id",
+            encryption_revision="$encryption_revision",
+        )
+    },
+    $vlob_id,
+    $version,
+    $blob,
+    $blob_len,
+    author,
+    created_on,
+    deleted_on
+FROM vlob_atom
+WHERE
+    organization = { q_organization_internal_id("$organization_id") }
+    AND vlob_id = $vlob_id
+    AND version = $version
+ON CONFLICT DO NOTHING
+"""
+)
+
+
+_q_maintenance_get_reencryption_progress = Q(
+    f"""
+SELECT (
+    SELECT COUNT(*)
+    FROM vlob_atom
+    WHERE vlob_encryption_revision = {
+        q_vlob_encryption_revision_internal_id(
+            organization_id="$organization_id",
+            realm_id="$realm_id",
+            encryption_revision="$encryption_revision - 1",
+        )
+    }
+),
+(
+    SELECT COUNT(*)
+    FROM vlob_atom
+    WHERE vlob_encryption_revision = {
+        q_vlob_encryption_revision_internal_id(
+            organization_id="$organization_id",
+            realm_id="$realm_id",
+            encryption_revision="$encryption_revision",
+        )
+    }
+)
+"""
+)
 
 
 async def _check_realm(
@@ -58,23 +424,11 @@ async def _check_realm(
 
 
 async def _check_realm_access(conn, organization_id, realm_id, author, allowed_roles):
-    query = """
-WITH cte_current_realm_roles AS (
-    SELECT DISTINCT ON(user_) user_, role
-    FROM  realm_user_role
-    WHERE realm = ({})
-    ORDER BY user_, certified_on DESC
-)
-SELECT role
-FROM user_
-LEFT JOIN cte_current_realm_roles
-ON user_._id = cte_current_realm_roles.user_
-WHERE user_._id = ({})
-        """.format(
-        q_realm_internal_id(organization_id=Parameter("$1"), realm_id=Parameter("$2")),
-        q_user_internal_id(organization_id=Parameter("$1"), user_id=Parameter("$3")),
+    rep = await conn.fetchrow(
+        *_q_get_realm_role(
+            organization_id=organization_id, realm_id=realm_id, user_id=author.user_id
+        )
     )
-    rep = await conn.fetchrow(query, organization_id, realm_id, author.user_id)
 
     if not rep:
         raise VlobNotFoundError(f"User `{author.user_id}` doesn't exist")
@@ -112,25 +466,14 @@ async def _check_realm_and_read_access(
 async def _vlob_updated(
     conn, vlob_atom_internal_id, organization_id, author, realm_id, src_id, src_version=1
 ):
-    query = """
-INSERT INTO realm_vlob_update (
-realm, index, vlob_atom
-)
-SELECT
-({q_realm}),
-(
-    SELECT COALESCE(MAX(index) + 1, 1)
-    FROM realm_vlob_update
-    WHERE realm = ({q_realm})
-),
-$3
-RETURNING index
-""".format(
-        q_realm=q_realm_internal_id(organization_id=Parameter("$1"), realm_id=Parameter("$2"))
+    index = await conn.fetchval(
+        *_q_vlob_updated(
+            organization_id=organization_id,
+            realm_id=realm_id,
+            vlob_atom_internal_id=vlob_atom_internal_id,
+        )
     )
 
-    index = await conn.fetchval(query, organization_id, realm_id, vlob_atom_internal_id)
-
     await send_signal(
         conn,
         BackendEvent.REALM_VLOBS_UPDATED,
@@ -144,21 +487,9 @@ RETURNING index
 
 
 async def _get_realm_id_from_vlob_id(conn, organization_id, vlob_id):
-    query = """
-SELECT
-    realm.realm_id
-FROM vlob_atom
-INNER JOIN vlob_encryption_revision
-ON  vlob_atom.vlob_encryption_revision = vlob_encryption_revision._id
-INNER JOIN realm
-ON vlob_encryption_revision.realm = realm._id
-WHERE vlob_atom._id = ({})
-LIMIT 1
-    """.format(
-        q_vlob_atom(organization_id=Parameter("$1"), vlob_id=Parameter("$2")).select("_id").limit(1)
+    realm_id = await conn.fetchval(
+        *_q_get_realm_id_from_vlob_id(organization_id=organization_id, vlob_id=vlob_id)
     )
-
-    realm_id = await conn.fetchval(query, organization_id, vlob_id)
     if not realm_id:
         raise VlobNotFoundError(f"Vlob `{vlob_id}` doesn't exist")
     return realm_id
@@ -186,55 +517,17 @@ class PGVlobComponent(BaseVlobComponent):
 
             # Actually create the vlob
             try:
-                query = """
-INSERT INTO vlob_atom (
-    organization,
-    vlob_encryption_revision,
-    vlob_id,
-    version,
-    blob,
-    size,
-    author,
-    created_on
-)
-SELECT
-    ({}),
-    ({}),
-    $5,
-    1,
-    $6,
-    $7,
-    ({}),
-    $8
-RETURNING _id
-""".format(
-                    q_organization_internal_id(organization_id=Parameter("$1")),
-                    Query.from_(t_vlob_encryption_revision)
-                    .where(
-                        (
-                            t_vlob_encryption_revision.realm
-                            == q_realm_internal_id(
-                                organization_id=Parameter("$1"), realm_id=Parameter("$3")
-                            )
-                        )
-                        & (t_vlob_encryption_revision.encryption_revision == Parameter("$4"))
-                    )
-                    .select("_id"),
-                    q_device_internal_id(
-                        organization_id=Parameter("$1"), device_id=Parameter("$2")
-                    ),
-                )
-
                 vlob_atom_internal_id = await conn.fetchval(
-                    query,
-                    organization_id,
-                    author,
-                    realm_id,
-                    encryption_revision,
-                    vlob_id,
-                    blob,
-                    len(blob),
-                    timestamp,
+                    *_q_vlob_create(
+                        organization_id=organization_id,
+                        author=author,
+                        realm_id=realm_id,
+                        encryption_revision=encryption_revision,
+                        vlob_id=vlob_id,
+                        blob=blob,
+                        blob_len=len(blob),
+                        timestamp=timestamp,
+                    )
                 )
 
             except UniqueViolationError:
@@ -243,6 +536,9 @@ RETURNING _id
             await _vlob_updated(
                 conn, vlob_atom_internal_id, organization_id, author, realm_id, vlob_id
             )
+            await conn.execute(
+                *_q_increment_metadata_size(organization_id=organization_id, size=len(blob))
+            )
 
     async def read(
         self,
@@ -263,90 +559,70 @@ RETURNING _id
 
             if version is None:
                 if timestamp is None:
-                    query = """
-SELECT
-    version,
-    blob,
-    ({}) as author,
-    created_on
-FROM vlob_atom
-WHERE
-    vlob_encryption_revision = ({})
-    AND vlob_id = $4
-ORDER BY version DESC
-LIMIT 1
-""".format(
-                        q_device(_id=Parameter("author")).select("device_id"),
-                        q_vlob_encryption_revision_internal_id(
-                            organization_id=Parameter("$1"),
-                            realm_id=Parameter("$2"),
-                            encryption_revision=Parameter("$3"),
-                        ),
-                    )
-
                     data = await conn.fetchrow(
-                        query, organization_id, realm_id, encryption_revision, vlob_id
+                        *_q_vlob_read(
+                            organization_id=organization_id,
+                            realm_id=realm_id,
+                            encryption_revision=encryption_revision,
+                            vlob_id=vlob_id,
+                        )
                     )
                     assert data  # _get_realm_id_from_vlob_id checks vlob presence
 
                 else:
-                    query = """
-SELECT
-    version,
-    blob,
-    ({}) as author,
-    created_on
-FROM vlob_atom
-WHERE
-    vlob_encryption_revision = ({})
-    AND vlob_id = $4
-    AND created_on <= $5
-ORDER BY version DESC
-LIMIT 1
-""".format(
-                        q_device(_id=Parameter("author")).select("device_id"),
-                        q_vlob_encryption_revision_internal_id(
-                            organization_id=Parameter("$1"),
-                            realm_id=Parameter("$2"),
-                            encryption_revision=Parameter("$3"),
-                        ),
-                    )
-
                     data = await conn.fetchrow(
-                        query, organization_id, realm_id, encryption_revision, vlob_id, timestamp
+                        *_q_vlob_read_at_timestamp(
+                            organization_id=organization_id,
+                            realm_id=realm_id,
+                            encryption_revision=encryption_revision,
+                            vlob_id=vlob_id,
+                            timestamp=timestamp,
+                        )
                     )
                     if not data:
                         raise VlobVersionError()
 
             else:
-                query = """
-SELECT
-    version,
-    blob,
-    ({}) as author,
-    created_on
-FROM vlob_atom
-WHERE
-    vlob_encryption_revision = ({})
-    AND vlob_id = $4
-    AND version = $5
-""".format(
-                    q_device(_id=Parameter("author")).select("device_id"),
-                    q_vlob_encryption_revision_internal_id(
-                        organization_id=Parameter("$1"),
-                        realm_id=Parameter("$2"),
-                        encryption_revision=Parameter("$3"),
-                    ),
-                )
-
                 data = await conn.fetchrow(
-                    query, organization_id, realm_id, encryption_revision, vlob_id, version
+                    *_q_vlob_read_version(
+                        organization_id=organization_id,
+                        realm_id=realm_id,
+                        encryption_revision=encryption_revision,
+                        vlob_id=vlob_id,
+                        version=version,
+                    )
                 )
                 if not data:
                     raise VlobVersionError()
 
         return list(data)
 
+    async def read_batch(
+        self,
+        organization_id: OrganizationID,
+        author: DeviceID,
+        realm_id: UUID,
+        encryption_revision: int,
+        vlob_ids: List[UUID],
+        timestamp: Optional[pendulum.Pendulum] = None,
+    ) -> List[Tuple[UUID, int, bytes, DeviceID, pendulum.Pendulum]]:
+        async with self.dbh.pool.acquire() as conn, conn.transaction():
+            # Realm and access are checked once for the whole batch
+            await _check_realm_and_read_access(
+                conn, organization_id, author, realm_id, encryption_revision
+            )
+            rows = await conn.fetch(
+                *_q_read_batch(
+                    organization_id=organization_id,
+                    realm_id=realm_id,
+                    encryption_revision=encryption_revision,
+                    vlob_ids=vlob_ids,
+                    timestamp=timestamp,
+                )
+            )
+
+        return [tuple(row) for row in rows]
+
     @retry_on_unique_violation
     async def update(
         self,
@@ -365,20 +641,9 @@ WHERE
                 conn, organization_id, author, realm_id, encryption_revision
             )
 
-            query = """
-SELECT
-    version,
-    created_on
-FROM vlob_atom
-WHERE
-    organization = ({})
-    AND vlob_id = $2
-ORDER BY version DESC LIMIT 1
-""".format(
-                q_organization_internal_id(Parameter("$1"))
+            previous = await conn.fetchrow(
+                *_q_vlob_get_last_version(organization_id=organization_id, vlob_id=vlob_id)
             )
-
-            previous = await conn.fetchrow(query, organization_id, vlob_id)
             if not previous:
                 raise VlobNotFoundError(f"Vlob `{vlob_id}` doesn't exist")
 
@@ -388,49 +653,19 @@ ORDER BY version DESC LIMIT 1
             elif previous["created_on"] > timestamp:
                 raise VlobTimestampError()
 
-            query = """
-INSERT INTO vlob_atom (
-    organization,
-    vlob_encryption_revision,
-    vlob_id,
-    version,
-    blob,
-    size,
-    author,
-    created_on
-)
-SELECT
-    ({}),
-    ({}),
-    $5,
-    $9,
-    $6,
-    $7,
-    ({}),
-    $8
-RETURNING _id
-""".format(
-                q_organization_internal_id(Parameter("$1")),
-                q_vlob_encryption_revision_internal_id(
-                    organization_id=Parameter("$1"),
-                    realm_id=Parameter("$3"),
-                    encryption_revision=Parameter("$4"),
-                ),
-                q_device_internal_id(organization_id=Parameter("$1"), device_id=Parameter("$2")),
-            )
-
             try:
                 vlob_atom_internal_id = await conn.fetchval(
-                    query,
-                    organization_id,
-                    author,
-                    realm_id,
-                    encryption_revision,
-                    vlob_id,
-                    blob,
-                    len(blob),
-                    timestamp,
-                    version,
+                    *_q_vlob_update(
+                        organization_id=organization_id,
+                        author=author,
+                        realm_id=realm_id,
+                        encryption_revision=encryption_revision,
+                        vlob_id=vlob_id,
+                        blob=blob,
+                        blob_len=len(blob),
+                        timestamp=timestamp,
+                        version=version,
+                    )
                 )
 
             except UniqueViolationError:
@@ -440,33 +675,38 @@ RETURNING _id
             await _vlob_updated(
                 conn, vlob_atom_internal_id, organization_id, author, realm_id, vlob_id, version
             )
+            await conn.execute(
+                *_q_increment_metadata_size(organization_id=organization_id, size=len(blob))
+            )
 
     async def poll_changes(
-        self, organization_id: OrganizationID, author: DeviceID, realm_id: UUID, checkpoint: int
-    ) -> Tuple[int, Dict[UUID, int]]:
+        self,
+        organization_id: OrganizationID,
+        author: DeviceID,
+        realm_id: UUID,
+        checkpoint: int,
+        limit: Optional[int] = None,
+    ) -> Tuple[int, Dict[UUID, int], bool]:
         async with self.dbh.pool.acquire() as conn, conn.transaction():
 
             await _check_realm_and_read_access(conn, organization_id, author, realm_id, None)
-            query = """
-SELECT
-    index,
-    vlob_id,
-    vlob_atom.version
-FROM realm_vlob_update
-LEFT JOIN vlob_atom ON realm_vlob_update.vlob_atom = vlob_atom._id
-WHERE
-    realm = ({})
-    AND index > $3
-ORDER BY index ASC
-""".format(
-                q_realm_internal_id(organization_id=Parameter("$1"), realm_id=Parameter("$2"))
+            ret = await conn.fetch(
+                *_q_poll_changes(
+                    organization_id=organization_id,
+                    realm_id=realm_id,
+                    checkpoint=checkpoint,
+                    # Fetch an additional row to know if there is more changes,
+                    # note `LIMIT NULL` means no limit
+                    limit=limit + 1 if limit is not None else None,
+                )
             )
 
-            ret = await conn.fetch(query, organization_id, realm_id, checkpoint)
-
+        has_more = limit is not None and len(ret) > limit
+        if has_more:
+            ret = ret[:limit]
         changes_since_checkpoint = {src_id: src_version for _, src_id, src_version in ret}
         new_checkpoint = ret[-1][0] if ret else checkpoint
-        return (new_checkpoint, changes_since_checkpoint)
+        return (new_checkpoint, changes_since_checkpoint, has_more)
 
     async def list_versions(
         self, organization_id: OrganizationID, author: DeviceID, vlob_id: UUID
@@ -478,21 +718,9 @@ ORDER BY index ASC
                 realm_id = await _get_realm_id_from_vlob_id(conn, organization_id, vlob_id)
                 await _check_realm_and_read_access(conn, organization_id, author, realm_id, None)
 
-                query = """
-SELECT
-    version,
-    ({}) as author,
-    created_on
-FROM vlob_atom
-WHERE
-    organization = ({})
-    AND vlob_id = $2
-ORDER BY version DESC
-""".format(
-                    q_device(_id=Parameter("author")).select("device_id"),
-                    q_organization_internal_id(Parameter("$1")),
+                rows = await conn.fetch(
+                    *_q_list_versions(organization_id=organization_id, vlob_id=vlob_id)
                 )
-                rows = await conn.fetch(query, organization_id, vlob_id)
                 assert rows
         if not rows:
             raise VlobNotFoundError(f"Vlob `{vlob_id}` doesn't exist")
@@ -513,40 +741,14 @@ ORDER BY version DESC
                 conn, organization_id, author, realm_id, encryption_revision
             )
 
-            query = """
-WITH cte_to_encrypt AS (
-    SELECT vlob_id, version, blob
-    FROM vlob_atom
-    WHERE vlob_encryption_revision = ({})
-),
-cte_encrypted AS (
-    SELECT vlob_id, version
-    FROM vlob_atom
-    WHERE vlob_encryption_revision = ({})
-)
-SELECT
-    cte_to_encrypt.vlob_id,
-    cte_to_encrypt.version,
-    blob
-FROM cte_to_encrypt
-LEFT JOIN cte_encrypted
-ON cte_to_encrypt.vlob_id = cte_encrypted.vlob_id AND cte_to_encrypt.version = cte_encrypted.version
-WHERE cte_encrypted.vlob_id IS NULL
-LIMIT $4
-""".format(
-                q_vlob_encryption_revision_internal_id(
-                    organization_id=Parameter("$1"),
-                    realm_id=Parameter("$2"),
-                    encryption_revision=Parameter("$3") - 1,
-                ),
-                q_vlob_encryption_revision_internal_id(
-                    organization_id=Parameter("$1"),
-                    realm_id=Parameter("$2"),
-                    encryption_revision=Parameter("$3"),
-                ),
+            rep = await conn.fetch(
+                *_q_maintenance_get_reencryption_batch(
+                    organization_id=organization_id,
+                    realm_id=realm_id,
+                    encryption_revision=encryption_revision,
+                    size=size,
+                )
             )
-
-            rep = await conn.fetch(query, organization_id, realm_id, encryption_revision, size)
             return [(row["vlob_id"], row["version"], row["blob"]) for row in rep]
 
     async def maintenance_save_reencryption_batch(
@@ -562,79 +764,34 @@ LIMIT $4
             await _check_realm_and_maintenance_access(
                 conn, organization_id, author, realm_id, encryption_revision
             )
+            saved_size = 0
             for vlob_id, version, blob in batch:
-                query = """
-INSERT INTO vlob_atom(
-    organization,
-    vlob_encryption_revision,
-    vlob_id,
-    version,
-    blob,
-    size,
-    author,
-    created_on,
-    deleted_on
-)
-SELECT
-    organization,
-    ({}),
-    $3,
-    $4,
-    $6,
-    $7,
-    author,
-    created_on,
-    deleted_on
-FROM vlob_atom
-WHERE
-    organization = ({})
-    AND vlob_id = $3
-    AND version = $4
-ON CONFLICT DO NOTHING
-""".format(
-                    q_vlob_encryption_revision_internal_id(
-                        organization_id=Parameter("$1"),
-                        realm_id=Parameter("$2"),
-                        encryption_revision=Parameter("$5"),
-                    ),
-                    q_organization_internal_id(Parameter("$1")),
+                result = await conn.execute(
+                    *_q_maintenance_save_reencryption_batch(
+                        organization_id=organization_id,
+                        realm_id=realm_id,
+                        vlob_id=vlob_id,
+                        version=version,
+                        encryption_revision=encryption_revision,
+                        blob=blob,
+                        blob_len=len(blob),
+                    )
                 )
-
-                await conn.execute(
-                    query,
-                    organization_id,
-                    realm_id,
-                    vlob_id,
-                    version,
-                    encryption_revision,
-                    blob,
-                    len(blob),
+                # Vlob atom may have already been saved by a previous batch
+                if result == "INSERT 0 1":
+                    saved_size += len(blob)
+
+            rep = await conn.fetchrow(
+                *_q_maintenance_get_reencryption_progress(
+                    organization_id=organization_id,
+                    realm_id=realm_id,
+                    encryption_revision=encryption_revision,
                 )
-
-            query = """
-SELECT (
-    SELECT COUNT(*)
-    FROM vlob_atom
-    WHERE vlob_encryption_revision = ({})
-),
-(
-    SELECT COUNT(*)
-    FROM vlob_atom
-    WHERE vlob_encryption_revision = ({})
-)
-""".format(
-                q_vlob_encryption_revision_internal_id(
-                    organization_id=Parameter("$1"),
-                    realm_id=Parameter("$2"),
-                    encryption_revision=Parameter("$3") - 1,
-                ),
-                q_vlob_encryption_revision_internal_id(
-                    organization_id=Parameter("$1"),
-                    realm_id=Parameter("$2"),
-                    encryption_revision=Parameter("$3"),
-                ),
             )
 
-            rep = await conn.fetchrow(query, organization_id, realm_id, encryption_revision)
+            if saved_size:
+                await conn.execute(
+                    *_q_increment_metadata_size(organization_id=organization_id, size=saved_size)
+                )
 
             return rep[0], rep[1]
@@ -1,30 +1,139 @@
 # Parsec Cloud (https://parsec.cloud) Copyright (c) AGPLv3 2019 Scille SAS
 
+import attr
 import trio
+from time import monotonic
 from uuid import UUID
+from collections import deque
+from typing import Deque, Optional
 
 from parsec.api.protocol import OrganizationID
 from parsec.backend.blockstore import BaseBlockStoreComponent
 from parsec.backend.block import BlockAlreadyExistsError, BlockNotFoundError, BlockTimeoutError
 
 
+# Weight of the last measure in the latency and error rate moving averages
+EWMA_ALPHA = 0.2
+# Latency percentile (of the mirror currently read) after which another mirror is tried
+HEDGE_LATENCY_PERCENTILE = 0.95
+# Hedge deadline until enough latency samples have been collected
+DEFAULT_HEDGE_DELAY = 0.1
+HEDGE_MIN_SAMPLES = 10
+LATENCY_SAMPLES = 100
+# Time (in seconds) after which the error rate of a mirror has halved, so
+# that a mirror that failed can be preferred again once it has recovered
+ERROR_RATE_HALF_LIFE = 60
+
+
+@attr.s(slots=True, auto_attribs=True)
+class MirrorStats:
+    reads: int = 0
+    errors: int = 0
+    hedged_reads: int = 0
+    cancelled_reads: int = 0
+    latency_ewma: Optional[float] = None
+    error_rate_ewma: float = 0.0
+    error_rate_updated_on: float = 0.0
+    latencies: Deque[float] = attr.ib(factory=lambda: deque(maxlen=LATENCY_SAMPLES))
+
+    def _record_latency(self, latency: float) -> None:
+        self.latencies.append(latency)
+        if self.latency_ewma is None:
+            self.latency_ewma = latency
+        else:
+            self.latency_ewma += EWMA_ALPHA * (latency - self.latency_ewma)
+
+    def _update_error_rate(self, error: bool, now: Optional[float]) -> None:
+        now = monotonic() if now is None else now
+        error_rate = self.error_rate(now)
+        self.error_rate_ewma = error_rate + EWMA_ALPHA * (error - error_rate)
+        self.error_rate_updated_on = now
+
+    def record_success(self, latency: float, now: Optional[float] = None) -> None:
+        self.reads += 1
+        self._record_latency(latency)
+        self._update_error_rate(False, now)
+
+    def record_error(self, now: Optional[float] = None) -> None:
+        self.reads += 1
+        self.errors += 1
+        self._update_error_rate(True, now)
+
+    def record_cancelled(self, elapsed: float) -> None:
+        # The read has been cancelled (i.e. another mirror answered first), so
+        # its latency is only known to be greater than the elapsed time. This
+        # is still worth recording when greater than the expected latency,
+        # otherwise a mirror that hangs would keep being read first.
+        self.cancelled_reads += 1
+        if self.latency_ewma is None or elapsed > self.latency_ewma:
+            self._record_latency(elapsed)
+
+    def error_rate(self, now: Optional[float] = None) -> float:
+        now = monotonic() if now is None else now
+        elapsed = max(now - self.error_rate_updated_on, 0)
+        return self.error_rate_ewma * 0.5 ** (elapsed / ERROR_RATE_HALF_LIFE)
+
+    def expected_latency(self, now: Optional[float] = None) -> float:
+        # Mirrors without samples are tried first to get some (unless they are
+        # failing), and failing mirrors are penalized given a failed read has to
+        # be retried on another mirror
+        if self.latency_ewma is not None:
+            latency = self.latency_ewma
+        elif self.errors:
+            latency = DEFAULT_HEDGE_DELAY
+        else:
+            return 0.0
+        return latency / max(1 - self.error_rate(now), 0.01)
+
+    def hedge_delay(self) -> float:
+        if len(self.latencies) < HEDGE_MIN_SAMPLES:
+            return DEFAULT_HEDGE_DELAY
+        latencies = sorted(self.latencies)
+        return latencies[min(int(len(latencies) * HEDGE_LATENCY_PERCENTILE), len(latencies) - 1)]
+
+
 class RAID1BlockStoreComponent(BaseBlockStoreComponent):
     def __init__(self, blockstores):
         self.blockstores = blockstores
+        self.mirror_stats = [MirrorStats() for _ in blockstores]
 
     async def read(self, organization_id: OrganizationID, id: UUID) -> bytes:
-        async def _single_blockstore_read(nursery, blockstore):
+        # Reading from every mirror would multiply the load by the number of
+        # mirrors, instead the mirror expected to be the fastest is read and
+        # another one is tried only if it fails or becomes slower than usual
+        # (i.e. hedged request).
+        async def _single_blockstore_read(nursery, index, hedged, try_next_mirror):
             nonlocal value
+            stats = self.mirror_stats[index]
+            if hedged:
+                stats.hedged_reads += 1
+            start = trio.current_time()
             try:
-                value = await blockstore.read(organization_id, id)
-                nursery.cancel_scope.cancel()
+                data = await self.blockstores[index].read(organization_id, id)
             except (BlockNotFoundError, BlockTimeoutError):
-                pass
+                stats.record_error()
+                try_next_mirror.set()
+                return
+            except trio.Cancelled:
+                stats.record_cancelled(trio.current_time() - start)
+                raise
+            stats.record_success(trio.current_time() - start)
+            value = data
+            nursery.cancel_scope.cancel()
 
         value = None
+        now = monotonic()
+        mirrors = sorted(
+            range(len(self.blockstores)), key=lambda i: self.mirror_stats[i].expected_latency(now)
+        )
         async with trio.open_service_nursery() as nursery:
-            for blockstore in self.blockstores:
-                nursery.start_soon(_single_blockstore_read, nursery, blockstore)
+            for attempt, index in enumerate(mirrors):
+                try_next_mirror = trio.Event()
+                nursery.start_soon(
+                    _single_blockstore_read, nursery, index, attempt > 0, try_next_mirror
+                )
+                with trio.move_on_after(self.mirror_stats[index].hedge_delay()):
+                    await try_next_mirror.wait()
 
         if not value:
             raise BlockNotFoundError()
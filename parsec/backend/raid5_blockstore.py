@@ -5,8 +5,15 @@ from uuid import UUID
 import struct
 from structlog import get_logger
 from sys import byteorder
+from itertools import chain, islice
 from typing import List, Optional
 
+try:
+    import numpy
+except ImportError:
+    # Vectorized parity computation is an optional speedup
+    numpy = None
+
 from parsec.api.protocol import OrganizationID
 from parsec.backend.blockstore import BaseBlockStoreComponent
 from parsec.backend.block import BlockAlreadyExistsError, BlockNotFoundError, BlockTimeoutError
@@ -15,7 +22,19 @@ from parsec.backend.block import BlockAlreadyExistsError, BlockNotFoundError, Bl
 logger = get_logger()
 
 
-def _xor_buffers(*buffers):
+def _numpy_xor_buffers(*buffers) -> bytes:
+    # Work on views of the buffers and xor in place into a single
+    # preallocated output, without creating any intermediary object
+    buff_len = len(buffers[0])
+    xored = numpy.frombuffer(buffers[0], dtype=numpy.uint8).copy()
+    for buff in buffers[1:]:
+        assert len(buff) == buff_len
+        numpy.bitwise_xor(xored, numpy.frombuffer(buff, dtype=numpy.uint8), out=xored)
+    return xored.tobytes()
+
+
+def _int_xor_buffers(*buffers) -> bytes:
+    # Python integers are arbitrary large, hence xoring them is done word by word
     buff_len = len(buffers[0])
     xored = int.from_bytes(buffers[0], byteorder)
     for buff in buffers[1:]:
@@ -24,6 +43,12 @@ def _xor_buffers(*buffers):
     return xored.to_bytes(buff_len, byteorder)
 
 
+def _xor_buffers(*buffers) -> bytes:
+    if numpy is not None:
+        return _numpy_xor_buffers(*buffers)
+    return _int_xor_buffers(*buffers)
+
+
 def split_block_in_chunks(block: bytes, nb_chunks: int) -> List[bytes]:
     payload_size = len(block) + 4  # encode block len as a uint32
     chunk_len = payload_size // nb_chunks
@@ -31,9 +56,23 @@ def split_block_in_chunks(block: bytes, nb_chunks: int) -> List[bytes]:
         chunk_len += 1
     padding_len = chunk_len * nb_chunks - payload_size
 
-    payload = struct.pack("!I", len(block)) + block + b"\x00" * padding_len
-
-    return [payload[chunk_len * i : chunk_len * (i + 1)] for i in range(nb_chunks)]
+    # Payload is never concatenated, instead each chunk is built from views
+    # on the payload segments so the block data is copied only once
+    segments = [struct.pack("!I", len(block)), memoryview(block), b"\x00" * padding_len]
+    chunks = []
+    chunk_parts = []
+    chunk_missing_len = chunk_len
+    for segment in segments:
+        while segment:
+            part, segment = segment[:chunk_missing_len], segment[chunk_missing_len:]
+            chunk_parts.append(part)
+            chunk_missing_len -= len(part)
+            if not chunk_missing_len:
+                chunks.append(b"".join(chunk_parts))
+                chunk_parts = []
+                chunk_missing_len = chunk_len
+
+    return chunks
 
 
 def generate_checksum_chunk(chunks: List[bytes]) -> bytes:
@@ -50,9 +89,18 @@ def rebuild_block_from_chunks(chunks: List[Optional[bytes]], checksum_chunk: byt
     except StopIteration:
         pass
 
-    payload = b"".join(chunks)
-    block_len, = struct.unpack("!I", payload[:4])
-    return payload[4 : 4 + block_len]
+    # Block len header may be spread across multiple (small) chunks
+    block_len, = struct.unpack("!I", bytes(islice(chain.from_iterable(chunks), 4)))
+    # Strip the header and the padding on views to copy block data only once
+    block_parts = []
+    header_missing_len = 4
+    block_missing_len = block_len
+    for chunk in chunks:
+        part = memoryview(chunk)[header_missing_len : header_missing_len + block_missing_len]
+        header_missing_len = max(header_missing_len - len(chunk), 0)
+        block_missing_len -= len(part)
+        block_parts.append(part)
+    return b"".join(block_parts)
 
 
 class RAID5BlockStoreComponent(BaseBlockStoreComponent):
@@ -2,7 +2,9 @@
 
 import trio
 import boto3
+from botocore.config import Config as S3Config
 from botocore.exceptions import (
+    BotoCoreError as S3BotoCoreError,
     ClientError as S3ClientError,
     EndpointConnectionError as S3EndpointConnectionError,
 )
@@ -10,59 +12,84 @@ from uuid import UUID
 from functools import partial
 
 from parsec.api.protocol import OrganizationID
+from parsec.backend.config import DEFAULT_S3_MAX_POOL_CONNECTIONS, DEFAULT_S3_MAX_CONCURRENCY
 from parsec.backend.blockstore import BaseBlockStoreComponent
-from parsec.backend.block import BlockAlreadyExistsError, BlockNotFoundError, BlockTimeoutError
+from parsec.backend.block import BlockNotFoundError, BlockTimeoutError
 
 
 class S3BlockStoreComponent(BaseBlockStoreComponent):
-    def __init__(self, s3_region, s3_bucket, s3_key, s3_secret, s3_endpoint_url=None):
+    def __init__(
+        self,
+        s3_region,
+        s3_bucket,
+        s3_key,
+        s3_secret,
+        s3_endpoint_url=None,
+        s3_max_pool_connections=DEFAULT_S3_MAX_POOL_CONNECTIONS,
+        s3_max_concurrency=DEFAULT_S3_MAX_CONCURRENCY,
+    ):
         self._s3 = None
         self._s3_bucket = None
+        # boto3 is synchronous, so each request is run in a worker thread.
+        # The client (and its underlying HTTP connection pool) is thread-safe and
+        # shared between all the workers, hence connections are reused across
+        # requests instead of doing a new TCP/TLS handshake each time.
         self._s3 = boto3.client(
             "s3",
             region_name=s3_region,
             aws_access_key_id=s3_key,
             aws_secret_access_key=s3_secret,
             endpoint_url=s3_endpoint_url,
+            config=S3Config(max_pool_connections=s3_max_pool_connections),
         )
         self._s3_bucket = s3_bucket
+        # Bound the number of worker threads busy with S3 requests
+        self._limiter = trio.CapacityLimiter(s3_max_concurrency)
         self._s3.head_bucket(Bucket=s3_bucket)
 
+    async def _run_in_thread(self, fn, *args, **kwargs):
+        return await trio.to_thread.run_sync(
+            partial(fn, *args, **kwargs), cancellable=True, limiter=self._limiter
+        )
+
+    def _get_object_data(self, slug: str) -> bytes:
+        obj = self._s3.get_object(Bucket=self._s3_bucket, Key=slug)
+        # Reading the body is where most of the I/O occurs, so it must
+        # stay in the worker thread as well
+        return obj["Body"].read()
+
+    def _create_object(self, slug: str, block: bytes) -> None:
+        # HEAD and PUT are done in the same worker thread to not pay for two
+        # thread round trips. Existing block is left untouched (see below).
+        try:
+            self._s3.head_object(Bucket=self._s3_bucket, Key=slug)
+        except S3ClientError as exc:
+            if exc.response["Error"]["Code"] not in ("404", "NoSuchKey"):
+                raise
+            self._s3.put_object(Bucket=self._s3_bucket, Key=slug, Body=block)
+
     async def read(self, organization_id: OrganizationID, id: UUID) -> bytes:
         slug = f"{organization_id}/{id}"
         try:
-            obj = self._s3.get_object(Bucket=self._s3_bucket, Key=slug)
+            return await self._run_in_thread(self._get_object_data, slug)
 
         except S3ClientError as exc:
-            if exc.response["Error"]["Code"] == "404":
+            if exc.response["Error"]["Code"] in ("404", "NoSuchKey"):
                 raise BlockNotFoundError() from exc
 
             else:
                 raise BlockTimeoutError() from exc
 
-        except S3EndpointConnectionError as exc:
+        except (S3EndpointConnectionError, S3BotoCoreError) as exc:
             raise BlockTimeoutError() from exc
 
-        return obj["Body"].read()
-
     async def create(self, organization_id: OrganizationID, id: UUID, block: bytes) -> None:
         slug = f"{organization_id}/{id}"
+        # Blockstores are idempotent: if the block already exists, success is
+        # returned without any modification (the data may have been uploaded
+        # by a concurrent creation which is going to be the one to succeed)
         try:
-            await trio.to_thread.run_sync(
-                partial(self._s3.head_object, Bucket=self._s3_bucket, Key=slug)
-            )
-        except S3ClientError as exc:
-            if exc.response["Error"]["Code"] == "404":
-                try:
-                    await trio.to_thread.run_sync(
-                        partial(self._s3.put_object, Bucket=self._s3_bucket, Key=slug, Body=block)
-                    )
-                except (S3ClientError, S3EndpointConnectionError) as exc:
-                    raise BlockTimeoutError() from exc
-            else:
-                raise BlockTimeoutError() from exc
+            await self._run_in_thread(self._create_object, slug, block)
 
-        except S3EndpointConnectionError as exc:
+        except (S3ClientError, S3EndpointConnectionError, S3BotoCoreError) as exc:
             raise BlockTimeoutError() from exc
-        else:
-            raise BlockAlreadyExistsError()
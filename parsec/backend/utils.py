@@ -88,6 +88,11 @@ async def run_with_breathing_transport(transport, fn, *args, **kwargs):
     online and handles websocket pings
     """
 
+    # On a multiplexed transport the connection is already monitored by the
+    # loop receiving the requests, and a new request doesn't cancel this one
+    if transport.multiplexed:
+        return await fn(*args, **kwargs)
+
     rep = None
 
     async def _keep_transport_breathing():
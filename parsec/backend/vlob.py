@@ -8,8 +8,10 @@ from parsec.utils import timestamps_in_the_ballpark
 from parsec.api.protocol import (
     DeviceID,
     OrganizationID,
+    HandshakeType,
     vlob_create_serializer,
     vlob_read_serializer,
+    vlob_read_batch_serializer,
     vlob_update_serializer,
     vlob_poll_changes_serializer,
     vlob_list_versions_serializer,
@@ -124,6 +126,42 @@ class BaseVlobComponent:
             }
         )
 
+    @api("vlob_read_batch", handshake_types=[HandshakeType.AUTHENTICATED])
+    @catch_protocol_errors
+    async def api_vlob_read_batch(self, client_ctx, msg):
+        msg = vlob_read_batch_serializer.req_load(msg)
+
+        try:
+            vlobs = await self.read_batch(client_ctx.organization_id, client_ctx.device_id, **msg)
+
+        except VlobNotFoundError as exc:
+            return vlob_read_batch_serializer.rep_dump({"status": "not_found", "reason": str(exc)})
+
+        except VlobAccessError:
+            return vlob_read_batch_serializer.rep_dump({"status": "not_allowed"})
+
+        except VlobEncryptionRevisionError:
+            return vlob_read_batch_serializer.rep_dump({"status": "bad_encryption_revision"})
+
+        except VlobInMaintenanceError:
+            return vlob_read_batch_serializer.rep_dump({"status": "in_maintenance"})
+
+        return vlob_read_batch_serializer.rep_dump(
+            {
+                "status": "ok",
+                "vlobs": [
+                    {
+                        "vlob_id": vlob_id,
+                        "version": version,
+                        "blob": blob,
+                        "author": author,
+                        "timestamp": created_on,
+                    }
+                    for vlob_id, version, blob, author, created_on in vlobs
+                ],
+            }
+        )
+
     @api("vlob_update")
     @catch_protocol_errors
     async def api_vlob_update(self, client_ctx, msg):
@@ -161,13 +199,13 @@ class BaseVlobComponent:
     async def api_vlob_poll_changes(self, client_ctx, msg):
         msg = vlob_poll_changes_serializer.req_load(msg)
 
-        # TODO: raise error if too many events since offset ?
         try:
-            checkpoint, changes = await self.poll_changes(
+            checkpoint, changes, has_more = await self.poll_changes(
                 client_ctx.organization_id,
                 client_ctx.device_id,
                 msg["realm_id"],
                 msg["last_checkpoint"],
+                limit=msg["limit"],
             )
 
         except VlobAccessError:
@@ -182,7 +220,12 @@ class BaseVlobComponent:
             return vlob_poll_changes_serializer.rep_dump({"status": "in_maintenance"})
 
         return vlob_poll_changes_serializer.rep_dump(
-            {"status": "ok", "current_checkpoint": checkpoint, "changes": changes}
+            {
+                "status": "ok",
+                "current_checkpoint": checkpoint,
+                "changes": changes,
+                "has_more": has_more,
+            }
         )
 
     @api("vlob_list_versions")
@@ -329,6 +372,27 @@ class BaseVlobComponent:
         """
         raise NotImplementedError()
 
+    async def read_batch(
+        self,
+        organization_id: OrganizationID,
+        author: DeviceID,
+        realm_id: UUID,
+        encryption_revision: int,
+        vlob_ids: List[UUID],
+        timestamp: Optional[pendulum.Pendulum] = None,
+    ) -> List[Tuple[UUID, int, bytes, DeviceID, pendulum.Pendulum]]:
+        """
+        Vlobs not part of the realm (or without version at the given timestamp)
+        are not returned.
+
+        Raises:
+            VlobAccessError
+            VlobNotFoundError: if the realm doesn't exist
+            VlobEncryptionRevisionError: if encryption_revision mismatch
+            VlobInMaintenanceError
+        """
+        raise NotImplementedError()
+
     async def update(
         self,
         organization_id: OrganizationID,
@@ -351,9 +415,18 @@ class BaseVlobComponent:
         raise NotImplementedError()
 
     async def poll_changes(
-        self, organization_id: OrganizationID, author: DeviceID, realm_id: UUID, checkpoint: int
-    ) -> Tuple[int, Dict[UUID, int]]:
+        self,
+        organization_id: OrganizationID,
+        author: DeviceID,
+        realm_id: UUID,
+        checkpoint: int,
+        limit: Optional[int] = None,
+    ) -> Tuple[int, Dict[UUID, int], bool]:
         """
+        Return the changes since `checkpoint` (at most `limit` of them) along
+        with the checkpoint to poll the next changes from and whether there
+        are more changes after it.
+
         Raises:
             VlobInMaintenanceError
             VlobNotFoundError
@@ -10,10 +10,19 @@ from functools import partial
 from parsec.crypto import SigningKey
 from parsec.event_bus import EventBus
 from parsec.api.data import EntryID
-from parsec.api.protocol import DeviceID, APIEvent, AUTHENTICATED_CMDS
+from parsec.api.protocol import (
+    DeviceID,
+    APIEvent,
+    AUTHENTICATED_CMDS,
+    MAX_CONCURRENT_MULTIPLEXED_REQUESTS,
+)
 from parsec.core.types import BackendOrganizationAddr
 from parsec.core.backend_connection import cmds
-from parsec.core.backend_connection.transport import connect_as_authenticated, TransportPool
+from parsec.core.backend_connection.transport import (
+    connect_as_authenticated,
+    TransportPool,
+    MultiplexedTransport,
+)
 from parsec.core.backend_connection.exceptions import BackendNotAvailable, BackendConnectionRefused
 from parsec.core.backend_connection.expose_cmds import expose_cmds_with_retrier
 from parsec.core.core_events import CoreEvent
@@ -75,15 +84,42 @@ def _handle_event(event_bus: EventBus, rep: dict) -> None:
         )
 
 
-def _transport_pool_factory(addr, device_id, signing_key, max_pool, keepalive):
+def _transport_pool_factory(
+    addr, device_id, signing_key, max_pool, keepalive, multiplexing, max_channels
+):
+    connect_lock = trio.Lock()
+    multiplexed_transport = None
+
     async def _connect():
-        transport = await connect_as_authenticated(
-            addr, device_id=device_id, signing_key=signing_key, keepalive=keepalive
-        )
-        transport.logger = transport.logger.bind(device_id=device_id)
-        return transport
+        nonlocal multiplexed_transport
+        async with connect_lock:
+            # With multiplexing, the pool contains channels sharing a single connection.
+            # Hence `force_fresh` only provides a fresh channel: the shared connection
+            # is not replaced while it's alive, given other channels may be using it.
+            # Once it gets closed (e.g. backend not available), the next channel
+            # triggers a new connection.
+            if multiplexed_transport and not multiplexed_transport.closed:
+                return multiplexed_transport.open_channel()
 
-    return TransportPool(_connect, max_pool=max_pool)
+            transport = await connect_as_authenticated(
+                addr,
+                device_id=device_id,
+                signing_key=signing_key,
+                keepalive=keepalive,
+                multiplexing=multiplexing,
+            )
+            transport.logger = transport.logger.bind(device_id=device_id)
+            # Older backends don't support multiplexing, fallback to a connection per command
+            if not transport.multiplexed:
+                pool.max_pool = max_pool
+                return transport
+            # Channels are cheap, so the pool is no longer bounded by `max_pool`
+            pool.max_pool = max(max_pool, max_channels)
+            multiplexed_transport = MultiplexedTransport(transport)
+            return multiplexed_transport.open_channel()
+
+    pool = TransportPool(_connect, max_pool=max_pool)
+    return pool
 
 
 class BackendAuthenticatedConn:
@@ -96,13 +132,21 @@ class BackendAuthenticatedConn:
         max_cooldown: int = 30,
         max_pool: int = 4,
         keepalive: Optional[int] = None,
+        multiplexing: bool = False,
+        max_multiplexed_channels: int = MAX_CONCURRENT_MULTIPLEXED_REQUESTS,
     ):
         if max_pool < 2:
             raise ValueError("max_pool must be at least 2 (for event listener + query sender)")
 
         self._started = False
         self._transport_pool = _transport_pool_factory(
-            addr, device_id, signing_key, max_pool, keepalive
+            addr,
+            device_id,
+            signing_key,
+            max_pool,
+            keepalive,
+            multiplexing,
+            max_multiplexed_channels,
         )
         self._status = BackendConnStatus.LOST
         self._status_exc = None
@@ -312,6 +356,12 @@ async def backend_authenticated_cmds_factory(
             except BackendNotAvailable:
                 await _destroy_transport()
                 raise
+            except trio.Cancelled:
+                # The command may have been cancelled while waiting for its
+                # response, hence the transport cannot be reused
+                with trio.CancelScope(shield=True):
+                    await _destroy_transport()
+                raise
 
     try:
         yield BackendAuthenticatedCmds(addr, _acquire_transport)
@@ -41,6 +41,7 @@ from parsec.api.protocol import (
     events_listen_serializer,
     message_get_serializer,
     vlob_read_serializer,
+    vlob_read_batch_serializer,
     vlob_create_serializer,
     vlob_update_serializer,
     vlob_poll_changes_serializer,
@@ -55,6 +56,7 @@ from parsec.api.protocol import (
     realm_finish_reencryption_maintenance_serializer,
     block_create_serializer,
     block_read_serializer,
+    block_read_batch_serializer,
     user_get_serializer,
     human_find_serializer,
     apiv1_user_find_serializer,
@@ -185,6 +187,24 @@ async def vlob_read(
     )
 
 
+async def vlob_read_batch(
+    transport: Transport,
+    realm_id: UUID,
+    encryption_revision: int,
+    vlob_ids: List[UUID],
+    timestamp: pendulum.Pendulum = None,
+) -> dict:
+    return await _send_cmd(
+        transport,
+        vlob_read_batch_serializer,
+        cmd="vlob_read_batch",
+        realm_id=realm_id,
+        encryption_revision=encryption_revision,
+        vlob_ids=vlob_ids,
+        timestamp=timestamp,
+    )
+
+
 async def vlob_update(
     transport: Transport,
     encryption_revision: int,
@@ -205,13 +225,16 @@ async def vlob_update(
     )
 
 
-async def vlob_poll_changes(transport: Transport, realm_id: UUID, last_checkpoint: int) -> dict:
+async def vlob_poll_changes(
+    transport: Transport, realm_id: UUID, last_checkpoint: int, limit: Optional[int] = None
+) -> dict:
     return await _send_cmd(
         transport,
         vlob_poll_changes_serializer,
         cmd="vlob_poll_changes",
         realm_id=realm_id,
         last_checkpoint=last_checkpoint,
+        limit=limit,
     )
 
 
@@ -334,6 +357,16 @@ async def block_read(transport: Transport, block_id: UUID) -> dict:
     return await _send_cmd(transport, block_read_serializer, cmd="block_read", block_id=block_id)
 
 
+async def block_read_batch(transport: Transport, realm_id: UUID, block_ids: List[UUID]) -> dict:
+    return await _send_cmd(
+        transport,
+        block_read_batch_serializer,
+        cmd="block_read_batch",
+        realm_id=realm_id,
+        block_ids=block_ids,
+    )
+
+
 ### Invite API ###
 
 
@@ -3,15 +3,19 @@
 import os
 import trio
 import ssl
+from itertools import count
 from async_generator import asynccontextmanager
 from structlog import get_logger
-from typing import Optional, Union
+from typing import Optional, Union, Dict
 
 from parsec.crypto import SigningKey
 from parsec.api.transport import Transport, TransportError, TransportClosedByPeer
 from parsec.api.protocol import (
     DeviceID,
     ProtocolError,
+    pack_multiplexed_message,
+    unpack_multiplexed_message,
+    MAX_REQ_ID,
     HandshakeError,
     BaseClientHandshake,
     AuthenticatedClientHandshake,
@@ -93,12 +97,14 @@ async def connect_as_authenticated(
     device_id: DeviceID,
     signing_key: SigningKey,
     keepalive: Optional[int] = None,
+    multiplexing: bool = False,
 ):
     handshake = AuthenticatedClientHandshake(
         organization_id=addr.organization_id,
         device_id=device_id,
         user_signkey=signing_key,
         root_verify_key=addr.root_verify_key,
+        multiplexing=multiplexing,
     )
     return await _connect(addr.hostname, addr.port, addr.use_ssl, keepalive, handshake)
 
@@ -161,6 +167,7 @@ async def _do_handshake(transport: Transport, handshake):
         await transport.send(answer_req)
         result_req = await transport.recv()
         handshake.process_result_req(result_req)
+        transport.multiplexed = handshake.multiplexing
 
     except TransportError as exc:
         raise BackendNotAvailable(exc) from exc
@@ -178,7 +185,16 @@ class TransportPool:
         self._connect_cb = connect_cb
         self._transports = []
         self._closed = False
-        self._lock = trio.Semaphore(max_pool)
+        self._limiter = trio.CapacityLimiter(max_pool)
+
+    @property
+    def max_pool(self) -> int:
+        return self._limiter.total_tokens
+
+    @max_pool.setter
+    def max_pool(self, max_pool: int) -> None:
+        # Shrinking the pool only takes effect once enough transports are released
+        self._limiter.total_tokens = max_pool
 
     @asynccontextmanager
     async def acquire(self, force_fresh=False):
@@ -187,7 +203,10 @@ class TransportPool:
             BackendConnectionError
             trio.ClosedResourceError: if used after having being closed
         """
-        async with self._lock:
+        # A given task is allowed to acquire multiple transports
+        borrower = object()
+        await self._limiter.acquire_on_behalf_of(borrower)
+        try:
             transport = None
             if not force_fresh:
                 try:
@@ -208,9 +227,162 @@ class TransportPool:
             except TransportClosedByPeer:
                 raise
 
+            except trio.Cancelled:
+                # The transport may be waiting for a response, don't reuse it
+                with trio.CancelScope(shield=True):
+                    await transport.aclose()
+                raise
+
             except Exception:
                 await transport.aclose()
                 raise
 
             else:
                 self._transports.append(transport)
+
+        finally:
+            self._limiter.release_on_behalf_of(borrower)
+
+
+class MultiplexedTransport:
+    """Share a multiplexed transport between concurrent requests.
+
+    Each request goes through its own channel, which exposes the same
+    `send`/`recv`/`aclose` interface as a regular transport. There is no
+    background task reading the transport: the first channel waiting for
+    a reply reads the incoming messages and dispatches them to the others.
+    """
+
+    def __init__(self, transport: Transport):
+        assert transport.multiplexed
+        self.transport = transport
+        self.logger = transport.logger
+        self._req_ids = count()
+        # Replies by request id (None while the reply is awaited)
+        self._replies: Dict[int, Optional[bytes]] = {}
+        self._recv_lock = trio.Lock()
+        self._reply_received = trio.Event()
+        self._exc = None
+
+    @property
+    def closed(self) -> bool:
+        return self._exc is not None
+
+    def open_channel(self) -> "MultiplexedChannel":
+        return MultiplexedChannel(self)
+
+    async def _close(self, exc: TransportError) -> None:
+        if self._exc is None:
+            self._exc = exc
+            await self.transport.aclose()
+
+    def _check_closed(self):
+        if self._exc is not None:
+            raise TransportError(*self._exc.args) from self._exc
+
+    async def send_request(self, raw_req: bytes) -> int:
+        """
+        Raises:
+            TransportError
+        """
+        self._check_closed()
+        req_id = next(self._req_ids) % (MAX_REQ_ID + 1)
+        self._replies[req_id] = None
+        try:
+            await self.transport.send(pack_multiplexed_message(req_id, raw_req))
+
+        except TransportError as exc:
+            del self._replies[req_id]
+            with trio.CancelScope(shield=True):
+                await self._close(exc)
+            raise
+
+        except trio.Cancelled:
+            # The message may have been partially sent, the transport is unusable
+            del self._replies[req_id]
+            with trio.CancelScope(shield=True):
+                await self._close(TransportError("Request cancelled while being sent"))
+            raise
+
+        return req_id
+
+    async def cancel_request(self, req_id: int) -> None:
+        if self._replies.pop(req_id, b"") is None and not self.closed:
+            # Let the backend know the reply is no longer expected
+            try:
+                await self.transport.send(pack_multiplexed_message(req_id, b""))
+            except TransportError as exc:
+                await self._close(exc)
+
+    async def recv_reply(self, req_id: int) -> bytes:
+        """
+        Raises:
+            TransportError
+        """
+        while True:
+            reply = self._replies.get(req_id)
+            if reply is not None:
+                del self._replies[req_id]
+                return reply
+            self._check_closed()
+
+            # Another channel is already reading, wait for it to dispatch the reply
+            if self._recv_lock.locked():
+                await self._reply_received.wait()
+                continue
+
+            async with self._recv_lock:
+                try:
+                    raw = await self.transport.recv()
+                    rep_req_id, raw_rep = unpack_multiplexed_message(raw)
+
+                except (TransportError, ProtocolError) as exc:
+                    with trio.CancelScope(shield=True):
+                        await self._close(TransportError(*exc.args))
+                    raise TransportError(*exc.args) from exc
+
+                finally:
+                    # Wake up the other channels, one of them becomes the reader
+                    self._reply_received.set()
+                    self._reply_received = trio.Event()
+
+                # Reply to a cancelled request are simply ignored
+                if rep_req_id in self._replies:
+                    self._replies[rep_req_id] = raw_rep
+
+
+class MultiplexedChannel:
+    """Single request at a time on a multiplexed transport."""
+
+    def __init__(self, multiplexed_transport: MultiplexedTransport):
+        self._multiplexed_transport = multiplexed_transport
+        self.logger = multiplexed_transport.logger
+        self._req_id = None
+
+    @property
+    def closed(self) -> bool:
+        return self._multiplexed_transport.closed
+
+    async def send(self, msg: bytes) -> None:
+        """
+        Raises:
+            TransportError
+        """
+        assert self._req_id is None
+        self._req_id = await self._multiplexed_transport.send_request(msg)
+
+    async def recv(self) -> bytes:
+        """
+        Raises:
+            TransportError
+        """
+        assert self._req_id is not None
+        rep = await self._multiplexed_transport.recv_reply(self._req_id)
+        self._req_id = None
+        return rep
+
+    async def aclose(self) -> None:
+        # Closing the channel doesn't close the underlying transport
+        if self._req_id is not None:
+            req_id, self._req_id = self._req_id, None
+            await self._multiplexed_transport.cancel_request(req_id)
@@ -12,6 +12,10 @@ from parsec.api.data import EntryID
 
 logger = get_logger()
 
+DEFAULT_SYNC_MAX_CONCURRENCY = 4
+# Number of blocks to download ahead of the cursor of a sequentially read file
+DEFAULT_READ_AHEAD_BLOCKS = 4
+
 
 def get_default_data_base_dir(environ: dict) -> Path:
     if os.name == "nt":
@@ -59,6 +63,17 @@ class CoreConfig:
     backend_max_cooldown: int = 30
     backend_connection_keepalive: Optional[int] = 29
     backend_max_connections: int = 4
+    # Share a single connection between concurrent commands (if the backend supports it)
+    backend_multiplexing: bool = False
+
+    # Number of blocks downloaded ahead of a sequential reader
+    workspace_read_ahead_blocks: int = DEFAULT_READ_AHEAD_BLOCKS
+    # Maximum size of the decrypted chunks kept in memory for each workspace
+    workspace_memory_cache_size: int = 32 * 1024 * 1024
+    # Maximum (estimated) size of the manifests kept in memory for each workspace
+    workspace_manifest_cache_size: int = 16 * 1024 * 1024
+    # Number of entries synchronized concurrently by the sync monitor for each workspace
+    sync_max_concurrency: int = DEFAULT_SYNC_MAX_CONCURRENCY
 
     invitation_token_size: int = 8
 
@@ -97,6 +112,11 @@ def config_factory(
     backend_max_cooldown: int = 30,
     backend_connection_keepalive: Optional[int] = 29,
     backend_max_connections: int = 4,
+    backend_multiplexing: bool = False,
+    workspace_read_ahead_blocks: int = DEFAULT_READ_AHEAD_BLOCKS,
+    workspace_memory_cache_size: int = 32 * 1024 * 1024,
+    workspace_manifest_cache_size: int = 16 * 1024 * 1024,
+    sync_max_concurrency: int = DEFAULT_SYNC_MAX_CONCURRENCY,
     telemetry_enabled: bool = True,
     debug: bool = False,
     gui_last_device: str = None,
@@ -121,6 +141,11 @@ def config_factory(
         backend_max_cooldown=backend_max_cooldown,
         backend_connection_keepalive=backend_connection_keepalive,
         backend_max_connections=backend_max_connections,
+        backend_multiplexing=backend_multiplexing,
+        workspace_read_ahead_blocks=workspace_read_ahead_blocks,
+        workspace_memory_cache_size=workspace_memory_cache_size,
+        workspace_manifest_cache_size=workspace_manifest_cache_size,
+        sync_max_concurrency=sync_max_concurrency,
         telemetry_enabled=telemetry_enabled,
         debug=debug,
         sentry_url=environ.get("SENTRY_URL") or None,
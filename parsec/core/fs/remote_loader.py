@@ -1,11 +1,20 @@
 # Parsec Cloud (https://parsec.cloud) Copyright (c) AGPLv3 2019 Scille SAS
 
+import math
+import trio
+from trio import MemoryReceiveChannel
 from pendulum import Pendulum, now as pendulum_now
-from typing import Dict, Optional, List, Tuple
+from typing import Dict, Optional, List, Tuple, Iterable
 
 from parsec.utils import timestamps_in_the_ballpark
 from parsec.crypto import HashDigest, CryptoError
-from parsec.api.protocol import UserID, DeviceID, RealmRole
+from parsec.api.protocol import (
+    UserID,
+    DeviceID,
+    RealmRole,
+    VLOB_READ_BATCH_MAX_SIZE,
+    BLOCK_READ_BATCH_MAX_SIZE,
+)
 from parsec.api.data import (
     DataError,
     BlockAccess,
@@ -16,6 +25,7 @@ from parsec.core.backend_connection import BackendConnectionError, BackendNotAva
 from parsec.core.types import EntryID, ChunkID
 from parsec.core.fs.exceptions import (
     FSError,
+    FSLocalMissError,
     FSRemoteSyncError,
     FSRemoteManifestNotFound,
     FSRemoteManifestNotFoundBadVersion,
@@ -29,6 +39,41 @@ from parsec.core.fs.exceptions import (
 )
 
 
+# Maximum number of block downloads/uploads performed concurrently by a single
+# remote loader. Note the actual concurrency is also bounded by the size of
+# the backend connection pool (see `CoreConfig.backend_max_connections`).
+MAX_CONCURRENT_BLOCK_DOWNLOADS = 4
+MAX_CONCURRENT_BLOCK_UPLOADS = 4
+
+# Small blocks are downloaded together with the `block_read_batch` command
+# (bigger blocks are downloaded concurrently, one request per block)
+BLOCK_READ_BATCH_MAX_BLOCK_SIZE = 64 * 1024
+# Maximum cumulated size of the blocks downloaded in one request
+BLOCK_READ_BATCH_MAX_BYTES = 1024 * 1024
+
+
+def _split_in_batches(accesses: List[BlockAccess]) -> List[List[BlockAccess]]:
+    batches = []
+    batch = []
+    batch_size = 0
+    for access in accesses:
+        if access.size > BLOCK_READ_BATCH_MAX_BLOCK_SIZE:
+            batches.append([access])
+            continue
+        if batch and (
+            batch_size + access.size > BLOCK_READ_BATCH_MAX_BYTES
+            or len(batch) >= BLOCK_READ_BATCH_MAX_SIZE
+        ):
+            batches.append(batch)
+            batch = []
+            batch_size = 0
+        batch.append(access)
+        batch_size += access.size
+    if batch:
+        batches.append(batch)
+    return batches
+
+
 class RemoteLoader:
     def __init__(
         self,
@@ -170,8 +215,90 @@ class RemoteLoader:
             FSBackendOfflineError
             FSWorkspaceInMaintenance
         """
+        async with trio.open_service_nursery() as nursery:
+            receive_channel = await self.receive_load_blocks(accesses, nursery)
+            async with receive_channel:
+                async for _ in receive_channel:
+                    pass
+
+    async def receive_load_blocks(
+        self, accesses: List[BlockAccess], nursery: trio.Nursery
+    ) -> MemoryReceiveChannel:
+        """
+        Download, decrypt and store the given blocks concurrently, the
+        returned channel yields each block access as soon as the corresponding
+        block is available in the local storage (i.e. not in the request order).
+
+        The loading tasks are started in the provided nursery, hence any
+        error is raised from this nursery.
+
+        Raises:
+            FSError
+            FSRemoteBlockNotFound
+            FSBackendOfflineError
+            FSWorkspaceInMaintenance
+            FSWorkspaceNoAccess
+        """
+        # Remove duplicates while preserving the order
+        accesses = list({access.id: access for access in accesses}.values())
+        batches = _split_in_batches(accesses)
+        batches_iter = iter(batches)
+        send_channel, receive_channel = trio.open_memory_channel(math.inf)
+
+        async def _loader(send_channel):
+            async with send_channel:
+                for batch in batches_iter:
+                    if len(batch) == 1:
+                        await self.load_block(batch[0])
+                        await send_channel.send(batch[0])
+                    else:
+                        for access in await self.load_block_batch(batch):
+                            await send_channel.send(access)
+
+        async with send_channel:
+            for _ in range(min(MAX_CONCURRENT_BLOCK_DOWNLOADS, len(batches))):
+                nursery.start_soon(_loader, send_channel.clone())
+
+        return receive_channel
+
+    async def load_block_batch(self, accesses: List[BlockAccess]) -> List[BlockAccess]:
+        """
+        Download, decrypt and store the given blocks with a single request.
+
+        Raises:
+            FSError
+            FSRemoteBlockNotFound
+            FSBackendOfflineError
+            FSWorkspaceInMaintenance
+            FSWorkspaceNoAccess
+        """
+        rep = await self._backend_cmds(
+            "block_read_batch", self.workspace_id, [access.id for access in accesses]
+        )
+        if rep["status"] == "unknown_command":
+            # Older backend, fallback to one request per block
+            for access in accesses:
+                await self.load_block(access)
+            return accesses
+        elif rep["status"] == "not_allowed":
+            # Seems we lost the access to the realm
+            raise FSWorkspaceNoReadAccess("Cannot load block: no read access")
+        elif rep["status"] == "in_maintenance":
+            raise FSWorkspaceInMaintenance(
+                f"Cannot download block while the workspace in maintenance"
+            )
+        elif rep["status"] == "not_found":
+            raise FSRemoteBlockNotFound(accesses[0])
+        elif rep["status"] != "ok":
+            raise FSError(f"Cannot download block: `{rep['status']}`")
+
         for access in accesses:
-            await self.load_block(access)
+            try:
+                ciphered = rep["blocks"][access.id]
+            except KeyError:
+                raise FSRemoteBlockNotFound(access)
+            await self._store_block(access, ciphered)
+        return accesses
 
     async def load_block(self, access: BlockAccess) -> None:
         """
@@ -196,9 +323,12 @@ class RemoteLoader:
         elif rep["status"] != "ok":
             raise FSError(f"Cannot download block: `{rep['status']}`")
 
+        await self._store_block(access, rep["block"])
+
+    async def _store_block(self, access: BlockAccess, ciphered: bytes) -> None:
         # Decryption
         try:
-            block = access.key.decrypt(rep["block"])
+            block = access.key.decrypt(ciphered)
 
         # Decryption error
         except CryptoError as exc:
@@ -208,6 +338,35 @@ class RemoteLoader:
         assert HashDigest.from_data(block) == access.digest, access
         await self.local_storage.set_clean_block(access.id, block)
 
+    async def upload_blocks(self, accesses: List[BlockAccess]) -> None:
+        """
+        Upload concurrently the dirty blocks among the given accesses.
+
+        Each block is marked as clean in the local storage as soon as it
+        has been uploaded, so if an upload fails only the remaining dirty
+        blocks are going to be uploaded on the next attempt.
+
+        Raises:
+            FSError
+            FSBackendOfflineError
+            FSWorkspaceInMaintenance
+            FSWorkspaceNoAccess
+        """
+        accesses_iter = iter(accesses)
+
+        async def _uploader():
+            for access in accesses_iter:
+                try:
+                    data = await self.local_storage.get_dirty_block(access.id)
+                # Not dirty, hence already uploaded
+                except FSLocalMissError:
+                    continue
+                await self.upload_block(access, data)
+
+        async with trio.open_service_nursery() as nursery:
+            for _ in range(min(MAX_CONCURRENT_BLOCK_UPLOADS, len(accesses))):
+                nursery.start_soon(_uploader)
+
     async def upload_block(self, access: BlockAccess, data: bytes):
         """
         Raises:
@@ -315,11 +474,107 @@ class RemoteLoader:
                 f"{version} (expecting {expected_backend_timestamp}, got {expected_timestamp})"
             )
 
+        return await self._decrypt_and_verify_manifest(
+            entry_id,
+            workspace_entry,
+            rep["blob"],
+            expected_author=expected_author,
+            expected_timestamp=expected_timestamp,
+            expected_version=expected_version,
+        )
+
+    async def load_manifests(
+        self, entry_ids: Iterable[EntryID], timestamp: Pendulum = None
+    ) -> Dict[EntryID, RemoteManifest]:
+        """
+        Download the last version (or the version at the given timestamp) of
+        multiple manifests, with a single request per batch of manifests.
+
+        Manifests not found on the backend are not returned.
+
+        Raises:
+            FSError
+            FSBackendOfflineError
+            FSWorkspaceInMaintenance
+            FSBadEncryptionRevision
+            FSWorkspaceNoAccess
+        """
+        # Remove duplicates while preserving the order
+        entry_ids = list(dict.fromkeys(entry_ids))
+        manifests = {}
+        for i in range(0, len(entry_ids), VLOB_READ_BATCH_MAX_SIZE):
+            batch = entry_ids[i : i + VLOB_READ_BATCH_MAX_SIZE]
+            workspace_entry = self.get_workspace_entry()
+            rep = await self._backend_cmds(
+                "vlob_read_batch",
+                self.workspace_id,
+                workspace_entry.encryption_revision,
+                batch,
+                timestamp=timestamp,
+            )
+            if rep["status"] == "unknown_command":
+                # Older backend, fallback to one request per manifest
+                for entry_id in batch:
+                    try:
+                        manifests[entry_id] = await self.load_manifest(
+                            entry_id, timestamp=timestamp
+                        )
+                    except (FSRemoteManifestNotFound, FSRemoteManifestNotFoundBadTimestamp):
+                        pass
+                continue
+            elif rep["status"] == "not_found":
+                # The realm doesn't exist yet, hence neither do the manifests
+                continue
+            elif rep["status"] == "not_allowed":
+                # Seems we lost the access to the realm
+                raise FSWorkspaceNoReadAccess("Cannot load manifest: no read access")
+            elif rep["status"] == "bad_encryption_revision":
+                raise FSBadEncryptionRevision(
+                    f"Cannot fetch vlobs: Bad encryption revision provided"
+                )
+            elif rep["status"] == "in_maintenance":
+                raise FSWorkspaceInMaintenance(
+                    f"Cannot download vlob while the workspace is in maintenance"
+                )
+            elif rep["status"] != "ok":
+                raise FSError(f"Cannot fetch vlobs: `{rep['status']}`")
+
+            expected_entry_ids = set(batch)
+            for item in rep["vlobs"]:
+                entry_id = EntryID(item["vlob_id"])
+                if entry_id not in expected_entry_ids:
+                    raise FSError(f"Backend returned unexpected vlob {entry_id}")
+                manifests[entry_id] = await self._decrypt_and_verify_manifest(
+                    entry_id,
+                    workspace_entry,
+                    item["blob"],
+                    expected_author=item["author"],
+                    expected_timestamp=item["timestamp"],
+                    expected_version=item["version"],
+                )
+
+        return manifests
+
+    async def _decrypt_and_verify_manifest(
+        self,
+        entry_id: EntryID,
+        workspace_entry,
+        blob: bytes,
+        expected_author: DeviceID,
+        expected_timestamp: Pendulum,
+        expected_version: int,
+    ) -> RemoteManifest:
+        """
+        Raises:
+            FSError
+            FSBackendOfflineError
+            FSWorkspaceNoAccess
+        """
         author = await self.remote_device_manager.get_device(expected_author)
 
         try:
             remote_manifest = RemoteManifest.decrypt_verify_and_load(
-                rep["blob"],
+                blob,
                 key=workspace_entry.key,
                 author_verify_key=author.verify_key,
                 expected_author=expected_author,
@@ -516,6 +771,9 @@ class RemoteLoaderTimestamped(RemoteLoader):
         self._realm_role_certificates_cache_timestamp = None
         self.timestamp = timestamp
 
+    async def upload_blocks(self, *e, **ke):
+        raise FSError(f"Cannot upload block through a timestamped remote loader")
+
     async def upload_block(self, *e, **ke):
         raise FSError(f"Cannot upload block through a timestamped remote loader")
 
@@ -551,6 +809,19 @@ class RemoteLoaderTimestamped(RemoteLoader):
             expected_backend_timestamp=expected_backend_timestamp,
         )
 
+    async def load_manifests(
+        self, entry_ids: Iterable[EntryID], timestamp: Pendulum = None
+    ) -> Dict[EntryID, RemoteManifest]:
+        """
+        Raises:
+            FSError
+            FSBackendOfflineError
+            FSWorkspaceInMaintenance
+            FSBadEncryptionRevision
+            FSWorkspaceNoAccess
+        """
+        return await super().load_manifests(entry_ids, timestamp=timestamp or self.timestamp)
+
     async def upload_manifest(self, *e, **ke):
         raise FSError(f"Cannot upload manifest through a timestamped remote loader")
 
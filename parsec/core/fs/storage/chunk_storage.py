@@ -1,6 +1,7 @@
 # Parsec Cloud (https://parsec.cloud) Copyright (c) AGPLv3 2019 Scille SAS
 
 import time
+from typing import Dict
 
 import trio
 from async_generator import asynccontextmanager
@@ -11,6 +12,10 @@ from parsec.core.types import LocalDevice, DEFAULT_BLOCK_SIZE
 from parsec.core.fs.storage.local_database import LocalDatabase
 
 
+# Number of block access times kept in memory before being written to the database
+ACCESS_TIMES_FLUSH_THRESHOLD = 1000
+
+
 class ChunkStorage:
     """Interface to access the local chunks of data."""
 
@@ -44,11 +49,14 @@ class ChunkStorage:
         # an acutal flush operation is performed.
         return self.localdb.open_cursor(commit=False)
 
+    def _open_read_cursor(self):
+        return self.localdb.open_read_cursor()
+
     # Database initialization
 
     async def _create_db(self):
         async with self._open_cursor() as cursor:
-            cursor.execute(
+            await cursor.execute(
                 """CREATE TABLE IF NOT EXISTS chunks
                     (chunk_id BLOB PRIMARY KEY NOT NULL, -- UUID
                      size INTEGER NOT NULL,
@@ -61,72 +69,90 @@ class ChunkStorage:
     # Size and chunks
 
     async def get_nb_blocks(self):
-        async with self._open_cursor() as cursor:
-            cursor.execute("SELECT COUNT(*) FROM chunks")
-            result, = cursor.fetchone()
+        async with self._open_read_cursor() as cursor:
+            await cursor.execute("SELECT COUNT(*) FROM chunks")
+            result, = await cursor.fetchone()
             return result
 
     async def get_total_size(self):
-        async with self._open_cursor() as cursor:
-            cursor.execute("SELECT COALESCE(SUM(size), 0) FROM chunks")
-            result, = cursor.fetchone()
+        async with self._open_read_cursor() as cursor:
+            await cursor.execute("SELECT COALESCE(SUM(size), 0) FROM chunks")
+            result, = await cursor.fetchone()
             return result
 
     # Generic chunk operations
 
     async def is_chunk(self, chunk_id: ChunkID):
-        async with self._open_cursor() as cursor:
-            cursor.execute("SELECT chunk_id FROM chunks WHERE chunk_id = ?", (chunk_id.bytes,))
-            manifest_row = cursor.fetchone()
+        async with self._open_read_cursor() as cursor:
+            await cursor.execute(
+                "SELECT chunk_id FROM chunks WHERE chunk_id = ?", (chunk_id.bytes,)
+            )
+            manifest_row = await cursor.fetchone()
         return bool(manifest_row)
 
     async def get_chunk(self, chunk_id: ChunkID):
-        async with self._open_cursor() as cursor:
-            cursor.execute(
-                """
-                UPDATE chunks SET accessed_on = ? WHERE chunk_id = ?;
-                """,
-                (time.time(), chunk_id.bytes),
+        async with self._open_read_cursor() as cursor:
+            await cursor.execute(
+                """SELECT data FROM chunks WHERE chunk_id = ?""", (chunk_id.bytes,)
             )
-            cursor.execute("SELECT changes()")
-            changes, = cursor.fetchone()
-            if not changes:
-                raise FSLocalMissError(chunk_id)
-
-            cursor.execute("""SELECT data FROM chunks WHERE chunk_id = ?""", (chunk_id.bytes,))
-            ciphered, = cursor.fetchone()
+            row = await cursor.fetchone()
+        if not row:
+            raise FSLocalMissError(chunk_id)
+        ciphered, = row
 
         return self.local_symkey.decrypt(ciphered)
 
+    async def _insert_chunk(self, cursor, chunk_id: ChunkID, ciphered: bytes):
+        await cursor.execute(
+            """INSERT OR REPLACE INTO
+            chunks (chunk_id, size, offline, accessed_on, data)
+            VALUES (?, ?, ?, ?, ?)""",
+            (chunk_id.bytes, len(ciphered), False, time.time(), ciphered),
+        )
+
     async def set_chunk(self, chunk_id: ChunkID, raw: bytes):
         assert isinstance(raw, (bytes, bytearray))
         ciphered = self.local_symkey.encrypt(raw)
 
         # Update database
         async with self._open_cursor() as cursor:
-            cursor.execute(
-                """INSERT OR REPLACE INTO
-                chunks (chunk_id, size, offline, accessed_on, data)
-                VALUES (?, ?, ?, ?, ?)""",
-                (chunk_id.bytes, len(ciphered), False, time.time(), ciphered),
-            )
+            await self._insert_chunk(cursor, chunk_id, ciphered)
 
     async def clear_chunk(self, chunk_id: ChunkID):
         async with self._open_cursor() as cursor:
-            cursor.execute("DELETE FROM chunks WHERE chunk_id = ?", (chunk_id.bytes,))
-            cursor.execute("SELECT changes()")
-            changes, = cursor.fetchone()
+            await cursor.execute("DELETE FROM chunks WHERE chunk_id = ?", (chunk_id.bytes,))
+            await cursor.execute("SELECT changes()")
+            changes, = await cursor.fetchone()
 
         if not changes:
             raise FSLocalMissError(chunk_id)
 
 
 class BlockStorage(ChunkStorage):
-    """Interface for caching the data blocks."""
+    """Interface for caching the data blocks.
+
+    The number of blocks and their total size are tracked in memory so the
+    cache limit can be checked without querying the database. Similarly, the
+    access times are kept in memory and written by batch, so reading a block
+    doesn't involve a write.
+    """
 
     def __init__(self, device: LocalDevice, localdb: LocalDatabase, cache_size: int):
         super().__init__(device, localdb)
         self.cache_size = cache_size
+        self._nb_blocks = 0
+        self._total_size = 0
+        self._pending_access_times: Dict[ChunkID, float] = {}
+
+    @classmethod
+    @asynccontextmanager
+    async def run(cls, *args, **kwargs):
+        async with super().run(*args, **kwargs) as self:
+            try:
+                yield self
+            finally:
+                with trio.CancelScope(shield=True):
+                    await self.flush_access_times()
 
     def _open_cursor(self):
         # It doesn't matter for blocks to be commited as soon as they're added
@@ -135,6 +161,49 @@ class BlockStorage(ChunkStorage):
         # least compare to the downloading of the block).
         return self.localdb.open_cursor(commit=True)
 
+    # Database initialization
+
+    async def _create_db(self):
+        await super()._create_db()
+        async with self._open_cursor() as cursor:
+            # Used to find the least recently accessed blocks
+            await cursor.execute(
+                "CREATE INDEX IF NOT EXISTS chunks_accessed_on ON chunks (accessed_on);"
+            )
+            await cursor.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM chunks")
+            self._nb_blocks, self._total_size = await cursor.fetchone()
+
+    # Size and chunks
+
+    async def get_nb_blocks(self):
+        return self._nb_blocks
+
+    async def get_total_size(self):
+        return self._total_size
+
+    # Access times
+
+    async def record_access(self, chunk_id: ChunkID):
+        # Access time is only written to the database by batch
+        self._pending_access_times[chunk_id] = time.time()
+        if len(self._pending_access_times) >= ACCESS_TIMES_FLUSH_THRESHOLD:
+            await self.flush_access_times()
+
+    async def flush_access_times(self):
+        # Losing those access times (e.g. if the update fails) only makes
+        # the eviction less accurate, so there is no need to restore them
+        pending_access_times, self._pending_access_times = self._pending_access_times, {}
+        if not pending_access_times:
+            return
+        async with self._open_cursor() as cursor:
+            await cursor.executemany(
+                "UPDATE chunks SET accessed_on = ? WHERE chunk_id = ?",
+                (
+                    (accessed_on, chunk_id.bytes)
+                    for chunk_id, accessed_on in pending_access_times.items()
+                ),
+            )
+
     # Garbage collection
 
     @property
@@ -143,30 +212,64 @@ class BlockStorage(ChunkStorage):
 
     async def clear_all_blocks(self):
         async with self._open_cursor() as cursor:
-            cursor.execute("DELETE FROM chunks")
+            await cursor.execute("DELETE FROM chunks")
+            self._nb_blocks = 0
+            self._total_size = 0
+        self._pending_access_times.clear()
 
     async def clear_old_blocks(self, limit):
+        # Make sure the recently accessed blocks are not considered old
+        await self.flush_access_times()
+
         async with self._open_cursor() as cursor:
-            cursor.execute(
-                """
-                DELETE FROM chunks WHERE chunk_id IN (
-                    SELECT chunk_id FROM chunks ORDER BY accessed_on ASC LIMIT ?
-                )
-                """,
-                (limit,),
+            await cursor.execute(
+                "SELECT chunk_id, size FROM chunks ORDER BY accessed_on ASC LIMIT ?", (limit,)
             )
+            rows = await cursor.fetchall()
+            await cursor.executemany(
+                "DELETE FROM chunks WHERE chunk_id = ?", ((chunk_id,) for chunk_id, _ in rows)
+            )
+            self._nb_blocks -= len(rows)
+            self._total_size -= sum(size for _, size in rows)
+
+    # Upgraded chunk methods
 
-    # Upgraded set method
+    async def get_chunk(self, chunk_id: ChunkID):
+        data = await super().get_chunk(chunk_id)
+        await self.record_access(chunk_id)
+        return data
 
     async def set_chunk(self, chunk_id: ChunkID, raw: bytes):
+        assert isinstance(raw, (bytes, bytearray))
+        ciphered = self.local_symkey.encrypt(raw)
+
         # Actual set operation
-        await super().set_chunk(chunk_id, raw)
+        async with self._open_cursor() as cursor:
+            await cursor.execute("SELECT size FROM chunks WHERE chunk_id = ?", (chunk_id.bytes,))
+            row = await cursor.fetchone()
+            await self._insert_chunk(cursor, chunk_id, ciphered)
+            if row:
+                self._nb_blocks -= 1
+                self._total_size -= row[0]
+            self._nb_blocks += 1
+            self._total_size += len(ciphered)
+        self._pending_access_times.pop(chunk_id, None)
 
         # Clean up if necessary
-        nb_blocks = await self.get_nb_blocks()
-        extra_blocks = nb_blocks - self.block_limit
+        extra_blocks = self._nb_blocks - self.block_limit
         if extra_blocks > 0:
 
             # Remove the extra block plus 10 % of the cache size, i.e about 100 blocks
             limit = extra_blocks + self.block_limit // 10
             await self.clear_old_blocks(limit=limit)
+
+    async def clear_chunk(self, chunk_id: ChunkID):
+        async with self._open_cursor() as cursor:
+            await cursor.execute("SELECT size FROM chunks WHERE chunk_id = ?", (chunk_id.bytes,))
+            row = await cursor.fetchone()
+            if not row:
+                raise FSLocalMissError(chunk_id)
+            await cursor.execute("DELETE FROM chunks WHERE chunk_id = ?", (chunk_id.bytes,))
+            self._nb_blocks -= 1
+            self._total_size -= row[0]
+        self._pending_access_times.pop(chunk_id, None)
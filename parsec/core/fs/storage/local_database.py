@@ -29,7 +29,14 @@ async def thread_pool_runner(max_workers=None):
             trio.from_thread.run_sync(send_channel.send_nowait, result, trio_token=trio_token)
 
         executor.submit(target)
-        result = await receive_channel.receive()
+        try:
+            result = await receive_channel.receive()
+        except trio.Cancelled:
+            # The job cannot be cancelled, so wait for it to be done: this way
+            # the caller knows the resources used by the job are released
+            with trio.CancelScope(shield=True):
+                await receive_channel.receive()
+            raise
         return result.unwrap()
 
     # The thread pool executor cannot be used as a sync context here, as it would
@@ -44,7 +51,7 @@ async def thread_pool_runner(max_workers=None):
 def protect_with_lock(fn):
     """Use as a decorator to protect an async method with `self._lock`.
 
-    Also works with async gen method so it can be used for `open_cursor`.
+    Also works with async gen method.
     """
 
     if inspect.isasyncgenfunction(fn):
@@ -66,14 +73,54 @@ def protect_with_lock(fn):
     return wrapper
 
 
+class AsyncCursor:
+    """Wrapper around a sqlite3 cursor running all the statements and fetches
+    in the worker thread of the database.
+
+    This way, no disk access is performed from the trio thread.
+    """
+
+    def __init__(self, cursor, run_in_thread):
+        self._cursor = cursor
+        self._run_in_thread = run_in_thread
+
+    async def execute(self, sql, parameters=()):
+        await self._run_in_thread(self._cursor.execute, sql, parameters)
+
+    async def executemany(self, sql, seq_of_parameters):
+        # Consume the parameters in the trio thread, they might rely on trio-side objects
+        await self._run_in_thread(self._cursor.executemany, sql, list(seq_of_parameters))
+
+    async def fetchone(self):
+        return await self._run_in_thread(self._cursor.fetchone)
+
+    async def fetchall(self):
+        return await self._run_in_thread(self._cursor.fetchall)
+
+
+# Maximum number of read-only connections opened in parallel of the writer one
+DEFAULT_READ_POOL_SIZE = 4
+
+
 class LocalDatabase:
-    """Base class for managing an sqlite3 connection."""
+    """Base class for managing an sqlite3 connection.
 
-    def __init__(self, path, vacuum_threshold=None):
+    All the writes go through a single connection protected by a lock, while
+    the read-only queries can be run concurrently on a pool of read-only
+    connections (thanks to the WAL journal mode).
+    """
+
+    def __init__(self, path, vacuum_threshold=None, read_pool_size=DEFAULT_READ_POOL_SIZE):
         self._conn = None
         self._lock = trio.Lock()
         self._run_in_thread = None
 
+        # Reader connections are created on demand
+        self._readers = []
+        self._read_pool_size = read_pool_size
+        self._read_semaphore = trio.Semaphore(read_pool_size)
+        self._run_in_read_thread = None
+
         self.path = Path(path)
         self.vacuum_threshold = vacuum_threshold
 
@@ -87,17 +134,22 @@ class LocalDatabase:
         # (although the lock already protects against concurrent access to the pool)
         async with thread_pool_runner(max_workers=1) as self._run_in_thread:
 
-            # Create the connection to the sqlite database
-            try:
-                await self._connect()
+            # Run a pool with a worker thread per reader connection
+            async with thread_pool_runner(
+                max_workers=self._read_pool_size
+            ) as self._run_in_read_thread:
 
-                # Yield the instance
-                yield self
+                # Create the connection to the sqlite database
+                try:
+                    await self._connect()
 
-            # Safely flush and close the connection
-            finally:
-                with trio.CancelScope(shield=True):
-                    await self._close()
+                    # Yield the instance
+                    yield self
+
+                # Safely flush and close the connection
+                finally:
+                    with trio.CancelScope(shield=True):
+                        await self._close()
 
     # Life cycle
 
@@ -122,6 +174,11 @@ class LocalDatabase:
         # Return connection
         return conn
 
+    async def _create_read_connection(self):
+        # The database file has already been created by the writer connection
+        uri = f"{self.path.resolve().as_uri()}?mode=ro"
+        return sqlite_connect(uri, uri=True, check_same_thread=False)
+
     @protect_with_lock
     async def _connect(self):
         if self._conn is not None:
@@ -136,30 +193,83 @@ class LocalDatabase:
         if self._conn is None:
             return
 
+        # Wait for the reader connections to be released and close them
+        async with self._acquire_all_readers():
+            for reader in self._readers:
+                reader.close()
+            self._readers.clear()
+
         # Commit and close
         await self._run_in_thread(self._conn.commit)
         self._conn.close()
         self._conn = None
 
+    @asynccontextmanager
+    async def _acquire_all_readers(self):
+        for _ in range(self._read_pool_size):
+            await self._read_semaphore.acquire()
+        try:
+            yield
+        finally:
+            for _ in range(self._read_pool_size):
+                self._read_semaphore.release()
+
     # Cursor management
 
     @asynccontextmanager
-    @protect_with_lock
     async def open_cursor(self, commit=True):
-        # Get a cursor
-        cursor = self._conn.cursor()
-        try:
+        # Not using `protect_with_lock` here, given the cancel scope used when
+        # closing the cursor must be handled by a proper async context manager
+        async with self._lock:
 
-            # Execute SQL commands
-            yield cursor
+            # Get a cursor
+            cursor = self._conn.cursor()
+            try:
 
-            # Commit the transaction when finished
-            if commit and self._conn.in_transaction:
-                await self._run_in_thread(self._conn.commit)
+                # Execute SQL commands
+                yield AsyncCursor(cursor, self._run_in_thread)
 
-        # Close cursor
-        finally:
-            cursor.close()
+                # Commit the transaction when finished
+                if commit and self._conn.in_transaction:
+                    await self._run_in_thread(self._conn.commit)
+
+            # Close cursor
+            finally:
+                # A cancelled statement might still be running in the worker thread,
+                # closing the cursor from there ensures it happens once it's done
+                with trio.CancelScope(shield=True):
+                    await self._run_in_thread(cursor.close)
+
+    @asynccontextmanager
+    async def open_read_cursor(self):
+        """Open a cursor for read-only queries.
+
+        Reader connections only see the committed data, so the writer
+        connection is used instead when it has uncommitted changes.
+        """
+        if self._conn.in_transaction:
+            async with self.open_cursor(commit=False) as cursor:
+                yield cursor
+            return
+
+        async with self._read_semaphore:
+            # Get a reader connection
+            try:
+                reader = self._readers.pop()
+            except IndexError:
+                reader = await self._create_read_connection()
+            cursor = reader.cursor()
+            try:
+
+                # Execute SQL commands
+                yield AsyncCursor(cursor, self._run_in_read_thread)
+
+            # Close cursor and release the connection (a cancelled statement is
+            # done by now, see `thread_pool_runner`)
+            finally:
+                with trio.CancelScope(shield=True):
+                    await self._run_in_read_thread(cursor.close)
+                self._readers.append(reader)
 
     @protect_with_lock
     async def commit(self):
@@ -189,11 +299,16 @@ class LocalDatabase:
         if self.get_disk_usage() < self.vacuum_threshold:
             return
 
-        # Run vacuum
-        await self._run_in_thread(self._conn.execute, "VACUUM")
+        # Run vacuum (the reader connections must not be in use meanwhile)
+        async with self._acquire_all_readers():
+            await self._run_in_thread(self._conn.execute, "VACUUM")
 
-        # The connection needs to be recreated
-        try:
-            self._conn.close()
-        finally:
-            self._conn = await self._create_connection()
+            # The connections need to be recreated, the reader ones are closed
+            # as well, otherwise the WAL file would be kept at its current size
+            for reader in self._readers:
+                reader.close()
+            self._readers.clear()
+            try:
+                self._conn.close()
+            finally:
+                self._conn = await self._create_connection()
@@ -1,31 +1,100 @@
 # Parsec Cloud (https://parsec.cloud) Copyright (c) AGPLv3 2019 Scille SAS
 
 import trio
+from collections import OrderedDict
 from structlog import get_logger
-from typing import Dict, Tuple, Set, Optional
+from typing import Dict, List, Tuple, Set, Optional, Callable, Iterable
 from async_generator import asynccontextmanager
 
 from parsec.core.fs.exceptions import FSLocalMissError
-from parsec.core.types import EntryID, ChunkID, LocalDevice, LocalManifest
+from parsec.core.types import (
+    EntryID,
+    ChunkID,
+    LocalDevice,
+    LocalManifest,
+    LocalFileManifest,
+    LocalFolderManifest,
+    LocalWorkspaceManifest,
+    LocalUserManifest,
+    LocalFolderishManifestDelta,
+)
 from parsec.core.fs.storage.local_database import LocalDatabase
 
 logger = get_logger()
 
+DEFAULT_MANIFEST_CACHE_SIZE = 16 * 1024 * 1024
+# Rough memory footprint of a loaded manifest (measured with tracemalloc), each
+# child/chunk/workspace entry is stored twice given the local manifest also
+# holds its base remote manifest
+MANIFEST_BASE_SIZE = 1024
+MANIFEST_ITEM_SIZE = 512
+
+# Folders with at least this many children are persisted incrementally: a
+# modification only appends a delta to the localdb instead of rewriting (and
+# re-encrypting) all the children. The deltas are compacted back into the
+# manifest once they become too many or too big, and when the storage closes
+# (hence the localdb is kept in the regular format as much as possible).
+# While a folder has deltas, its row in `vlobs` holds an empty blob (the base
+# manifest is moved to the deltas table), so a client unaware of the deltas
+# fails to load it instead of using (or even uploading) an outdated manifest.
+FOLDER_DELTA_MIN_CHILDREN = 1000
+FOLDER_DELTA_MAX_COUNT = 100
+
+# Content of the `vlobs` blob while the manifest is in the deltas table
+MOVED_BLOB = b""
+
+# Stay below sqlite's default limit of 999 variables per statement
+MISSING_MANIFEST_IDS_BATCH_SIZE = 500
+
+
+def estimate_manifest_size(manifest: LocalManifest) -> int:
+    if isinstance(manifest, LocalFileManifest):
+        items = sum(len(chunks) for chunks in manifest.blocks)
+    elif isinstance(manifest, LocalUserManifest):
+        items = len(manifest.workspaces)
+    else:
+        items = len(manifest.children)
+    return MANIFEST_BASE_SIZE + items * MANIFEST_ITEM_SIZE
+
 
 class ManifestStorage:
     """Persistent storage with cache for storing manifests.
 
     Also stores the checkpoint.
+
+    The cache is bounded to `cache_size` bytes (according to the estimated
+    size of the manifests, `None` for no limit) and evicts the least recently
+    used manifests, except the ones that are not yet written to the localdb.
     """
 
-    def __init__(self, device: LocalDevice, localdb: LocalDatabase, realm_id: EntryID):
+    def __init__(
+        self,
+        device: LocalDevice,
+        localdb: LocalDatabase,
+        realm_id: EntryID,
+        on_chunks_removed: Optional[Callable[[Iterable[ChunkID]], None]] = None,
+        cache_size: Optional[int] = DEFAULT_MANIFEST_CACHE_SIZE,
+    ):
         self.device = device
         self.localdb = localdb
         self.realm_id = realm_id
 
-        # This cache contains all the manifests that have been set or accessed
-        # since the last call to `clear_memory_cache`
+        # Called with the ids of the chunks removed from the localdb
+        self.on_chunks_removed = on_chunks_removed
+
+        # This cache contains the manifests that have been set or accessed
+        # since the last call to `clear_memory_cache`, minus the evicted ones
         self._cache = {}
+        # Estimated size of each cached manifest
+        self._cache_entry_sizes = {}
+        # Entry ids of the cached manifests that can be evicted (i.e. the ones
+        # that are up-to-date with the localdb), least recently used first
+        self._cache_lru = OrderedDict()
+        self.max_cache_size = cache_size
+        self.cache_size = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.cache_evictions = 0
 
         # This dictionnary keeps track of all the entry ids of the manifests
         # that have been added to the cache but still needs to be written to
@@ -35,6 +104,10 @@ class ManifestStorage:
         # still requires to be flushed.
         self._cache_ahead_of_localdb = {}
 
+        # Large folders as they are in the localdb, along with the number of
+        # deltas and of changed children stored since their last full write
+        self._persisted_folders: Dict[EntryID, Tuple[LocalManifest, int, int]] = {}
+
     @property
     def path(self):
         return self.localdb.path
@@ -44,28 +117,70 @@ class ManifestStorage:
     async def run(cls, *args, **kwargs):
         self = cls(*args, **kwargs)
         await self._create_db()
+        # Deltas left by a crash
+        await self._compact_folder_deltas()
         try:
             yield self
         finally:
             with trio.CancelScope(shield=True):
                 await self._flush_cache_ahead_of_persistance()
+                await self._compact_folder_deltas()
 
     def _open_cursor(self):
         # We want the manifest to be written to the disk as soon as possible
         # (unless they are purposely kept out of the local database)
         return self.localdb.open_cursor(commit=True)
 
+    def _open_read_cursor(self):
+        return self.localdb.open_read_cursor()
+
     async def clear_memory_cache(self, flush=True):
         if flush:
             await self._flush_cache_ahead_of_persistance()
         self._cache_ahead_of_localdb.clear()
         self._cache.clear()
+        self._cache_entry_sizes.clear()
+        self._cache_lru.clear()
+        self._persisted_folders.clear()
+        self.cache_size = 0
+
+    # Cache helpers
+
+    def _cache_set(self, entry_id: EntryID, manifest: LocalManifest) -> None:
+        self.cache_size -= self._cache_entry_sizes.get(entry_id, 0)
+        size = estimate_manifest_size(manifest)
+        self._cache[entry_id] = manifest
+        self._cache_entry_sizes[entry_id] = size
+        self.cache_size += size
+
+    def _cache_pop(self, entry_id: EntryID) -> Optional[LocalManifest]:
+        self.cache_size -= self._cache_entry_sizes.pop(entry_id, 0)
+        self._cache_lru.pop(entry_id, None)
+        self._persisted_folders.pop(entry_id, None)
+        return self._cache.pop(entry_id, None)
+
+    def _cache_mark_evictable(self, entry_id: EntryID) -> None:
+        # Manifests ahead of the localdb must be kept until they are flushed
+        if entry_id not in self._cache_ahead_of_localdb and entry_id in self._cache:
+            self._cache_lru[entry_id] = None
+            self._cache_lru.move_to_end(entry_id)
+            self._cache_evict()
+
+    def _cache_evict(self) -> None:
+        if self.max_cache_size is None:
+            return
+        while self.cache_size > self.max_cache_size and self._cache_lru:
+            entry_id, _ = self._cache_lru.popitem(last=False)
+            self.cache_size -= self._cache_entry_sizes.pop(entry_id)
+            del self._cache[entry_id]
+            self._persisted_folders.pop(entry_id, None)
+            self.cache_evictions += 1
 
     # Database initialization
 
     async def _create_db(self):
         async with self._open_cursor() as cursor:
-            cursor.execute(
+            await cursor.execute(
                 """
                 CREATE TABLE IF NOT EXISTS vlobs
                 (
@@ -78,8 +193,34 @@ class ManifestStorage:
                 """
             )
 
+            # Partial indexes to find the entries that need sync without
+            # scanning the whole table (created on existing databases as well)
+            await cursor.execute(
+                "CREATE INDEX IF NOT EXISTS vlobs_need_sync ON vlobs (vlob_id) WHERE need_sync = 1;"
+            )
+            await cursor.execute(
+                "CREATE INDEX IF NOT EXISTS vlobs_remote_changes ON vlobs (vlob_id) "
+                "WHERE base_version != remote_version;"
+            )
+
+            # Changes of the large folders not yet compacted into `vlobs`, the
+            # first row of a folder is its base manifest (see `MOVED_BLOB`)
+            await cursor.execute(
+                """
+                CREATE TABLE IF NOT EXISTS vlob_deltas
+                (
+                  _id INTEGER PRIMARY KEY,
+                  vlob_id BLOB NOT NULL, -- UUID
+                  blob BLOB NOT NULL
+                );
+                """
+            )
+            await cursor.execute(
+                "CREATE INDEX IF NOT EXISTS vlob_deltas_vlob_id ON vlob_deltas (vlob_id);"
+            )
+
             # Singleton storing the checkpoint
-            cursor.execute(
+            await cursor.execute(
                 """
                 CREATE TABLE IF NOT EXISTS realm_checkpoint
                 (
@@ -95,9 +236,9 @@ class ManifestStorage:
         """
         Raises: Nothing !
         """
-        async with self._open_cursor() as cursor:
-            cursor.execute("SELECT checkpoint FROM realm_checkpoint WHERE _id = 0")
-            rep = cursor.fetchone()
+        async with self._open_read_cursor() as cursor:
+            await cursor.execute("SELECT checkpoint FROM realm_checkpoint WHERE _id = 0")
+            rep = await cursor.fetchone()
             return rep[0] if rep else 0
 
     async def update_realm_checkpoint(
@@ -107,11 +248,13 @@ class ManifestStorage:
         Raises: Nothing !
         """
         async with self._open_cursor() as cursor:
-            cursor.executemany(
-                "UPDATE vlobs SET remote_version = ? WHERE vlob_id = ?",
-                ((version, entry_id.bytes) for entry_id, version in changed_vlobs.items()),
+            # Remote versions only move forward, skipping the rows that are
+            # already up to date (e.g. our own changes) avoids rewriting them
+            await cursor.executemany(
+                "UPDATE vlobs SET remote_version = ? WHERE vlob_id = ? AND remote_version < ?",
+                ((version, entry_id.bytes, version) for entry_id, version in changed_vlobs.items()),
             )
-            cursor.execute(
+            await cursor.execute(
                 """INSERT OR REPLACE INTO realm_checkpoint(_id, checkpoint)
                 VALUES (0, ?)""",
                 (new_checkpoint,),
@@ -121,19 +264,13 @@ class ManifestStorage:
         """
         Raises: Nothing !
         """
-        async with self._open_cursor() as cursor:
-            cursor.execute(
-                "SELECT vlob_id, need_sync, base_version, remote_version "
-                "FROM vlobs WHERE need_sync = 1 OR base_version != remote_version"
-            )
-            local_changes = set()
-            remote_changes = set()
-            for manifest_id, need_sync, bv, rv in cursor.fetchall():
-                manifest_id = EntryID(manifest_id)
-                if need_sync:
-                    local_changes.add(manifest_id)
-                if bv != rv:
-                    remote_changes.add(manifest_id)
+        # Two separate queries so that each one is served by its partial index
+        # (a single query with an `OR` clause would scan the whole table)
+        async with self._open_read_cursor() as cursor:
+            await cursor.execute("SELECT vlob_id FROM vlobs WHERE need_sync = 1")
+            local_changes = {EntryID(row[0]) for row in await cursor.fetchall()}
+            await cursor.execute("SELECT vlob_id FROM vlobs WHERE base_version != remote_version")
+            remote_changes = {EntryID(row[0]) for row in await cursor.fetchall()}
             return local_changes, remote_changes
 
     # Manifest operations
@@ -145,28 +282,81 @@ class ManifestStorage:
         """
         # Look in cache first
         try:
-            return self._cache[entry_id]
+            manifest = self._cache[entry_id]
         except KeyError:
-            pass
+            self.cache_misses += 1
+        else:
+            self.cache_hits += 1
+            if entry_id in self._cache_lru:
+                self._cache_lru.move_to_end(entry_id)
+            return manifest
 
         # Look into the database
-        async with self._open_cursor() as cursor:
-            cursor.execute("SELECT blob FROM vlobs WHERE vlob_id = ?", (entry_id.bytes,))
-            manifest_row = cursor.fetchone()
-
-        # Not found
-        if not manifest_row:
-            raise FSLocalMissError(entry_id)
+        manifest, count, changed = await self._load_manifest(entry_id)
 
         # Safely fill the cache
         if entry_id not in self._cache:
-            self._cache[entry_id] = LocalManifest.decrypt_and_load(
-                manifest_row[0], key=self.device.local_symkey
-            )
+            self._cache_set(entry_id, manifest)
+            self._set_persisted_folder(entry_id, manifest, count, changed)
+            self._cache_mark_evictable(entry_id)
+            return manifest
 
         # Always return the cached value
         return self._cache[entry_id]
 
+    async def _load_manifest(self, entry_id: EntryID) -> Tuple[LocalManifest, int, int]:
+        """
+        Raises:
+            FSLocalMissError
+        """
+        # The manifest and its deltas (if any) are fetched with
+        # a single statement to get a consistent snapshot
+        async with self._open_read_cursor() as cursor:
+            await cursor.execute(
+                """SELECT blob, 0 FROM vlobs WHERE vlob_id = ?
+                UNION ALL
+                SELECT blob, _id FROM vlob_deltas WHERE vlob_id = ?
+                ORDER BY 2""",
+                (entry_id.bytes, entry_id.bytes),
+            )
+            rows = await cursor.fetchall()
+
+        # Not found
+        if not rows or rows[0][1] != 0:
+            raise FSLocalMissError(entry_id)
+
+        # The base manifest has been moved along with the deltas
+        if rows[0][0] == MOVED_BLOB:
+            rows = rows[1:]
+        manifest = LocalManifest.decrypt_and_load(rows[0][0], key=self.device.local_symkey)
+        changed = 0
+        for delta_row in rows[1:]:
+            delta = LocalFolderishManifestDelta.decrypt_and_load(
+                delta_row[0], key=self.device.local_symkey
+            )
+            manifest = delta.apply(manifest)
+            changed += len(delta)
+        return manifest, len(rows) - 1, changed
+
+    async def get_missing_manifest_ids(self, entry_ids: Iterable[EntryID]) -> List[EntryID]:
+        """
+        Cheaper than a `get_manifest` per entry given nothing gets deserialized
+        and the entries are looked up in the database by batch.
+
+        Raises: Nothing !
+        """
+        missing = [entry_id for entry_id in entry_ids if entry_id not in self._cache]
+        found = set()
+        async with self._open_read_cursor() as cursor:
+            for i in range(0, len(missing), MISSING_MANIFEST_IDS_BATCH_SIZE):
+                batch = missing[i : i + MISSING_MANIFEST_IDS_BATCH_SIZE]
+                await cursor.execute(
+                    f"SELECT vlob_id FROM vlobs WHERE vlob_id IN ({', '.join('?' * len(batch))})",
+                    [entry_id.bytes for entry_id in batch],
+                )
+                found.update(EntryID(row[0]) for row in await cursor.fetchall())
+        return [entry_id for entry_id in missing if entry_id not in found]
+
     async def set_manifest(
         self,
         entry_id: EntryID,
@@ -180,10 +370,11 @@ class ManifestStorage:
         assert isinstance(entry_id, EntryID)
 
         # Set the cache first
-        self._cache[entry_id] = manifest
+        self._cache_set(entry_id, manifest)
 
-        # Tag the entry as ahead of localdb
+        # Tag the entry as ahead of localdb, hence it cannot be evicted
         self._cache_ahead_of_localdb.setdefault(entry_id, set())
+        self._cache_lru.pop(entry_id, None)
 
         # Cleanup
         if removed_ids:
@@ -194,6 +385,7 @@ class ManifestStorage:
             await self._ensure_manifest_persistent(entry_id)
 
     async def _ensure_manifest_persistent(self, entry_id: EntryID) -> None:
+        pending_chunk_ids = None
 
         # Get cursor
         async with self._open_cursor() as cursor:
@@ -202,38 +394,135 @@ class ManifestStorage:
             if entry_id not in self._cache_ahead_of_localdb:
                 return
 
-            # Safely get the manifest
+            # Safely get the manifest and tag the entry as up-to-date
+            # (this must be done before any await given the queries are run
+            # in a worker thread, letting other tasks update the cache meanwhile)
             manifest = self._cache[entry_id]
-
-            # Dump and decrypt the manifest
-            ciphered = manifest.dump_and_encrypt(self.device.local_symkey)
-
-            # Insert into the local database
-            cursor.execute(
-                """INSERT OR REPLACE INTO vlobs (vlob_id, blob, need_sync, base_version, remote_version)
-                VALUES (
-                    ?, ?, ?, ?,
-                    max(
-                        ?,
-                        IFNULL((SELECT remote_version FROM vlobs WHERE vlob_id=?), 0)
+            pending_chunk_ids = self._cache_ahead_of_localdb.pop(entry_id)
+
+            # Large folders only need their changes to be written
+            delta = self._get_folder_delta(entry_id, manifest)
+            if delta is not None:
+                _, count, changed = self._persisted_folders[entry_id]
+
+            try:
+                if delta is None:
+                    await self._write_manifest(cursor, entry_id, manifest)
+                    self._set_persisted_folder(entry_id, manifest, 0, 0)
+
+                else:
+                    # First delta: move the base manifest out of the way of the
+                    # clients that don't know about deltas (copied as is by sqlite)
+                    if not count:
+                        await cursor.execute(
+                            "INSERT INTO vlob_deltas (vlob_id, blob) "
+                            "SELECT vlob_id, blob FROM vlobs WHERE vlob_id = ?",
+                            (entry_id.bytes,),
+                        )
+                    await cursor.execute(
+                        "INSERT INTO vlob_deltas (vlob_id, blob) VALUES (?, ?)",
+                        (entry_id.bytes, delta.dump_and_encrypt(self.device.local_symkey)),
                     )
-                )""",
-                (
-                    entry_id.bytes,
-                    ciphered,
-                    manifest.need_sync,
-                    manifest.base_version,
-                    manifest.base_version,
-                    entry_id.bytes,
-                ),
-            )
+                    await cursor.execute(
+                        "UPDATE vlobs SET blob = ?, need_sync = ? WHERE vlob_id = ?",
+                        (MOVED_BLOB, manifest.need_sync, entry_id.bytes),
+                    )
+                    self._set_persisted_folder(entry_id, manifest, count + 1, changed + len(delta))
 
-            # Clean all the pending chunks
-            for chunk_id in self._cache_ahead_of_localdb[entry_id]:
-                cursor.execute("DELETE FROM chunks WHERE chunk_id = ?", (chunk_id.bytes,))
+                # Clean all the pending chunks
+                if pending_chunk_ids:
+                    await cursor.executemany(
+                        "DELETE FROM chunks WHERE chunk_id = ?",
+                        ((chunk_id.bytes,) for chunk_id in pending_chunk_ids),
+                    )
 
-            # Safely tag entry as up-to-date
-            self._cache_ahead_of_localdb.pop(entry_id)
+            # The entry is still ahead of the local database
+            except BaseException:
+                self._cache_ahead_of_localdb.setdefault(entry_id, set()).update(pending_chunk_ids)
+                raise
+
+        # The manifest is now in the localdb (unless it has been modified
+        # in the meantime), so it can be evicted from the cache
+        self._cache_mark_evictable(entry_id)
+
+        # Notify once the removal is committed
+        if pending_chunk_ids and self.on_chunks_removed is not None:
+            self.on_chunks_removed(pending_chunk_ids)
+
+    async def _write_manifest(self, cursor, entry_id: EntryID, manifest: LocalManifest) -> None:
+        # Dump and decrypt the manifest
+        ciphered = manifest.dump_and_encrypt(self.device.local_symkey)
+
+        # Insert into the local database
+        await cursor.execute(
+            """INSERT OR REPLACE INTO vlobs (vlob_id, blob, need_sync, base_version, remote_version)
+            VALUES (
+                ?, ?, ?, ?,
+                max(
+                    ?,
+                    IFNULL((SELECT remote_version FROM vlobs WHERE vlob_id=?), 0)
+                )
+            )""",
+            (
+                entry_id.bytes,
+                ciphered,
+                manifest.need_sync,
+                manifest.base_version,
+                manifest.base_version,
+                entry_id.bytes,
+            ),
+        )
+
+        # The deltas are now part of the manifest
+        await cursor.execute("DELETE FROM vlob_deltas WHERE vlob_id = ?", (entry_id.bytes,))
+
+    def _set_persisted_folder(
+        self, entry_id: EntryID, manifest: LocalManifest, count: int, changed: int
+    ) -> None:
+        if (
+            isinstance(manifest, (LocalFolderManifest, LocalWorkspaceManifest))
+            and len(manifest.children) >= FOLDER_DELTA_MIN_CHILDREN
+        ):
+            self._persisted_folders[entry_id] = (manifest, count, changed)
+        else:
+            self._persisted_folders.pop(entry_id, None)
+
+    def _get_folder_delta(
+        self, entry_id: EntryID, manifest: LocalManifest
+    ) -> Optional[LocalFolderishManifestDelta]:
+        try:
+            persisted, count, changed = self._persisted_folders[entry_id]
+        except KeyError:
+            return None
+        # A new base (i.e. the folder has been synchronized) requires a full write
+        if (
+            type(manifest) is not type(persisted)
+            or manifest.base is not persisted.base
+            or len(manifest.children) < FOLDER_DELTA_MIN_CHILDREN
+            or count >= FOLDER_DELTA_MAX_COUNT
+        ):
+            return None
+        delta = LocalFolderishManifestDelta.from_manifests(persisted, manifest)
+        # Compact once the deltas are no longer small compared to the folder
+        if changed + len(delta) > len(manifest.children) // 4:
+            return None
+        return delta
+
+    async def _compact_folder_deltas(self) -> None:
+        for entry_id, (manifest, count, _) in list(self._persisted_folders.items()):
+            if count:
+                async with self._open_cursor() as cursor:
+                    await self._write_manifest(cursor, entry_id, manifest)
+                self._set_persisted_folder(entry_id, manifest, 0, 0)
+
+        # Folders evicted from the cache still have their deltas in the localdb
+        async with self._open_read_cursor() as cursor:
+            await cursor.execute("SELECT DISTINCT vlob_id FROM vlob_deltas")
+            entry_ids = [EntryID(row[0]) for row in await cursor.fetchall()]
+        for entry_id in entry_ids:
+            manifest, _, _ = await self._load_manifest(entry_id)
+            async with self._open_cursor() as cursor:
+                await self._write_manifest(cursor, entry_id, manifest)
 
     async def ensure_manifest_persistent(self, entry_id: EntryID) -> None:
         """
@@ -262,18 +551,26 @@ class ManifestStorage:
         async with self._open_cursor() as cursor:
 
             # Safely remove from cache
-            in_cache = bool(self._cache.pop(entry_id, None))
+            in_cache = bool(self._cache_pop(entry_id))
+            # TODO: should also add the content of the popped manifest
+            pending_chunk_ids = self._cache_ahead_of_localdb.pop(entry_id, ())
 
             # Remove from local database
-            cursor.execute("DELETE FROM vlobs WHERE vlob_id = ?", (entry_id.bytes,))
-            cursor.execute("SELECT changes()")
-            deleted, = cursor.fetchone()
+            await cursor.execute("DELETE FROM vlobs WHERE vlob_id = ?", (entry_id.bytes,))
+            await cursor.execute("SELECT changes()")
+            deleted, = await cursor.fetchone()
+            await cursor.execute("DELETE FROM vlob_deltas WHERE vlob_id = ?", (entry_id.bytes,))
 
             # Clean all the pending chunks
-            # TODO: should also add the content of the popped manifest
-            pending_chunk_ids = self._cache_ahead_of_localdb.pop(entry_id, ())
-            for chunk_id in pending_chunk_ids:
-                cursor.execute("DELETE FROM chunks WHERE chunk_id = ?", (chunk_id.bytes,))
+            if pending_chunk_ids:
+                await cursor.executemany(
+                    "DELETE FROM chunks WHERE chunk_id = ?",
+                    ((chunk_id.bytes,) for chunk_id in pending_chunk_ids),
+                )
+
+        # Notify once the removal is committed
+        if pending_chunk_ids and self.on_chunks_removed is not None:
+            self.on_chunks_removed(pending_chunk_ids)
 
         # Raise a miss if the entry wasn't found
         if not deleted and not in_cache:
@@ -31,9 +31,10 @@ class UserStorage:
         # Local database service
         async with LocalDatabase.run(path / USER_STORAGE_NAME) as localdb:
 
-            # Manifest storage service
+            # Manifest storage service, the cache only contains the user
+            # manifest which must always be available so it is not bounded
             async with ManifestStorage.run(
-                device, localdb, device.user_manifest_id
+                device, localdb, device.user_manifest_id, cache_size=None
             ) as manifest_storage:
 
                 # Instanciate the user storage
@@ -1,8 +1,8 @@
 # Parsec Cloud (https://parsec.cloud) Copyright (c) AGPLv3 2019 Scille SAS
 
 from pathlib import Path
-from collections import defaultdict
-from typing import Dict, Tuple, Set, Optional
+from collections import defaultdict, OrderedDict
+from typing import Dict, List, Tuple, Set, Optional, Iterable, Callable, Awaitable
 
 import trio
 from trio import hazmat
@@ -22,7 +22,7 @@ from parsec.core.types import (
 from parsec.core.fs.exceptions import FSError, FSLocalMissError, FSInvalidFileDescriptor
 
 from parsec.core.fs.storage.local_database import LocalDatabase
-from parsec.core.fs.storage.manifest_storage import ManifestStorage
+from parsec.core.fs.storage.manifest_storage import ManifestStorage, DEFAULT_MANIFEST_CACHE_SIZE
 from parsec.core.fs.storage.chunk_storage import ChunkStorage, BlockStorage
 from parsec.core.fs.storage.version import WORKSPACE_DATA_STORAGE_NAME, WORKSPACE_CACHE_STORAGE_NAME
 
@@ -32,13 +32,82 @@ logger = get_logger()
 # TODO: should be in config.py
 DEFAULT_BLOCK_CACHE_SIZE = 512 * 1024 * 1024
 DEFAULT_CHUNK_VACUUM_THRESHOLD = 512 * 1024 * 1024
+DEFAULT_CHUNK_MEMORY_CACHE_SIZE = 32 * 1024 * 1024
+
+
+class ChunkMemoryCache:
+    """Size-bounded LRU cache of decrypted chunks and blocks."""
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        # Incremented on each invalidation, so a chunk read from the
+        # storage is not cached if it has been modified in the meantime
+        self.generation = 0
+        self._chunks: Dict[ChunkID, bytes] = OrderedDict()
+        # Chunks coming from the block storage, whose accesses must be
+        # recorded there for the eviction of the least recently used blocks
+        self._clean_blocks: Set[ChunkID] = set()
+
+    def __len__(self):
+        return len(self._chunks)
+
+    def get(self, chunk_id: ChunkID) -> Optional[bytes]:
+        try:
+            data = self._chunks[chunk_id]
+        except KeyError:
+            self.misses += 1
+            return None
+        self._chunks.move_to_end(chunk_id)
+        self.hits += 1
+        return data
+
+    def is_clean_block(self, chunk_id: ChunkID) -> bool:
+        return chunk_id in self._clean_blocks
+
+    def set(self, chunk_id: ChunkID, data: bytes, clean_block: bool = False) -> None:
+        self._pop(chunk_id)
+        if len(data) > self.max_size:
+            return
+        self._chunks[chunk_id] = data
+        self.size += len(data)
+        if clean_block:
+            self._clean_blocks.add(chunk_id)
+        while self.size > self.max_size:
+            evicted_id, evicted = self._chunks.popitem(last=False)
+            self._clean_blocks.discard(evicted_id)
+            self.size -= len(evicted)
+
+    def invalidate(self, chunk_id: ChunkID) -> None:
+        self.generation += 1
+        self._pop(chunk_id)
+
+    def invalidate_many(self, chunk_ids: Iterable[ChunkID]) -> None:
+        self.generation += 1
+        for chunk_id in chunk_ids:
+            self._pop(chunk_id)
+
+    def clear(self) -> None:
+        self.generation += 1
+        self._chunks.clear()
+        self._clean_blocks.clear()
+        self.size = 0
+
+    def _pop(self, chunk_id: ChunkID) -> None:
+        data = self._chunks.pop(chunk_id, None)
+        self._clean_blocks.discard(chunk_id)
+        if data is not None:
+            self.size -= len(data)
 
 
 class WorkspaceStorage:
     """Manage the access to the local storage.
 
     That includes:
-    - a cache in memory for fast access to deserialized data
+    - a size-bounded cache in memory for fast access to deserialized data
+    - a size-bounded cache in memory for fast access to decrypted chunks
     - the persistent storage to keep serialized data on the disk
     - a lock mecanism to protect against race conditions
     """
@@ -53,6 +122,7 @@ class WorkspaceStorage:
         block_storage: ChunkStorage,
         chunk_storage: ChunkStorage,
         manifest_storage: ManifestStorage,
+        chunk_memory_cache: ChunkMemoryCache,
     ):
         self.path = path
         self.device = device
@@ -73,6 +143,7 @@ class WorkspaceStorage:
         self.manifest_storage = manifest_storage
         self.block_storage = block_storage
         self.chunk_storage = chunk_storage
+        self.chunk_memory_cache = chunk_memory_cache
 
     @classmethod
     @asynccontextmanager
@@ -83,9 +154,12 @@ class WorkspaceStorage:
         workspace_id: EntryID,
         cache_size=DEFAULT_BLOCK_CACHE_SIZE,
         vacuum_threshold=DEFAULT_CHUNK_VACUUM_THRESHOLD,
+        memory_cache_size=DEFAULT_CHUNK_MEMORY_CACHE_SIZE,
+        manifest_cache_size=DEFAULT_MANIFEST_CACHE_SIZE,
     ):
         data_path = path / WORKSPACE_DATA_STORAGE_NAME
         cache_path = path / WORKSPACE_CACHE_STORAGE_NAME
+        chunk_memory_cache = ChunkMemoryCache(memory_cache_size)
 
         # Local cache storage service
         async with LocalDatabase.run(cache_path) as cache_localdb:
@@ -102,7 +176,11 @@ class WorkspaceStorage:
 
                     # Manifest storage service
                     async with ManifestStorage.run(
-                        device, data_localdb, workspace_id
+                        device,
+                        data_localdb,
+                        workspace_id,
+                        on_chunks_removed=chunk_memory_cache.invalidate_many,
+                        cache_size=manifest_cache_size,
                     ) as manifest_storage:
 
                         # Chunk storage service
@@ -118,6 +196,7 @@ class WorkspaceStorage:
                                 block_storage=block_storage,
                                 chunk_storage=chunk_storage,
                                 manifest_storage=manifest_storage,
+                                chunk_memory_cache=chunk_memory_cache,
                             )
 
     # Helpers
@@ -128,6 +207,7 @@ class WorkspaceStorage:
 
     async def clear_memory_cache(self, flush=True):
         await self.manifest_storage.clear_memory_cache(flush=flush)
+        self.chunk_memory_cache.clear()
 
     # Locking helpers
 
@@ -172,6 +252,9 @@ class WorkspaceStorage:
         """Raises: FSLocalMissError"""
         return await self.manifest_storage.get_manifest(entry_id)
 
+    async def get_missing_manifest_ids(self, entry_ids: Iterable[EntryID]) -> List[EntryID]:
+        return await self.manifest_storage.get_missing_manifest_ids(entry_ids)
+
     async def set_manifest(
         self,
         entry_id: EntryID,
@@ -198,7 +281,10 @@ class WorkspaceStorage:
 
     async def set_clean_block(self, block_id: BlockID, block: bytes) -> None:
         assert isinstance(block_id, BlockID)
-        return await self.block_storage.set_chunk(ChunkID(block_id), block)
+        try:
+            return await self.block_storage.set_chunk(ChunkID(block_id), block)
+        finally:
+            self.chunk_memory_cache.invalidate(ChunkID(block_id))
 
     async def clear_clean_block(self, block_id: BlockID) -> None:
         assert isinstance(block_id, BlockID)
@@ -206,6 +292,12 @@ class WorkspaceStorage:
             await self.block_storage.clear_chunk(ChunkID(block_id))
         except FSLocalMissError:
             pass
+        finally:
+            self.chunk_memory_cache.invalidate(ChunkID(block_id))
+
+    async def is_clean_block(self, block_id: BlockID) -> bool:
+        assert isinstance(block_id, BlockID)
+        return await self.block_storage.is_chunk(ChunkID(block_id))
 
     async def get_dirty_block(self, block_id: BlockID) -> bytes:
         return await self.chunk_storage.get_chunk(ChunkID(block_id))
@@ -214,14 +306,32 @@ class WorkspaceStorage:
 
     async def get_chunk(self, chunk_id: ChunkID) -> bytes:
         assert isinstance(chunk_id, ChunkID)
+        data = self.chunk_memory_cache.get(chunk_id)
+        if data is not None:
+            # Still a block access, otherwise the most used blocks would
+            # look unused to the block storage and be evicted first
+            if self.chunk_memory_cache.is_clean_block(chunk_id):
+                await self.block_storage.record_access(chunk_id)
+            return data
+
+        generation = self.chunk_memory_cache.generation
+        clean_block = False
         try:
-            return await self.chunk_storage.get_chunk(chunk_id)
+            data = await self.chunk_storage.get_chunk(chunk_id)
         except FSLocalMissError:
-            return await self.block_storage.get_chunk(chunk_id)
+            data = await self.block_storage.get_chunk(chunk_id)
+            clean_block = True
+
+        if generation == self.chunk_memory_cache.generation:
+            self.chunk_memory_cache.set(chunk_id, data, clean_block=clean_block)
+        return data
 
     async def set_chunk(self, chunk_id: ChunkID, block: bytes) -> None:
         assert isinstance(chunk_id, ChunkID)
-        return await self.chunk_storage.set_chunk(chunk_id, block)
+        try:
+            return await self.chunk_storage.set_chunk(chunk_id, block)
+        finally:
+            self.chunk_memory_cache.invalidate(chunk_id)
 
     async def clear_chunk(self, chunk_id: ChunkID, miss_ok: bool = False) -> None:
         assert isinstance(chunk_id, ChunkID)
@@ -230,6 +340,8 @@ class WorkspaceStorage:
         except FSLocalMissError:
             if not miss_ok:
                 raise
+        finally:
+            self.chunk_memory_cache.invalidate(chunk_id)
 
     # File management interface
 
@@ -286,6 +398,7 @@ class WorkspaceStorageTimestamped(WorkspaceStorage):
             manifest_storage=None,
             block_storage=workspace_storage.block_storage,
             chunk_storage=workspace_storage.chunk_storage,
+            chunk_memory_cache=workspace_storage.chunk_memory_cache,
         )
 
         self._cache = {}
@@ -308,6 +421,9 @@ class WorkspaceStorageTimestamped(WorkspaceStorage):
         except KeyError:
             raise FSLocalMissError(entry_id)
 
+    async def get_missing_manifest_ids(self, entry_ids: Iterable[EntryID]) -> List[EntryID]:
+        return [entry_id for entry_id in entry_ids if entry_id not in self._cache]
+
     async def set_manifest(
         self, entry_id: EntryID, manifest: LocalManifest, cache_only: bool = False
     ) -> None:  # initially for clean
@@ -319,3 +435,179 @@ class WorkspaceStorageTimestamped(WorkspaceStorage):
 
     async def ensure_manifest_persistent(self, entry_id: EntryID) -> None:
         pass
+
+
+class LazyWorkspaceStorage:
+    """Stand-in for a workspace storage that is only opened on first access.
+
+    Opening a workspace storage means opening its sqlite databases, which is
+    pointless for the workspaces that are never accessed. Every coroutine
+    method opens the storage (using `open_storage`) before being forwarded.
+    File descriptors are pure bookkeeping, so they are managed here and the
+    synchronous methods never need the storage to be loaded.
+    """
+
+    def __init__(
+        self,
+        device: LocalDevice,
+        path: Path,
+        workspace_id: EntryID,
+        open_storage: Callable[[], Awaitable[WorkspaceStorage]],
+    ):
+        self.path = path
+        self.device = device
+        self.device_id = device.device_id
+        self.workspace_id = workspace_id
+        self._open_storage = open_storage
+        self._open_lock = trio.Lock()
+        self._storage = None
+
+        # File descriptors
+        self.open_fds: Dict[FileDescriptor, EntryID] = {}
+        self.fd_counter = 0
+
+    @property
+    def is_loaded(self) -> bool:
+        return self._storage is not None
+
+    async def load(self) -> WorkspaceStorage:
+        # Concurrent accesses must wait for the same storage to be opened
+        async with self._open_lock:
+            if self._storage is None:
+                self._storage = await self._open_storage()
+        return self._storage
+
+    # Helpers
+
+    def _get_next_fd(self) -> FileDescriptor:
+        self.fd_counter += 1
+        return FileDescriptor(self.fd_counter)
+
+    async def clear_memory_cache(self, flush=True):
+        storage = await self.load()
+        await storage.clear_memory_cache(flush=flush)
+
+    # Locking helpers
+
+    @asynccontextmanager
+    async def lock_entry_id(self, entry_id: EntryID):
+        storage = await self.load()
+        async with storage.lock_entry_id(entry_id) as value:
+            yield value
+
+    @asynccontextmanager
+    async def lock_manifest(self, entry_id: EntryID):
+        storage = await self.load()
+        async with storage.lock_manifest(entry_id) as value:
+            yield value
+
+    # Checkpoint interface
+
+    async def get_realm_checkpoint(self) -> int:
+        storage = await self.load()
+        return await storage.get_realm_checkpoint()
+
+    async def update_realm_checkpoint(
+        self, new_checkpoint: int, changed_vlobs: Dict[EntryID, int]
+    ) -> None:
+        storage = await self.load()
+        await storage.update_realm_checkpoint(new_checkpoint, changed_vlobs)
+
+    async def get_need_sync_entries(self) -> Tuple[Set[EntryID], Set[EntryID]]:
+        storage = await self.load()
+        return await storage.get_need_sync_entries()
+
+    # Manifest interface
+
+    async def get_manifest(self, entry_id: EntryID) -> LocalManifest:
+        storage = await self.load()
+        return await storage.get_manifest(entry_id)
+
+    async def get_missing_manifest_ids(self, entry_ids: Iterable[EntryID]) -> List[EntryID]:
+        storage = await self.load()
+        return await storage.get_missing_manifest_ids(entry_ids)
+
+    async def set_manifest(self, entry_id: EntryID, manifest: LocalManifest, **kwargs) -> None:
+        # Timestamped storages accept fewer options, let them reject the others
+        storage = await self.load()
+        await storage.set_manifest(entry_id, manifest, **kwargs)
+
+    async def ensure_manifest_persistent(self, entry_id: EntryID) -> None:
+        storage = await self.load()
+        await storage.ensure_manifest_persistent(entry_id)
+
+    async def clear_manifest(self, entry_id: EntryID) -> None:
+        storage = await self.load()
+        await storage.clear_manifest(entry_id)
+
+    # Block interface
+
+    async def set_clean_block(self, block_id: BlockID, block: bytes) -> None:
+        storage = await self.load()
+        await storage.set_clean_block(block_id, block)
+
+    async def clear_clean_block(self, block_id: BlockID) -> None:
+        storage = await self.load()
+        await storage.clear_clean_block(block_id)
+
+    async def is_clean_block(self, block_id: BlockID) -> bool:
+        storage = await self.load()
+        return await storage.is_clean_block(block_id)
+
+    async def get_dirty_block(self, block_id: BlockID) -> bytes:
+        storage = await self.load()
+        return await storage.get_dirty_block(block_id)
+
+    # Chunk interface
+
+    async def get_chunk(self, chunk_id: ChunkID) -> bytes:
+        storage = await self.load()
+        return await storage.get_chunk(chunk_id)
+
+    async def set_chunk(self, chunk_id: ChunkID, block: bytes) -> None:
+        storage = await self.load()
+        await storage.set_chunk(chunk_id, block)
+
+    async def clear_chunk(self, chunk_id: ChunkID, miss_ok: bool = False) -> None:
+        storage = await self.load()
+        await storage.clear_chunk(chunk_id, miss_ok=miss_ok)
+
+    # File management interface
+
+    def create_file_descriptor(self, manifest: LocalFileManifest) -> FileDescriptor:
+        assert isinstance(manifest, LocalFileManifest)
+        fd = self._get_next_fd()
+        self.open_fds[fd] = manifest.id
+        return fd
+
+    async def load_file_descriptor(self, fd: FileDescriptor) -> LocalFileManifest:
+        try:
+            entry_id = self.open_fds[fd]
+        except KeyError:
+            raise FSInvalidFileDescriptor(fd)
+        manifest = await self.get_manifest(entry_id)
+        assert isinstance(manifest, LocalFileManifest)
+        return manifest
+
+    def remove_file_descriptor(self, fd: FileDescriptor) -> None:
+        try:
+            self.open_fds.pop(fd)
+        except KeyError:
+            raise FSInvalidFileDescriptor(fd)
+
+    # Vacuum
+
+    async def run_vacuum(self):
+        storage = await self.load()
+        await storage.run_vacuum()
+
+    # Timestamped workspace
+
+    def to_timestamped(self, timestamp: Pendulum):
+        async def _open_timestamped_storage():
+            storage = await self.load()
+            return storage.to_timestamped(timestamp)
+
+        return LazyWorkspaceStorage(
+            self.device, self.path, self.workspace_id, _open_timestamped_storage
+        )
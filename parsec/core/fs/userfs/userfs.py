@@ -4,7 +4,8 @@ from parsec.core.core_events import CoreEvent
 import trio
 from pathlib import Path
 from pendulum import Pendulum, now as pendulum_now
-from typing import List, Tuple, Optional, Union
+from typing import List, Tuple, Optional, Union, Iterable
+from functools import partial
 from structlog import get_logger
 
 from async_generator import asynccontextmanager
@@ -45,8 +46,11 @@ from parsec.core.remote_devices_manager import (
 )
 
 from parsec.core.fs.workspacefs import WorkspaceFS
+from parsec.core.config import DEFAULT_READ_AHEAD_BLOCKS
 from parsec.core.fs.remote_loader import RemoteLoader
-from parsec.core.fs.storage import UserStorage, WorkspaceStorage
+from parsec.core.fs.storage import UserStorage, WorkspaceStorage, LazyWorkspaceStorage
+from parsec.core.fs.storage.workspace_storage import DEFAULT_CHUNK_MEMORY_CACHE_SIZE
+from parsec.core.fs.storage.manifest_storage import DEFAULT_MANIFEST_CACHE_SIZE
 from parsec.core.fs.userfs.merging import merge_local_user_manifests, merge_workspace_entry
 from parsec.core.fs.exceptions import (
     FSError,
@@ -63,6 +67,10 @@ logger = get_logger()
 
 AnyEntryName = Union[EntryName, str]
 
+# Maximum number of workspace storages being opened at the same time
+# (each one runs its own worker threads)
+MAX_CONCURRENT_WORKSPACE_STORAGE_LOADS = 8
+
 
 class ReencryptionJob:
     def __init__(self, backend_cmds, new_workspace_entry, old_workspace_entry):
@@ -155,18 +163,28 @@ class UserFS:
         backend_cmds: APIV1_BackendAuthenticatedCmds,
         remote_devices_manager: RemoteDevicesManager,
         event_bus: EventBus,
+        read_ahead_blocks: int = DEFAULT_READ_AHEAD_BLOCKS,
+        memory_cache_size: int = DEFAULT_CHUNK_MEMORY_CACHE_SIZE,
+        manifest_cache_size: int = DEFAULT_MANIFEST_CACHE_SIZE,
     ):
         self.device = device
         self.path = path
         self.backend_cmds = backend_cmds
         self.remote_devices_manager = remote_devices_manager
         self.event_bus = event_bus
+        self.read_ahead_blocks = read_ahead_blocks
+        self.memory_cache_size = memory_cache_size
+        self.manifest_cache_size = manifest_cache_size
 
         self.storage = None
 
         # Message processing is done in-order, hence it is pointless to do
         # it concurrently
         self._workspace_storage_nursery = None
+        self._workspace_background_nursery = None
+        self._workspace_storage_limiter = trio.CapacityLimiter(
+            MAX_CONCURRENT_WORKSPACE_STORAGE_LOADS
+        )
         self._process_messages_lock = trio.Lock()
         self._update_user_manifest_lock = trio.Lock()
         self._workspace_storages = {}
@@ -202,14 +220,22 @@ class UserFS:
             # Nursery for workspace storages
             async with trio.open_service_nursery() as self._workspace_storage_nursery:
 
-                # Make sure all the workspaces are loaded
-                # In particular, we want to make sure that any workspace available through
-                # `userfs.get_user_manifest().workspaces` is also available through
-                # `userfs.get_workspace(workspace_id)`.
-                for workspace_entry in self.get_user_manifest().workspaces:
-                    await self._load_workspace(workspace_entry.id)
+                # Background tasks (e.g. block read-ahead) rely on the workspace
+                # storages, hence they must be stopped before those get closed
+                async with trio.open_service_nursery() as self._workspace_background_nursery:
+
+                    # Make sure all the workspaces are loaded
+                    # In particular, we want to make sure that any workspace available through
+                    # `userfs.get_user_manifest().workspaces` is also available through
+                    # `userfs.get_workspace(workspace_id)`. Note their local storage is only
+                    # opened on first access, see `load_workspace_storages`.
+                    for workspace_entry in self.get_user_manifest().workspaces:
+                        self._load_workspace(workspace_entry.id)
 
-                yield self
+                    yield self
+
+                    # Stop the background tasks
+                    self._workspace_background_nursery.cancel_scope.cancel()
 
                 # Stop the workspace storages
                 self._workspace_storage_nursery.cancel_scope.cancel()
@@ -232,7 +258,7 @@ class UserFS:
         # `userfs.get_workspace(workspace_id)`. Note that the loading operation
         # is idempotent, so workspaces do not get reloaded.
         for workspace_entry in manifest.workspaces:
-            await self._load_workspace(workspace_entry.id)
+            self._load_workspace(workspace_entry.id)
 
         await self.storage.set_user_manifest(manifest)
 
@@ -240,13 +266,21 @@ class UserFS:
         path = self.path / str(workspace_id)
 
         async def workspace_storage_task(task_status=trio.TASK_STATUS_IGNORED):
-            async with WorkspaceStorage.run(self.device, path, workspace_id) as workspace_storage:
+            async with WorkspaceStorage.run(
+                self.device,
+                path,
+                workspace_id,
+                memory_cache_size=self.memory_cache_size,
+                manifest_cache_size=self.manifest_cache_size,
+            ) as workspace_storage:
                 task_status.started(workspace_storage)
                 await trio.sleep_forever()
 
-        return await self._workspace_storage_nursery.start(workspace_storage_task)
+        # Lazy loading, warm-up and sync monitor bootstrap all share the same bound
+        async with self._workspace_storage_limiter:
+            return await self._workspace_storage_nursery.start(workspace_storage_task)
 
-    async def _instantiate_workspace(self, workspace_id: EntryID) -> WorkspaceFS:
+    def _instantiate_workspace(self, workspace_id: EntryID) -> WorkspaceFS:
         # Workspace entry can change at any time, so we provide a way for
         # WorskpaeFS to load it each time it is needed
         def get_workspace_entry():
@@ -256,8 +290,13 @@ class UserFS:
                 raise FSWorkspaceNotFoundError(f"Unknown workspace `{workspace_id}`")
             return workspace_entry
 
-        # Instantiate the local storage
-        local_storage = await self._instantiate_workspace_storage(workspace_id)
+        # The local storage is opened on first access
+        local_storage = LazyWorkspaceStorage(
+            self.device,
+            self.path / str(workspace_id),
+            workspace_id,
+            partial(self._instantiate_workspace_storage, workspace_id),
+        )
 
         # Instantiate the workspace
         return WorkspaceFS(
@@ -268,6 +307,8 @@ class UserFS:
             backend_cmds=self.backend_cmds,
             event_bus=self.event_bus,
             remote_device_manager=self.remote_devices_manager,
+            read_ahead_nursery=self._workspace_background_nursery,
+            read_ahead_blocks=self.read_ahead_blocks,
         )
 
     async def _create_workspace(
@@ -276,28 +317,48 @@ class UserFS:
         """
         Raises: Nothing
         """
-        workspace = await self._instantiate_workspace(workspace_id)
+        workspace = self._load_workspace(workspace_id)
 
         async with workspace.local_storage.lock_entry_id(workspace_id):
             await workspace.local_storage.set_manifest(workspace_id, manifest)
 
-        self._workspace_storages.setdefault(workspace_id, workspace)
-
-    async def _load_workspace(self, workspace_id: EntryID) -> WorkspaceFS:
+    def _load_workspace(self, workspace_id: EntryID) -> WorkspaceFS:
         """
-        Raises:
-            FSWorkspaceNotFoundError
+        Raises: Nothing !
         """
         # The workspace has already been instantiated
         if workspace_id in self._workspace_storages:
             return self._workspace_storages[workspace_id]
 
         # Instantiate the workpace
-        workspace = await self._instantiate_workspace(workspace_id)
+        workspace = self._instantiate_workspace(workspace_id)
 
         # Set and return
         return self._workspace_storages.setdefault(workspace_id, workspace)
 
+    async def load_workspace_storages(self, workspace_ids: Iterable[EntryID]) -> None:
+        """
+        Open the local storage of the given workspaces concurrently, instead
+        of waiting for their first access.
+
+        Raises: Nothing !
+        """
+
+        async def _load_workspace_storage(workspace):
+            try:
+                await workspace.local_storage.load()
+            # Best effort, the error will be reported on actual access
+            except Exception:
+                logger.exception(
+                    "Cannot open workspace storage", workspace_id=workspace.workspace_id
+                )
+
+        async with trio.open_nursery() as nursery:
+            for workspace_id in workspace_ids:
+                workspace = self._workspace_storages.get(workspace_id)
+                if workspace is not None and not workspace.local_storage.is_loaded:
+                    nursery.start_soon(_load_workspace_storage, workspace)
+
     def get_workspace(self, workspace_id: EntryID) -> WorkspaceFS:
         # UserFS provides the guarantee that any workspace available through
         # `userfs.get_user_manifest().workspaces` is also available in
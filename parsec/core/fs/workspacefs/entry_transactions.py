@@ -28,6 +28,7 @@ from parsec.core.fs.exceptions import (
     FSIsADirectoryError,
     FSDirectoryNotEmptyError,
     FSLocalMissError,
+    FSError,
 )
 
 
@@ -149,14 +150,41 @@ class EntryTransactions(FileTransactions):
             # Release the lock and download the child manifest
             await self._load_manifest(entry_id)
 
+    async def _load_children_manifests(self, manifest: LocalFolderManifest) -> None:
+        # Download the missing children manifests in batch, instead of
+        # one request per child when they are accessed afterward
+        # (a warm directory only costs a lookup of its children ids)
+        missing = await self.local_storage.get_missing_manifest_ids(manifest.children.values())
+        if not missing:
+            return
+
+        try:
+            remote_manifests = await self.remote_loader.load_manifests(missing)
+        # This is only an optimization, let the children loading deal with the error
+        except FSError:
+            return
+
+        for child_id, remote_manifest in remote_manifests.items():
+            async with self.local_storage.lock_entry_id(child_id):
+                try:
+                    await self.local_storage.get_manifest(child_id)
+                except FSLocalMissError:
+                    local_manifest = LocalManifest.from_remote(remote_manifest)
+                    await self.local_storage.set_manifest(child_id, local_manifest)
+
     # Transactions
 
-    async def entry_info(self, path: FsPath) -> dict:
+    async def entry_info(self, path: FsPath, prefetch_children: bool = False) -> dict:
         # Check read rights
         self.check_read_rights(path)
 
         # Fetch data
         manifest = await self._get_manifest_from_path(path)
+
+        # The children are most likely going to be accessed (e.g. directory listing)
+        if prefetch_children and is_folderish_manifest(manifest):
+            await self._load_children_manifests(manifest)
+
         return manifest.to_stats()
 
     async def entry_rename(
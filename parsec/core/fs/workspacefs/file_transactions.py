@@ -1,18 +1,28 @@
 # Parsec Cloud (https://parsec.cloud) Copyright (c) AGPLv3 2019 Scille SAS
 
 from parsec.core.core_events import CoreEvent
-from typing import Tuple, List, Callable
+from typing import Tuple, List, Dict, Callable, Optional
 
-from collections import defaultdict
+import attr
+import trio
+from collections import defaultdict, OrderedDict
 from async_generator import asynccontextmanager
+from structlog import get_logger
 
 from parsec.event_bus import EventBus
+from parsec.core.config import DEFAULT_READ_AHEAD_BLOCKS
+from parsec.api.data import BlockAccess
 from parsec.core.types import FileDescriptor, EntryID, LocalDevice
 
 from parsec.core.fs.remote_loader import RemoteLoader
 from parsec.core.fs.storage import WorkspaceStorage
-from parsec.core.fs.exceptions import FSLocalMissError, FSInvalidFileDescriptor, FSEndOfFileError
-from parsec.core.types import Chunk, BlockID, LocalFileManifest
+from parsec.core.fs.exceptions import (
+    FSError,
+    FSLocalMissError,
+    FSInvalidFileDescriptor,
+    FSEndOfFileError,
+)
+from parsec.core.types import Chunk, ChunkID, BlockID, LocalFileManifest
 from parsec.core.fs.workspacefs.file_operations import (
     prepare_read,
     prepare_write,
@@ -24,6 +34,17 @@ from parsec.core.fs.workspacefs.file_operations import (
 __all__ = ("FSInvalidFileDescriptor", "FileTransactions")
 
 
+logger = get_logger()
+
+# Number of consecutive sequential reads before the read-ahead kicks in
+READ_AHEAD_TRIGGER = 2
+# Number of decrypted chunks kept in memory for each file descriptor being read
+FD_CHUNK_CACHE_SIZE = 2
+
+# Decrypted chunks, ordered from the least to the most recently used
+ChunkCache = Dict[ChunkID, bytes]
+
+
 # Helpers
 
 
@@ -44,6 +65,25 @@ def padded_data(data: bytes, start: int, stop: int) -> bytes:
     return b"\x00" * (0 - start) + data[0:stop]
 
 
+@attr.s(slots=True, auto_attribs=True)
+class ReadPattern:
+    """Access pattern of a file descriptor, used to detect sequential reads."""
+
+    next_offset: int = 0
+    sequential_reads: int = 0
+    read_ahead_offset: int = 0
+
+    def update(self, offset: int, size: int) -> bool:
+        """Register a read and return whether the access pattern is sequential."""
+        if offset == self.next_offset:
+            self.sequential_reads += 1
+        else:
+            self.sequential_reads = 0
+            self.read_ahead_offset = 0
+        self.next_offset = offset + size
+        return self.sequential_reads >= READ_AHEAD_TRIGGER
+
+
 class FileTransactions:
     """A stateless class to centralize all file transactions.
 
@@ -64,6 +104,10 @@ class FileTransactions:
     - truncate -> affects file size and possibly file content
     - read     -> no side effect
     - flush    -> no-op
+
+    When a file descriptor is read sequentially, the blocks following the
+    cursor are downloaded in the background (if a read-ahead nursery is
+    provided) so the next reads can be served from the local storage.
     """
 
     def __init__(
@@ -74,6 +118,8 @@ class FileTransactions:
         local_storage: WorkspaceStorage,
         remote_loader: RemoteLoader,
         event_bus: EventBus,
+        read_ahead_nursery: Optional[trio.Nursery] = None,
+        read_ahead_blocks: int = DEFAULT_READ_AHEAD_BLOCKS,
     ):
         self.workspace_id = workspace_id
         self.get_workspace_entry = get_workspace_entry
@@ -81,7 +127,12 @@ class FileTransactions:
         self.local_storage = local_storage
         self.remote_loader = remote_loader
         self.event_bus = event_bus
+        self.read_ahead_nursery = read_ahead_nursery
+        self.read_ahead_blocks = read_ahead_blocks
         self._write_count = defaultdict(int)
+        self._read_patterns: Dict[FileDescriptor, ReadPattern] = defaultdict(ReadPattern)
+        self._read_ahead_events: Dict[BlockID, trio.Event] = {}
+        self._chunk_caches: Dict[FileDescriptor, ChunkCache] = defaultdict(OrderedDict)
 
     # Event helper
 
@@ -90,33 +141,124 @@ class FileTransactions:
 
     # Helper
 
-    async def _read_chunk(self, chunk: Chunk) -> bytes:
-        data = await self.local_storage.get_chunk(chunk.id)
-        return data[chunk.start - chunk.raw_offset : chunk.stop - chunk.raw_offset]
+    async def _read_chunk(
+        self, chunk: Chunk, chunk_cache: Optional[ChunkCache] = None
+    ) -> memoryview:
+        # Chunk data is never modified once written, so it can be cached
+        # by id without any invalidation
+        if chunk_cache is None:
+            data = await self.local_storage.get_chunk(chunk.id)
+        elif chunk.id in chunk_cache:
+            data = chunk_cache[chunk.id]
+            chunk_cache.move_to_end(chunk.id)
+        else:
+            data = await self.local_storage.get_chunk(chunk.id)
+            chunk_cache[chunk.id] = data
+            if len(chunk_cache) > FD_CHUNK_CACHE_SIZE:
+                chunk_cache.popitem(last=False)
+        # Slicing a memoryview doesn't copy the data
+        return memoryview(data)[chunk.start - chunk.raw_offset : chunk.stop - chunk.raw_offset]
 
     async def _write_chunk(self, chunk: Chunk, content: bytes, offset: int = 0) -> None:
         data = padded_data(content, offset, offset + chunk.stop - chunk.start)
         await self.local_storage.set_chunk(chunk.id, data)
         return len(data)
 
-    async def _build_data(self, chunks: Tuple[Chunk]) -> Tuple[bytes, List[BlockID]]:
+    async def _build_data(
+        self, chunks: Tuple[Chunk], chunk_cache: Optional[ChunkCache] = None
+    ) -> Tuple[bytes, List[BlockID]]:
         # Empty array
         if not chunks:
-            return bytearray(), []
+            return b"", []
 
-        # Build byte array
+        # Collect the chunk views
         missing = []
-        start, stop = chunks[0].start, chunks[-1].stop
-        result = bytearray(stop - start)
+        views = []
+        position = chunks[0].start
         for chunk in chunks:
             try:
-                result[chunk.start - start : chunk.stop - start] = await self._read_chunk(chunk)
+                view = await self._read_chunk(chunk, chunk_cache)
             except FSLocalMissError:
                 assert chunk.access is not None
                 missing.append(chunk.access)
+                continue
+            if chunk.start > position:
+                views.append(bytes(chunk.start - position))
+            views.append(view)
+            position = chunk.stop
+
+        # The data is useless if some chunks are missing
+        if missing:
+            return b"", missing
+
+        # Join the views, which is the only copy of the data
+        return b"".join(views), missing
+
+    async def _load_blocks(self, accesses: List[BlockAccess]) -> None:
+        # Do not download the blocks already being fetched by the read-ahead
+        pending = []
+        to_load = []
+        for access in accesses:
+            event = self._read_ahead_events.get(access.id)
+            if event is None:
+                to_load.append(access)
+            else:
+                pending.append(event)
+
+        await self.remote_loader.load_blocks(to_load)
+        # Note that a read-ahead might have failed, the missing blocks are
+        # then loaded on the next attempt
+        for event in pending:
+            await event.wait()
+
+    # Read-ahead helpers
+
+    def _schedule_read_ahead(
+        self, fd: FileDescriptor, manifest: LocalFileManifest, offset: int, size: int
+    ) -> None:
+        # Read-ahead disabled
+        if self.read_ahead_nursery is None or self.read_ahead_blocks <= 0:
+            return
 
-        # Return byte array
-        return result, missing
+        # Random access
+        pattern = self._read_patterns[fd]
+        if not pattern.update(offset, size):
+            return
+
+        # Only consider the part of the window that hasn't been scheduled yet
+        stop = min(offset + size + self.read_ahead_blocks * manifest.blocksize, manifest.size)
+        start = max(offset + size, pattern.read_ahead_offset)
+        if start >= stop:
+            return
+        pattern.read_ahead_offset = stop
+
+        accesses = {}
+        for chunk in prepare_read(manifest, stop - start, start):
+            if chunk.access is not None and chunk.access.id not in self._read_ahead_events:
+                accesses[chunk.access.id] = chunk.access
+        if not accesses:
+            return
+
+        for block_id in accesses:
+            self._read_ahead_events[block_id] = trio.Event()
+        self.read_ahead_nursery.start_soon(self._read_ahead, list(accesses.values()))
+
+    async def _read_ahead(self, accesses: List[BlockAccess]) -> None:
+        try:
+            missing = [
+                access
+                for access in accesses
+                if not await self.local_storage.is_clean_block(access.id)
+            ]
+            await self.remote_loader.load_blocks(missing)
+
+        # Read-ahead is best effort, the error will be reported to the actual reader
+        except FSError as exc:
+            logger.info("Block read-ahead has failed", exc_info=exc)
+
+        finally:
+            for access in accesses:
+                self._read_ahead_events.pop(access.id).set()
 
     # Locking helper
 
@@ -150,8 +292,10 @@ class FileTransactions:
             # Atomic change
             self.local_storage.remove_file_descriptor(fd)
 
-            # Clear write count
+            # Clear write count, read pattern and chunk cache
             self._write_count.pop(fd, None)
+            self._read_patterns.pop(fd, None)
+            self._chunk_caches.pop(fd, None)
 
     async def fd_write(
         self, fd: FileDescriptor, content: bytes, offset: int, constrained: bool = False
@@ -208,10 +352,11 @@ class FileTransactions:
     async def fd_read(self, fd: FileDescriptor, size: int, offset: int, raise_eof=False) -> bytes:
         # Loop over attemps
         missing = []
+        first_attempt = True
         while True:
 
             # Load missing blocks
-            await self.remote_loader.load_blocks(missing)
+            await self._load_blocks(missing)
 
             # Fetch and lock
             async with self._load_and_lock_file(fd) as manifest:
@@ -230,7 +375,13 @@ class FileTransactions:
 
                 # Prepare
                 chunks = prepare_read(manifest, size, offset)
-                data, missing = await self._build_data(chunks)
+
+                # Fetch the next blocks in the background
+                if first_attempt:
+                    self._schedule_read_ahead(fd, manifest, offset, size)
+                    first_attempt = False
+
+                data, missing = await self._build_data(chunks, self._chunk_caches[fd])
 
                 # Return the data
                 if not missing:
@@ -3,7 +3,7 @@
 import attr
 import trio
 from collections import defaultdict
-from typing import Union, List, Dict, Tuple, AsyncGenerator
+from typing import Union, List, Dict, Tuple, AsyncGenerator, Optional
 from pendulum import Pendulum, now as pendulum_now
 
 from parsec.api.data import Manifest as RemoteManifest
@@ -25,6 +25,7 @@ from parsec.core.fs.exceptions import FSError, FSBackendOfflineError
 from parsec.core.fs.remote_loader import RemoteLoader
 from parsec.core.fs import workspacefs  # Needed to break cyclic import with WorkspaceFSTimestamped
 from parsec.core.fs.workspacefs.sync_transactions import SyncTransactions
+from parsec.core.config import DEFAULT_READ_AHEAD_BLOCKS
 from parsec.core.fs.workspacefs.versioning_helpers import VersionLister
 from parsec.core.fs.utils import is_file_manifest, is_folderish_manifest
 from parsec.core.fs.exceptions import (
@@ -66,6 +67,8 @@ class WorkspaceFS:
         backend_cmds,
         event_bus,
         remote_device_manager,
+        read_ahead_nursery: Optional[trio.Nursery] = None,
+        read_ahead_blocks: int = DEFAULT_READ_AHEAD_BLOCKS,
     ):
         self.workspace_id = workspace_id
         self.get_workspace_entry = get_workspace_entry
@@ -74,6 +77,8 @@ class WorkspaceFS:
         self.backend_cmds = backend_cmds
         self.event_bus = event_bus
         self.remote_device_manager = remote_device_manager
+        self.read_ahead_nursery = read_ahead_nursery
+        self.read_ahead_blocks = read_ahead_blocks
         self.sync_locks = defaultdict(trio.Lock)
 
         self.remote_loader = RemoteLoader(
@@ -91,6 +96,8 @@ class WorkspaceFS:
             self.local_storage,
             self.remote_loader,
             self.event_bus,
+            read_ahead_nursery=self.read_ahead_nursery,
+            read_ahead_blocks=self.read_ahead_blocks,
         )
 
     def __repr__(self):
@@ -259,7 +266,7 @@ class WorkspaceFS:
             FSError
         """
         path = FsPath(path)
-        info = await self.transactions.entry_info(path)
+        info = await self.transactions.entry_info(path, prefetch_children=True)
         if "children" not in info:
             raise FSNotADirectoryError(filename=str(path))
         for child in info["children"]:
@@ -466,12 +473,7 @@ class WorkspaceFS:
             await self.minimal_sync(child)
 
     async def _upload_blocks(self, manifest: LocalFileManifest) -> None:
-        for access in manifest.blocks:
-            try:
-                data = await self.local_storage.get_dirty_block(access.id)
-            except FSLocalMissError:
-                continue
-            await self.remote_loader.upload_block(access, data)
+        await self.remote_loader.upload_blocks(manifest.blocks)
 
     async def minimal_sync(self, entry_id: EntryID) -> None:
         """
@@ -506,7 +508,12 @@ class WorkspaceFS:
         except FSLocalMissError:
             pass
 
-    async def _sync_by_id(self, entry_id: EntryID, remote_changed: bool = True) -> RemoteManifest:
+    async def _sync_by_id(
+        self,
+        entry_id: EntryID,
+        remote_changed: bool = True,
+        prefetched_manifests: Optional[Dict[EntryID, RemoteManifest]] = None,
+    ) -> RemoteManifest:
         """
         Synchronize the entry corresponding to a specific ID.
 
@@ -517,14 +524,28 @@ class WorkspaceFS:
 
         This guarantees that any change prior to the call is saved remotely when this
         method returns.
+
+        `prefetched_manifests` contains the remote manifests already downloaded in batch
+        (an entry missing from it didn't exist remotely at that time).
         """
         # Get the current remote manifest if it has changed
         remote_manifest = None
         if remote_changed:
-            try:
-                remote_manifest = await self.remote_loader.load_manifest(entry_id)
-            except FSRemoteManifestNotFound:
-                pass
+            if prefetched_manifests is not None:
+                remote_manifest = prefetched_manifests.get(entry_id)
+                # The batch has been downloaded before taking the sync lock, so the
+                # entry may have been synchronized with a newer version meanwhile
+                try:
+                    base_version = (await self.local_storage.get_manifest(entry_id)).base_version
+                except FSLocalMissError:
+                    base_version = 0
+                if (remote_manifest.version if remote_manifest else 0) < base_version:
+                    remote_manifest = prefetched_manifests = None
+            if prefetched_manifests is None:
+                try:
+                    remote_manifest = await self.remote_loader.load_manifest(entry_id)
+                except FSRemoteManifestNotFound:
+                    pass
 
         # Loop over sync transactions
         final = False
@@ -598,10 +619,23 @@ class WorkspaceFS:
         # Make sure the corresponding realm exists
         await self._create_realm_if_needed()
 
+        await self._sync_tree(entry_id, remote_changed=remote_changed, recursive=recursive)
+
+    async def _sync_tree(
+        self,
+        entry_id: EntryID,
+        remote_changed: bool,
+        recursive: bool,
+        prefetched_manifests: Optional[Dict[EntryID, RemoteManifest]] = None,
+    ):
         # Sync parent first
         try:
             async with self.sync_locks[entry_id]:
-                manifest = await self._sync_by_id(entry_id, remote_changed=remote_changed)
+                manifest = await self._sync_by_id(
+                    entry_id,
+                    remote_changed=remote_changed,
+                    prefetched_manifests=prefetched_manifests,
+                )
 
         # Nothing to synchronize if the manifest does not exist locally
         except FSNoSynchronizationRequired:
@@ -619,9 +653,19 @@ class WorkspaceFS:
         if not recursive or is_file_manifest(manifest):
             return
 
+        # Download the children remote manifests in batch
+        children_manifests = None
+        if remote_changed and manifest.children:
+            children_manifests = await self.remote_loader.load_manifests(manifest.children.values())
+
         # Synchronize children
         for name, entry_id in manifest.children.items():
-            await self.sync_by_id(entry_id, remote_changed=remote_changed, recursive=True)
+            await self._sync_tree(
+                entry_id,
+                remote_changed=remote_changed,
+                recursive=True,
+                prefetched_manifests=children_manifests,
+            )
 
     async def sync(self, *, remote_changed: bool = True) -> None:
         """
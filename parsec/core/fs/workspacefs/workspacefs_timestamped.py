@@ -19,6 +19,8 @@ class WorkspaceFSTimestamped(WorkspaceFS):
         self.backend_cmds = workspacefs.backend_cmds
         self.event_bus = workspacefs.event_bus
         self.remote_device_manager = workspacefs.remote_device_manager
+        self.read_ahead_nursery = workspacefs.read_ahead_nursery
+        self.read_ahead_blocks = workspacefs.read_ahead_blocks
 
         self.timestamp = timestamp
 
@@ -30,6 +32,8 @@ class WorkspaceFSTimestamped(WorkspaceFS):
             self.local_storage,
             self.remote_loader,
             self.event_bus,
+            read_ahead_nursery=self.read_ahead_nursery,
+            read_ahead_blocks=self.read_ahead_blocks,
         )
 
     def timestamp_get_entry(self, get_original_workspace_entry):
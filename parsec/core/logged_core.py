@@ -172,16 +172,26 @@ async def logged_core_factory(
         max_cooldown=config.backend_max_cooldown,
         max_pool=config.backend_max_connections,
         keepalive=config.backend_connection_keepalive,
+        multiplexing=config.backend_multiplexing,
     )
 
     path = config.data_base_dir / device.slug
     remote_devices_manager = RemoteDevicesManager(backend_conn.cmds, device.root_verify_key)
     async with UserFS.run(
-        device, path, backend_conn.cmds, remote_devices_manager, event_bus
+        device,
+        path,
+        backend_conn.cmds,
+        remote_devices_manager,
+        event_bus,
+        read_ahead_blocks=config.workspace_read_ahead_blocks,
+        memory_cache_size=config.workspace_memory_cache_size,
+        manifest_cache_size=config.workspace_manifest_cache_size,
     ) as user_fs:
 
         backend_conn.register_monitor(partial(monitor_messages, user_fs, event_bus))
-        backend_conn.register_monitor(partial(monitor_sync, user_fs, event_bus))
+        backend_conn.register_monitor(
+            partial(monitor_sync, user_fs, event_bus, max_concurrency=config.sync_max_concurrency)
+        )
 
         async with backend_conn.run():
             async with mountpoint_manager_factory(
@@ -111,7 +111,8 @@ class FuseOperations(LoggingMixIn, Operations):
         return fuse_stat
 
     def readdir(self, path: FsPath, fh: int):
-        stat = self.fs_access.entry_info(path)
+        # Children are going to be stat'ed right after the listing
+        stat = self.fs_access.entry_info(path, prefetch_children=True)
 
         if stat["type"] == "file":
             raise FuseOSError(errno.ENOTDIR)
@@ -135,9 +136,8 @@ class FuseOperations(LoggingMixIn, Operations):
 
     def read(self, path: FsPath, size: int, offset: int, fh: int):
         # Atomic read
-        ret = self.fs_access.fd_read(fh, size, offset, raise_eof=False)
-        # Fuse wants bytes but fd_read returns a bytearray
-        return bytes(ret)
+        # Fuse wants bytes, which is what fd_read returns
+        return self.fs_access.fd_read(fh, size, offset, raise_eof=False)
 
     def write(self, path: FsPath, data: bytes, offset: int, fh: int):
         return self.fs_access.fd_write(fh, data, offset)
@@ -254,10 +254,16 @@ class MountpointManager:
     async def safe_mount_all(self, exclude: Sequence[EntryID] = ()):
         exclude_set = set(exclude)
         user_manifest = self.user_fs.get_user_manifest()
-        for workspace_entry in user_manifest.workspaces:
-            if workspace_entry.role is None or workspace_entry.id in exclude_set:
-                continue
-            await self.safe_mount(workspace_entry.id)
+        workspace_ids = [
+            workspace_entry.id
+            for workspace_entry in user_manifest.workspaces
+            if workspace_entry.role is not None and workspace_entry.id not in exclude_set
+        ]
+        # Workspace storages are opened lazily, so open the ones about
+        # to be mounted concurrently instead of one mount at a time
+        await self.user_fs.load_workspace_storages(workspace_ids)
+        for workspace_id in workspace_ids:
+            await self.safe_mount(workspace_id)
 
     async def safe_unmount_all(self):
         for workspace_id, timestamp in list(self._mountpoint_tasks.keys()):
@@ -24,8 +24,8 @@ class ThreadFSAccess:
 
     # Entry transactions
 
-    def entry_info(self, path):
-        return self._run(self.workspace_fs.transactions.entry_info, path)
+    def entry_info(self, path, prefetch_children=False):
+        return self._run(self.workspace_fs.transactions.entry_info, path, prefetch_children)
 
     def entry_rename(self, source, destination, *, overwrite):
         return self._run(
@@ -289,7 +289,8 @@ class WinFSPOperations(BaseFileSystemOperations):
     @handle_error
     def read_directory(self, file_context, marker):
         entries = []
-        stat = self.fs_access.entry_info(file_context.path)
+        # Children are going to be stat'ed to build the listing
+        stat = self.fs_access.entry_info(file_context.path, prefetch_children=True)
 
         if stat["type"] == "file":
             raise NTStatusError(NTSTATUS.STATUS_NOT_A_DIRECTORY)
@@ -4,8 +4,12 @@ from parsec.core.core_events import CoreEvent
 import trio
 from trio.hazmat import current_clock
 import math
+import heapq
+from typing import Optional
 from structlog import get_logger
 
+from parsec.api.protocol import VLOB_POLL_CHANGES_MAX_LIMIT
+from parsec.core.config import DEFAULT_SYNC_MAX_CONCURRENCY
 from parsec.core.types import EntryID, WorkspaceRole
 from parsec.core.fs import (
     FSBackendOfflineError,
@@ -23,6 +27,9 @@ MIN_WAIT = 1
 MAX_WAIT = 60
 MAINTENANCE_MIN_WAIT = 30
 TICK_CRASH_COOLDOWN = 5
+# The other workspaces are only ticked again once the tick is over, so a
+# tick stops pulling new entries to sync after this duration
+TICK_MAX_DURATION = MIN_WAIT
 
 
 async def freeze_sync_monitor_mockpoint():
@@ -63,16 +70,47 @@ class SyncContext:
     - Otherwise (typically when the application starts or when back online after
       an disconnection) it uses the realm's checkpoint stored in the persistent
       storage to get the list of changes (entry id + version) it has missed
+
+    Local changes are indexed by due time in a heap so that each tick only
+    considers the entries that are actually due. During a tick, `max_concurrency`
+    workers keep pulling the due entries (remote changes first) and synchronize
+    them concurrently, so a slow entry doesn't hold the other ones back (each
+    entry sync is still protected by the workspace's per-entry sync lock).
     """
 
-    def __init__(self, user_fs, id: EntryID, read_only: bool = False):
+    def __init__(
+        self,
+        user_fs,
+        id: EntryID,
+        read_only: bool = False,
+        max_concurrency: int = DEFAULT_SYNC_MAX_CONCURRENCY,
+    ):
         self.user_fs = user_fs
         self.id = id
         self.read_only = read_only
+        self.max_concurrency = max_concurrency
         self.due_time = math.inf
         self._changes_loaded = False
         self._local_changes = {}
+        # Heap of (due time, entry id), an item is stale if the corresponding
+        # change has been synced (lazily discarded) or has been postponed
+        # (lazily pushed back with its new due time)
+        self._local_changes_heap = []
         self._remote_changes = set()
+        # Statistics
+        self.synced_count = 0
+        self.sync_duration = 0.0
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._remote_changes) + len(self._local_changes)
+
+    @property
+    def throughput(self) -> float:
+        """
+        Number of entries synchronized per second spent syncing
+        """
+        return self.synced_count / self.sync_duration if self.sync_duration else 0.0
 
     def _sync(self, entry_id: EntryID):
         raise NotImplementedError
@@ -95,33 +133,44 @@ class SyncContext:
         # make it worth to retry
         self.due_time = math.inf
 
-        # 1) Fetch new checkpoint and changes
+        # 1) Fetch new checkpoint and changes, page by page so that the
+        # responses stay small no matter how long we have been offline
         realm_checkpoint = await self._get_local_storage().get_realm_checkpoint()
-        try:
-            rep = await self._get_backend_cmds().vlob_poll_changes(self.id, realm_checkpoint)
-
-        except BackendNotAvailable:
-            raise
-
-        # Another backend error
-        except BackendConnectionError as exc:
-            logger.warning("Unexpected backend response during sync bootstrap", exc_info=exc)
-            return False
+        while True:
+            try:
+                rep = await self._get_backend_cmds().vlob_poll_changes(
+                    self.id, realm_checkpoint, limit=VLOB_POLL_CHANGES_MAX_LIMIT
+                )
+
+            except BackendNotAvailable:
+                raise
+
+            # Another backend error
+            except BackendConnectionError as exc:
+                logger.warning("Unexpected backend response during sync bootstrap", exc_info=exc)
+                return False
+
+            if rep["status"] == "not_found":
+                # Workspace not yet synchronized with backend
+                new_checkpoint = 0
+                changes = {}
+                has_more = False
+            elif rep["status"] in ("in_maintenance", "not_allowed"):
+                return False
+            elif rep["status"] != "ok":
+                return False
+            else:
+                new_checkpoint = rep["current_checkpoint"]
+                changes = rep["changes"]
+                has_more = rep["has_more"]
 
-        if rep["status"] == "not_found":
-            # Workspace not yet synchronized with backend
-            new_checkpoint = 0
-            changes = {}
-        elif rep["status"] in ("in_maintenance", "not_allowed"):
-            return False
-        elif rep["status"] != "ok":
-            return False
-        else:
-            new_checkpoint = rep["current_checkpoint"]
-            changes = rep["changes"]
+            # 2) Store new checkpoint and changes, hence the progress is kept
+            # if we get interrupted before the last page
+            await self._get_local_storage().update_realm_checkpoint(new_checkpoint, changes)
 
-        # 2) Store new checkpoint and changes
-        await self._get_local_storage().update_realm_checkpoint(new_checkpoint, changes)
+            if not has_more:
+                break
+            realm_checkpoint = new_checkpoint
 
         # 3) Compute local and remote changes that need to be synced
         need_sync_local, need_sync_remote = await self._get_local_storage().get_need_sync_entries()
@@ -129,6 +178,10 @@ class SyncContext:
         # Ignore local changes in read only mode
         if not self.read_only:
             self._local_changes = {entry_id: LocalChange(now) for entry_id in need_sync_local}
+            self._local_changes_heap = [
+                (change.due_time, entry_id) for entry_id, change in self._local_changes.items()
+            ]
+            heapq.heapify(self._local_changes_heap)
         self._remote_changes = need_sync_remote
 
         # 4) Finally refresh due time according to the changes
@@ -137,6 +190,35 @@ class SyncContext:
         self._changes_loaded = True
         return True
 
+    def _add_local_change(self, entry_id: EntryID, now: float) -> float:
+        local_change = LocalChange(now)
+        self._local_changes[entry_id] = local_change
+        heapq.heappush(self._local_changes_heap, (local_change.due_time, entry_id))
+        return local_change.due_time
+
+    def _next_local_due_time(self) -> float:
+        heap = self._local_changes_heap
+        while heap:
+            due_time, entry_id = heap[0]
+            local_change = self._local_changes.get(entry_id)
+            if local_change is None:
+                # Already synced
+                heapq.heappop(heap)
+            elif local_change.due_time > due_time:
+                # Postponed by a more recent change
+                heapq.heapreplace(heap, (local_change.due_time, entry_id))
+            else:
+                return due_time
+        return math.inf
+
+    def _pop_due_local_changes(self, now: float, count: int):
+        entry_ids = []
+        while len(entry_ids) < count and self._next_local_due_time() <= now:
+            _, entry_id = heapq.heappop(self._local_changes_heap)
+            del self._local_changes[entry_id]
+            entry_ids.append(entry_id)
+        return entry_ids
+
     def set_local_change(self, entry_id: EntryID) -> bool:
         # Ignore local changes in read only mode
         if self.read_only:
@@ -144,11 +226,10 @@ class SyncContext:
 
         now = timestamp()
         try:
+            # Due time can only move forward, the heap item is updated lazily
             new_due_time = self._local_changes[entry_id].changed(now)
         except KeyError:
-            local_change = LocalChange(now)
-            self._local_changes[entry_id] = local_change
-            new_due_time = local_change.due_time
+            new_due_time = self._add_local_change(entry_id, now)
 
         if new_due_time <= self.due_time:
             self.due_time = new_due_time
@@ -165,13 +246,8 @@ class SyncContext:
     def _compute_due_time(self, now=None, min_due_time=None):
         if self._remote_changes:
             self.due_time = now or timestamp()
-        elif self._local_changes:
-            # TODO: index changes by due_time to avoid this O(n) operation
-            self.due_time = min(
-                change_info.due_time for change_info in self._local_changes.values()
-            )
         else:
-            self.due_time = math.inf
+            self.due_time = self._next_local_due_time()
 
         if min_due_time:
             self.due_time = max(self.due_time, min_due_time)
@@ -182,6 +258,47 @@ class SyncContext:
         await self._load_changes()
         return self.due_time
 
+    async def _sync_remote_change(self, entry_id: EntryID, now: float) -> Optional[float]:
+        try:
+            await self._sync(entry_id)
+        except FSWorkspaceNoReadAccess:
+            # We've just lost the read access to the workspace.
+            # This likely means a `sharing.updated` event we soon arrive
+            # and destroy this sync context.
+            # Until then just pretent nothing happened (the change is
+            # added back once the tick is over).
+            return now + MIN_WAIT
+        except FSWorkspaceNoWriteAccess:
+            # We don't have write access and this entry contains local
+            # modifications. Hence we can forget about this change given
+            # it's `self._local_changes` role to keep track of local changes.
+            pass
+        except FSWorkspaceInMaintenance:
+            # Not the right time for the sync, retry later
+            return now + MAINTENANCE_MIN_WAIT
+        else:
+            self.synced_count += 1
+        return None
+
+    async def _sync_local_change(self, entry_id: EntryID, now: float) -> Optional[float]:
+        try:
+            await self._sync(entry_id)
+        except (FSWorkspaceNoReadAccess, FSWorkspaceNoWriteAccess):
+            # We've just lost the write access to the workspace, and
+            # the corresponding `sharing.updated` event hasn't updated
+            # the `read_only` flag yet.
+            # We keep track of the change (given we may be given back
+            # the write access in the future) but pretent it just accured
+            # to avoid a busy sync loop until `read_only` flag is updated.
+            self._add_local_change(entry_id, now)
+        except FSWorkspaceInMaintenance:
+            # Not the right time for the sync, retry later
+            self._add_local_change(entry_id, now)
+            return now + MAINTENANCE_MIN_WAIT
+        else:
+            self.synced_count += 1
+        return None
+
     async def tick(self) -> float:
         now = timestamp()
         if self.due_time > now:
@@ -192,74 +309,86 @@ class SyncContext:
         if not await self._load_changes():
             return self.due_time
 
-        min_due_time = None
-
-        # Remote changes sync have priority over local changes
-        if self._remote_changes:
-            entry_id = self._remote_changes.pop()
-            try:
-                await self._sync(entry_id)
-            except FSBackendOfflineError as exc:
-                raise BackendNotAvailable from exc
-            except FSWorkspaceNoReadAccess:
-                # We've just lost the read access to the workspace.
-                # This likely means a `sharing.updated` event we soon arrive
-                # and destroy this sync context.
-                # Until then just pretent nothing happened.
-                min_due_time = now + MIN_WAIT
-                self._remote_changes.add(entry_id)
-            except FSWorkspaceNoWriteAccess:
-                # We don't have write access and this entry contains local
-                # modifications. Hence we can forget about this change given
-                # it's `self._local_changes` role to keep track of local changes.
-                pass
-            except FSWorkspaceInMaintenance:
-                # Not the right time for the sync, retry later
-                min_due_time = now + MAINTENANCE_MIN_WAIT
-                self._remote_changes.add(entry_id)
-
-        elif self._local_changes:
-            entry_id = next(
-                (
-                    entry_id
-                    for entry_id, change_info in self._local_changes.items()
-                    if change_info.due_time <= now
-                ),
-                None,
-            )
-            if entry_id:
-                del self._local_changes[entry_id]
+        entry_ids = []
+        local_entry_ids = []
+        remote_retries = []
+        min_due_times = []
+        errors = []
+
+        def _pull_change():
+            # Stop pulling once a sync has failed or has been postponed
+            # (most likely all the others would be as well)
+            if errors or min_due_times or timestamp() - now >= TICK_MAX_DURATION:
+                return None
+            # Remote changes sync have priority over local changes
+            if self._remote_changes:
+                entry_id = self._remote_changes.pop()
+                entry_ids.append(entry_id)
+                return entry_id, True
+            # Local changes added back during this tick are due
+            # after `now`, hence they won't be pulled again
+            due_entry_ids = self._pop_due_local_changes(now, 1)
+            if not due_entry_ids:
+                return None
+            entry_ids.extend(due_entry_ids)
+            local_entry_ids.extend(due_entry_ids)
+            return due_entry_ids[0], False
+
+        async def _worker():
+            while True:
+                change = _pull_change()
+                if change is None:
+                    return
+                entry_id, remote = change
                 try:
-                    await self._sync(entry_id)
-                except FSBackendOfflineError as exc:
-                    raise BackendNotAvailable from exc
-                except (FSWorkspaceNoReadAccess, FSWorkspaceNoWriteAccess):
-                    # We've just lost the write access to the workspace, and
-                    # the corresponding `sharing.updated` event hasn't updated
-                    # the `read_only` flag yet.
-                    # We keep track of the change (given we may be given back
-                    # the write access in the future) but pretent it just accured
-                    # to avoid a busy sync loop until `read_only` flag is updated.
-                    self._local_changes[entry_id] = LocalChange(now)
-                except FSWorkspaceInMaintenance:
-                    # Not the right time for the sync, retry later
-                    min_due_time = now + MAINTENANCE_MIN_WAIT
-                    self._local_changes[entry_id] = LocalChange(now)
-
-                # This is where we plug our vacuuming routine
-                # as it corresponds to a fresh synchronized state
-                if not self._local_changes:
-                    await self._get_local_storage().run_vacuum()
-
-        self._compute_due_time(now=now, min_due_time=min_due_time)
+                    if remote:
+                        min_due_time = await self._sync_remote_change(entry_id, now)
+                    else:
+                        min_due_time = await self._sync_local_change(entry_id, now)
+                except Exception as exc:
+                    errors.append(exc)
+                    return
+                if min_due_time is not None:
+                    min_due_times.append(min_due_time)
+                    if remote:
+                        remote_retries.append(entry_id)
+
+        async with trio.open_service_nursery() as nursery:
+            for _ in range(self.max_concurrency):
+                nursery.start_soon(_worker)
+        # Added back only now to not retry them during this tick
+        self._remote_changes.update(remote_retries)
+        if entry_ids:
+            self.sync_duration += timestamp() - now
+            logger.debug(
+                "Sync tick done",
+                workspace_id=self.id,
+                synced=len(entry_ids),
+                queue_depth=self.queue_depth,
+                throughput=self.throughput,
+            )
+
+        if errors:
+            # Report the first error, the sync context is going to be
+            # reset anyway (or the monitor stopped if the backend is offline)
+            if isinstance(errors[0], FSBackendOfflineError):
+                raise BackendNotAvailable from errors[0]
+            raise errors[0]
+
+        # This is where we plug our vacuuming routine
+        # as it corresponds to a fresh synchronized state
+        if local_entry_ids and not self._local_changes:
+            await self._get_local_storage().run_vacuum()
+
+        self._compute_due_time(now=now, min_due_time=max(min_due_times, default=None))
         return self.due_time
 
 
 class WorkspaceSyncContext(SyncContext):
-    def __init__(self, user_fs, id: EntryID):
+    def __init__(self, user_fs, id: EntryID, max_concurrency: int = DEFAULT_SYNC_MAX_CONCURRENCY):
         self.workspace = user_fs.get_workspace(id)
         read_only = self.workspace.get_workspace_entry().role == WorkspaceRole.READER
-        super().__init__(user_fs, id, read_only=read_only)
+        super().__init__(user_fs, id, read_only=read_only, max_concurrency=max_concurrency)
 
     async def _sync(self, entry_id: EntryID):
         # No recursion here: only the manifest that has changed
@@ -291,10 +420,15 @@ class SyncContextStore:
     when a newly created workspace is modified for the first time)
     """
 
-    def __init__(self, user_fs):
+    def __init__(self, user_fs, max_concurrency: int = DEFAULT_SYNC_MAX_CONCURRENCY):
         self.user_fs = user_fs
+        self.max_concurrency = max_concurrency
         self._ctxs = {}
 
+    @property
+    def queue_depth(self) -> int:
+        return sum(ctx.queue_depth for ctx in self._ctxs.values())
+
     def iter(self):
         return self._ctxs.copy().values()
 
@@ -306,7 +440,9 @@ class SyncContextStore:
                 ctx = UserManifestSyncContext(self.user_fs, entry_id)
             else:
                 try:
-                    ctx = WorkspaceSyncContext(self.user_fs, entry_id)
+                    ctx = WorkspaceSyncContext(
+                        self.user_fs, entry_id, max_concurrency=self.max_concurrency
+                    )
                 except FSWorkspaceNotFoundError:
                     # It's possible the workspace is not yet available
                     # (this can happen when a workspace is just shared with
@@ -320,8 +456,10 @@ class SyncContextStore:
         self._ctxs.pop(entry_id, None)
 
 
-async def monitor_sync(user_fs, event_bus, task_status):
-    ctxs = SyncContextStore(user_fs)
+async def monitor_sync(
+    user_fs, event_bus, task_status, max_concurrency: int = DEFAULT_SYNC_MAX_CONCURRENCY
+):
+    ctxs = SyncContextStore(user_fs, max_concurrency=max_concurrency)
     early_wakeup = trio.Event()
 
     def _trigger_early_wakeup():
@@ -375,6 +513,32 @@ async def monitor_sync(user_fs, event_bus, task_status):
             else:
                 return math.inf
 
+    async def _ctxs_action(due_ctxs, meth, due_times):
+        # Workspaces are independent, so their sync contexts are run concurrently
+        offline_excs = []
+
+        async def _action(ctx):
+            try:
+                due_times.append(await _ctx_action(ctx, meth))
+            except BackendNotAvailable as exc:
+                offline_excs.append(exc)
+
+        async with trio.open_service_nursery() as nursery:
+            for ctx in due_ctxs:
+                nursery.start_soon(_action, ctx)
+        if offline_excs:
+            raise offline_excs[0]
+
+    async def _tick_ctxs(due_times):
+        now = timestamp()
+        due_ctxs = []
+        for ctx in ctxs.iter():
+            if ctx.due_time <= now:
+                due_ctxs.append(ctx)
+            else:
+                due_times.append(ctx.due_time)
+        await _ctxs_action(due_ctxs, "tick", due_times)
+
     with event_bus.connect_in_context(
         (CoreEvent.FS_ENTRY_UPDATED, _on_entry_updated),
         (CoreEvent.BACKEND_REALM_VLOBS_UPDATED, _on_realm_vlobs_updated),
@@ -385,12 +549,16 @@ async def monitor_sync(user_fs, event_bus, task_status):
         ctx = ctxs.get(user_fs.user_manifest_id)
         due_times.append(await _ctx_action(ctx, "bootstrap"))
         # Init workspaces sync context
+        # Bootstrapping opens the local storage of each workspace, this is
+        # bounded by userfs the same way the mountpoint warm-up is
         user_manifest = user_fs.get_user_manifest()
+        bootstrap_ctxs = []
         for entry in user_manifest.workspaces:
             if entry.role is not None:
                 ctx = ctxs.get(entry.id)
                 if ctx:
-                    due_times.append(await _ctx_action(ctx, "bootstrap"))
+                    bootstrap_ctxs.append(ctx)
+        await _ctxs_action(bootstrap_ctxs, "bootstrap", due_times)
 
         task_status.started()
         while True:
@@ -406,5 +574,4 @@ async def monitor_sync(user_fs, event_bus, task_status):
                 task_status.awake()
             due_times.clear()
             await freeze_sync_monitor_mockpoint()
-            for ctx in ctxs.iter():
-                due_times.append(await _ctx_action(ctx, "tick"))
+            await _tick_ctxs(due_times)
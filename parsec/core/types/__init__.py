@@ -23,6 +23,7 @@ from parsec.core.types.manifest import (
     LocalFileManifest,
     LocalFolderManifest,
     LocalWorkspaceManifest,
+    LocalFolderishManifestDelta,
 )
 from parsec.core.types.manifest import (
     LocalUserManifest,
@@ -69,6 +70,7 @@ __all__ = (
     "LocalFileManifest",
     "LocalFolderManifest",
     "LocalWorkspaceManifest",
+    "LocalFolderishManifestDelta",
     "LocalUserManifest",
     "LocalManifest",
     "WorkspaceEntry",
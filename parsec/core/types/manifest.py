@@ -2,7 +2,7 @@
 
 import attr
 import functools
-from typing import Optional, Tuple
+from typing import Optional, Tuple, Union
 from pendulum import Pendulum, now as pendulum_now
 
 from parsec.types import UUID4, FrozenDict
@@ -569,6 +569,71 @@ class LocalWorkspaceManifest(LocalManifest):
         )
 
 
+class LocalFolderishManifestDelta(BaseLocalData):
+    """
+    Changes between two versions of a local folder or workspace manifest
+    sharing the same base, used by the local storage to persist large
+    folders without rewriting all of their children each time.
+    """
+
+    class SCHEMA_CLS(BaseSchema):
+        need_sync = fields.Boolean(required=True)
+        updated = fields.DateTime(required=True)
+        children = fields.FrozenMap(EntryNameField(), EntryIDField(required=True), required=True)
+        removed_children = fields.FrozenList(EntryNameField(), required=True)
+
+        @post_load
+        def make_obj(self, data):
+            return LocalFolderishManifestDelta(**data)
+
+    need_sync: bool
+    updated: Pendulum
+    children: FrozenDict[EntryName, EntryID]
+    removed_children: Tuple[EntryName, ...]
+
+    @classmethod
+    def from_manifests(
+        cls,
+        old: Union[LocalFolderManifest, LocalWorkspaceManifest],
+        new: Union[LocalFolderManifest, LocalWorkspaceManifest],
+    ) -> "LocalFolderishManifestDelta":
+        assert old.base is new.base
+        old_children = old.children
+        new_children = new.children
+        if old_children is new_children:
+            children = {}
+            removed_children = ()
+        else:
+            # Unchanged children share the same entry id object, comparing by
+            # identity is much cheaper (a false positive only makes the delta
+            # contain an unchanged child)
+            old_get = old_children.get
+            children = {
+                name: entry_id
+                for name, entry_id in new_children.items()
+                if old_get(name) is not entry_id
+            }
+            removed_children = tuple(old_children.keys() - new_children.keys())
+        return cls(
+            need_sync=new.need_sync,
+            updated=new.updated,
+            children=children,
+            removed_children=removed_children,
+        )
+
+    def __len__(self) -> int:
+        return len(self.children) + len(self.removed_children)
+
+    def apply(
+        self, manifest: Union[LocalFolderManifest, LocalWorkspaceManifest]
+    ) -> Union[LocalFolderManifest, LocalWorkspaceManifest]:
+        children = dict(manifest.children)
+        for name in self.removed_children:
+            children.pop(name, None)
+        children.update(self.children)
+        return manifest.evolve(need_sync=self.need_sync, updated=self.updated, children=children)
+
+
 class LocalUserManifest(LocalManifest):
     class SCHEMA_CLS(BaseSchema):
         type = fields.EnumCheckedConstant(LocalManifestType.LOCAL_USER_MANIFEST, required=True)
@@ -299,6 +299,8 @@ test_requirements = [
     "hypothesis==5.3.0",
     "hypothesis-trio==0.5.0",
     "trustme==0.6.0",
+    # Local S3 stand-in for the S3 blockstore tests
+    "moto==1.3.14",
     # Winfsptest requirements
     # We can't use `winfspy[test]` because of some pip limitations
     # - see pip issues #7096/#6239/#4391/#988
@@ -336,6 +338,8 @@ extra_requirements = {
         # Swift
         "python-swiftclient==3.5.0",
         "pbr==4.0.2",
+        # Vectorized RAID5 parity computation
+        "numpy==1.19.5",
     ],
     "dev": test_requirements,
 }
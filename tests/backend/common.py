@@ -9,6 +9,7 @@ from parsec.api.protocol import (
     ping_serializer,
     block_create_serializer,
     block_read_serializer,
+    block_read_batch_serializer,
     realm_create_serializer,
     realm_status_serializer,
     realm_get_role_certificates_serializer,
@@ -17,6 +18,7 @@ from parsec.api.protocol import (
     realm_finish_reencryption_maintenance_serializer,
     vlob_create_serializer,
     vlob_read_serializer,
+    vlob_read_batch_serializer,
     vlob_update_serializer,
     vlob_list_versions_serializer,
     vlob_poll_changes_serializer,
@@ -130,6 +132,11 @@ block_create = CmdSock(
 block_read = CmdSock(
     "block_read", block_read_serializer, parse_args=lambda self, block_id: {"block_id": block_id}
 )
+block_read_batch = CmdSock(
+    "block_read_batch",
+    block_read_batch_serializer,
+    parse_args=lambda self, realm_id, block_ids: {"realm_id": realm_id, "block_ids": block_ids},
+)
 
 
 ### Realm ###
@@ -206,6 +213,16 @@ vlob_read = CmdSock(
         "encryption_revision": encryption_revision,
     },
 )
+vlob_read_batch = CmdSock(
+    "vlob_read_batch",
+    vlob_read_batch_serializer,
+    parse_args=lambda self, realm_id, vlob_ids, timestamp=None, encryption_revision=1: {
+        "realm_id": realm_id,
+        "vlob_ids": vlob_ids,
+        "timestamp": timestamp,
+        "encryption_revision": encryption_revision,
+    },
+)
 vlob_update = CmdSock(
     "vlob_update",
     vlob_update_serializer,
@@ -229,9 +246,10 @@ vlob_list_versions = CmdSock(
 vlob_poll_changes = CmdSock(
     "vlob_poll_changes",
     vlob_poll_changes_serializer,
-    parse_args=lambda self, realm_id, last_checkpoint: {
+    parse_args=lambda self, realm_id, last_checkpoint, limit=None: {
         "realm_id": realm_id,
         "last_checkpoint": last_checkpoint,
+        "limit": limit,
     },
 )
 vlob_maintenance_get_reencryption_batch = CmdSock(
@@ -2,6 +2,8 @@
 
 import trio
 import pytest
+import operator
+from functools import reduce
 from unittest.mock import ANY
 import pendulum
 from uuid import UUID, uuid4
@@ -9,14 +11,18 @@ from hypothesis import given, strategies as st
 
 from parsec.backend.block import BlockTimeoutError
 from parsec.backend.realm import RealmGrantedRole
+from parsec.backend.raid1_blockstore import MirrorStats, DEFAULT_HEDGE_DELAY, ERROR_RATE_HALF_LIFE
+from parsec.backend import raid5_blockstore
 from parsec.backend.raid5_blockstore import (
+    _numpy_xor_buffers,
+    _int_xor_buffers,
     split_block_in_chunks,
     generate_checksum_chunk,
     rebuild_block_from_chunks,
 )
 from parsec.api.protocol import block_create_serializer, block_read_serializer, packb, RealmRole
 
-from tests.backend.common import block_create, block_read
+from tests.backend.common import block_create, block_read, block_read_batch
 
 
 BLOCK_ID = UUID("00000000000000000000000000000001")
@@ -170,6 +176,132 @@ async def test_raid1_block_read_partial_failure(alice_backend_sock, alice, backe
     assert rep == {"status": "ok", "block": BLOCK_DATA}
 
 
+@pytest.mark.trio
+@pytest.mark.raid1_blockstore
+async def test_raid1_block_read_single_mirror(alice_backend_sock, alice, backend, block):
+    reads = [0, 0]
+
+    def _count_reads(index):
+        read = backend.blockstore.blockstores[index].read
+
+        async def _read(organization_id, id):
+            reads[index] += 1
+            return await read(organization_id, id)
+
+        return _read
+
+    for index in (0, 1):
+        backend.blockstore.blockstores[index].read = _count_reads(index)
+
+    for _ in range(5):
+        rep = await block_read(alice_backend_sock, block)
+        assert rep == {"status": "ok", "block": BLOCK_DATA}
+
+    # Healthy mirrors are not all read for each block
+    assert sum(reads) == 5
+    stats = backend.blockstore.mirror_stats
+    assert [s.reads for s in stats] == reads
+    assert [s.errors for s in stats] == [0, 0]
+    assert [s.hedged_reads for s in stats] == [0, 0]
+
+
+@pytest.mark.trio
+@pytest.mark.raid1_blockstore
+async def test_raid1_block_read_hedged(alice_backend_sock, alice, backend, block):
+    slow_reads = 0
+    slow_reads_cancelled = 0
+
+    async def mock_read(organization_id, id):
+        nonlocal slow_reads, slow_reads_cancelled
+        slow_reads += 1
+        try:
+            await trio.sleep_forever()
+        finally:
+            slow_reads_cancelled += 1
+
+    # The preferred mirror hangs, another mirror gets read once the hedge deadline is reached
+    stats = backend.blockstore.mirror_stats
+    preferred_index = min((0, 1), key=lambda i: stats[i].expected_latency())
+    healthy_index = 1 - preferred_index
+    backend.blockstore.blockstores[preferred_index].read = mock_read
+    with trio.fail_after(1):
+        rep = await block_read(alice_backend_sock, block)
+    assert rep == {"status": "ok", "block": BLOCK_DATA}
+    assert slow_reads == slow_reads_cancelled == 1
+
+    # The cancelled read is accounted for...
+    assert stats[preferred_index].reads == 0
+    assert stats[preferred_index].cancelled_reads == 1
+    assert stats[healthy_index].reads == 1
+    assert stats[healthy_index].hedged_reads == 1
+
+    # ...so the healthy mirror is now preferred and read without hedging
+    assert stats[healthy_index].expected_latency() < stats[preferred_index].expected_latency()
+    for _ in range(3):
+        rep = await block_read(alice_backend_sock, block)
+        assert rep == {"status": "ok", "block": BLOCK_DATA}
+    assert slow_reads == 1
+    assert stats[healthy_index].reads == 4
+    assert stats[healthy_index].hedged_reads == 1
+
+
+@pytest.mark.trio
+@pytest.mark.raid1_blockstore
+async def test_raid1_block_read_avoids_failing_mirror(alice_backend_sock, alice, backend, block):
+    failing_reads = 0
+
+    async def mock_read(organization_id, id):
+        nonlocal failing_reads
+        failing_reads += 1
+        await trio.sleep(0)
+        raise BlockTimeoutError()
+
+    backend.blockstore.blockstores[0].read = mock_read
+
+    for _ in range(5):
+        rep = await block_read(alice_backend_sock, block)
+        assert rep == {"status": "ok", "block": BLOCK_DATA}
+
+    # Once its error has been recorded, the failing mirror is read last
+    assert failing_reads == 1
+    stats = backend.blockstore.mirror_stats
+    assert stats[0].errors == 1
+    assert stats[1].reads == 5
+
+
+def test_raid1_mirror_stats():
+    stats = MirrorStats()
+    assert stats.expected_latency() == 0.0
+    assert stats.hedge_delay() == DEFAULT_HEDGE_DELAY
+
+    for latency in range(1, 101):
+        stats.record_success(latency / 1000)
+    assert stats.reads == 100
+    assert 0.08 < stats.latency_ewma < 0.1
+    assert stats.hedge_delay() == 0.096
+
+    expected_latency = stats.expected_latency(now=0)
+    stats.record_error(now=0)
+    assert stats.errors == 1
+    assert stats.error_rate(now=0) == pytest.approx(0.2)
+    assert stats.expected_latency(now=0) > expected_latency
+
+    # The error rate decays over time, even without new reads
+    assert stats.error_rate(now=ERROR_RATE_HALF_LIFE) == pytest.approx(0.1)
+    assert stats.expected_latency(now=10 * ERROR_RATE_HALF_LIFE) == pytest.approx(
+        expected_latency, rel=1e-3
+    )
+
+    # Cancelled reads only count when slower than expected
+    latency_ewma = stats.latency_ewma
+    stats.record_cancelled(latency_ewma / 2)
+    assert stats.cancelled_reads == 1
+    assert stats.latency_ewma == latency_ewma
+    stats.record_cancelled(1.0)
+    assert stats.cancelled_reads == 2
+    assert stats.latency_ewma > latency_ewma
+
+
 @pytest.mark.trio
 @pytest.mark.raid0_blockstore
 async def test_raid0_block_create_and_read(alice_backend_sock, realm):
@@ -417,6 +549,145 @@ async def test_access_during_maintenance(backend, alice, alice_backend_sock, rea
     assert rep == {"status": "in_maintenance"}
 
 
+@pytest.mark.trio
+async def test_block_read_batch(
+    backend, alice, bob, alice_backend_sock, bob_backend_sock, realm, other_realm, block
+):
+    other_block_id = uuid4()
+    other_realm_block_id = uuid4()
+    await block_create(alice_backend_sock, other_block_id, realm, b"other data")
+    await block_create(alice_backend_sock, other_realm_block_id, other_realm, b"other realm data")
+
+    # Blocks not found or from another realm are omitted
+    rep = await block_read_batch(
+        alice_backend_sock, realm, [block, other_block_id, other_realm_block_id, BLOCK_ID]
+    )
+    assert rep == {"status": "ok", "blocks": {block: BLOCK_DATA, other_block_id: b"other data"}}
+
+    rep = await block_read_batch(alice_backend_sock, realm, [])
+    assert rep == {"status": "ok", "blocks": {}}
+
+    # Access is checked for the whole realm
+    rep = await block_read_batch(bob_backend_sock, realm, [block])
+    assert rep == {"status": "not_allowed"}
+
+    rep = await block_read_batch(alice_backend_sock, uuid4(), [block])
+    assert rep == {"status": "not_found"}
+
+    await backend.realm.start_reencryption_maintenance(
+        alice.organization_id,
+        alice.device_id,
+        realm,
+        2,
+        {alice.user_id: b"whatever"},
+        pendulum.now(),
+    )
+    rep = await block_read_batch(alice_backend_sock, realm, [block])
+    assert rep == {"status": "in_maintenance"}
+
+
+class SlowBlockStoreCreate:
+    """Stand-in for a slow blockstore upload (e.g. S3/Swift), blocking until released"""
+
+    def __init__(self, create):
+        self._create = create
+        self.in_progress = 0
+        self.in_progress_changed = trio.Event()
+        self.released = trio.Event()
+
+    async def __call__(self, organization_id, id, block):
+        self.in_progress += 1
+        self.in_progress_changed.set()
+        await self.released.wait()
+        await self._create(organization_id, id, block)
+
+
+@pytest.mark.trio
+async def test_block_create_doesnt_hold_db_connection_during_upload(
+    monkeypatch, backend, alice, realm, block
+):
+    blockstore = backend.block._blockstore_component
+    slow_create = SlowBlockStoreCreate(blockstore.create)
+    monkeypatch.setattr(blockstore, "create", slow_create)
+
+    # More concurrent uploads than database connections in the pool
+    uploads_count = backend.config.db_max_connections * 2
+    block_ids = [uuid4() for _ in range(uploads_count)]
+    async with trio.open_nursery() as nursery:
+        for block_id in block_ids:
+            nursery.start_soon(
+                backend.block.create,
+                alice.organization_id,
+                alice.device_id,
+                block_id,
+                realm,
+                BLOCK_DATA,
+            )
+        with trio.fail_after(1):
+            while slow_create.in_progress < uploads_count:
+                slow_create.in_progress_changed = trio.Event()
+                await slow_create.in_progress_changed.wait()
+
+        # Other requests are not starved while the uploads are in progress
+        with trio.fail_after(1):
+            data = await backend.block.read(alice.organization_id, alice.device_id, block)
+        assert data == BLOCK_DATA
+
+        slow_create.released.set()
+
+    for block_id in block_ids:
+        data = await backend.block.read(alice.organization_id, alice.device_id, block_id)
+        assert data == BLOCK_DATA
+
+
+@pytest.mark.slow
+@pytest.mark.trio
+async def test_bench_block_create_with_slow_blockstore(monkeypatch, backend, alice, realm, block):
+    upload_latency = 0.1
+    uploads_count = 100
+    blockstore = backend.block._blockstore_component
+    create = blockstore.create
+
+    async def _slow_create(organization_id, id, block):
+        await trio.sleep(upload_latency)
+        await create(organization_id, id, block)
+
+    monkeypatch.setattr(blockstore, "create", _slow_create)
+
+    reads_latencies = []
+
+    async def _read_loop():
+        while True:
+            start = trio.current_time()
+            await backend.block.read(alice.organization_id, alice.device_id, block)
+            reads_latencies.append(trio.current_time() - start)
+            await trio.sleep(0.01)
+
+    start = trio.current_time()
+    async with trio.open_nursery() as nursery:
+        nursery.start_soon(_read_loop)
+        async with trio.open_nursery() as uploads_nursery:
+            for _ in range(uploads_count):
+                uploads_nursery.start_soon(
+                    backend.block.create,
+                    alice.organization_id,
+                    alice.device_id,
+                    uuid4(),
+                    realm,
+                    BLOCK_DATA,
+                )
+        nursery.cancel_scope.cancel()
+    elapsed = trio.current_time() - start
+
+    print(
+        f"{uploads_count} uploads ({upload_latency}s latency) in {elapsed:.2f}s, "
+        f"{len(reads_latencies)} concurrent reads "
+        f"(max latency {max(reads_latencies, default=0):.3f}s)"
+    )
+    # Uploads are not serialized by the database connection pool
+    assert elapsed < upload_latency * uploads_count / backend.config.db_max_connections
+
+
 @given(block=st.binary(max_size=2 ** 8), nb_blockstores=st.integers(min_value=3, max_value=16))
 def test_split_block(block, nb_blockstores):
     nb_chunks = nb_blockstores - 1
@@ -436,3 +707,24 @@ def test_split_block(block, nb_blockstores):
         partial_chunks[missing] = None
         rebuilt = rebuild_block_from_chunks(partial_chunks, checksum_chunk)
         assert rebuilt == block
+
+
+@pytest.mark.parametrize(
+    "xor_buffers",
+    [
+        pytest.param(
+            _numpy_xor_buffers,
+            marks=pytest.mark.skipif(raid5_blockstore.numpy is None, reason="numpy not installed"),
+            id="numpy",
+        ),
+        pytest.param(_int_xor_buffers, id="int"),
+    ],
+)
+@given(
+    buffers=st.integers(min_value=1, max_value=64).flatmap(
+        lambda size: st.lists(st.binary(min_size=size, max_size=size), min_size=1, max_size=8)
+    )
+)
+def test_xor_buffers(xor_buffers, buffers):
+    expected = bytes(reduce(operator.xor, column) for column in zip(*buffers))
+    assert xor_buffers(*buffers) == expected
@@ -15,7 +15,13 @@ from parsec.api.protocol import (
 from parsec.backend.realm import RealmGrantedRole
 
 from tests.common import freeze_time
-from tests.backend.common import vlob_create, vlob_update, vlob_read, vlob_list_versions
+from tests.backend.common import (
+    vlob_create,
+    vlob_update,
+    vlob_read,
+    vlob_read_batch,
+    vlob_list_versions,
+)
 
 
 VLOB_ID = UUID("00000000000000000000000000000001")
@@ -288,6 +294,61 @@ async def test_read_bad_version(alice_backend_sock, vlobs):
     assert rep == {"status": "bad_version"}
 
 
+@pytest.mark.trio
+async def test_read_batch(alice, bob_backend_sock, alice_backend_sock, realm, other_realm, vlobs):
+    other_realm_vlob_id = uuid4()
+    await vlob_create(alice_backend_sock, other_realm, other_realm_vlob_id, b"other realm")
+
+    # Vlobs not found or from another realm are omitted
+    rep = await vlob_read_batch(
+        alice_backend_sock, realm, [vlobs[1], VLOB_ID, other_realm_vlob_id, vlobs[0]]
+    )
+    assert rep["status"] == "ok"
+    assert sorted(rep["vlobs"], key=lambda x: x["vlob_id"]) == [
+        {
+            "vlob_id": vlobs[0],
+            "version": 2,
+            "blob": b"r:A b:1 v:2",
+            "author": alice.device_id,
+            "timestamp": Pendulum(2000, 1, 3),
+        },
+        {
+            "vlob_id": vlobs[1],
+            "version": 1,
+            "blob": b"r:A b:2 v:1",
+            "author": alice.device_id,
+            "timestamp": Pendulum(2000, 1, 4),
+        },
+    ]
+
+    # Versions at a given timestamp
+    rep = await vlob_read_batch(
+        alice_backend_sock, realm, [vlobs[0], vlobs[1]], timestamp=Pendulum(2000, 1, 2)
+    )
+    assert rep == {
+        "status": "ok",
+        "vlobs": [
+            {
+                "vlob_id": vlobs[0],
+                "version": 1,
+                "blob": b"r:A b:1 v:1",
+                "author": alice.device_id,
+                "timestamp": Pendulum(2000, 1, 2),
+            }
+        ],
+    }
+
+    rep = await vlob_read_batch(alice_backend_sock, realm, [vlobs[0]], encryption_revision=2)
+    assert rep == {"status": "bad_encryption_revision"}
+
+    # Access is checked for the whole realm
+    rep = await vlob_read_batch(bob_backend_sock, realm, [vlobs[0]])
+    assert rep == {"status": "not_allowed"}
+
+    rep = await vlob_read_batch(alice_backend_sock, uuid4(), [vlobs[0]])
+    assert rep["status"] == "not_found"
+
+
 @pytest.mark.trio
 async def test_update_ok(alice_backend_sock, vlobs):
     await vlob_update(alice_backend_sock, vlobs[0], version=3, blob=b"Next version.")
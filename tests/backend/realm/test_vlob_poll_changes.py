@@ -5,7 +5,7 @@ from uuid import UUID
 from pendulum import Pendulum, now as pendulum_now
 
 from parsec.api.data import RealmRoleCertificateContent
-from parsec.api.protocol import RealmRole
+from parsec.api.protocol import RealmRole, VLOB_POLL_CHANGES_MAX_LIMIT
 
 from tests.backend.common import realm_update_roles, vlob_update, vlob_poll_changes
 
@@ -53,7 +53,12 @@ async def test_realm_updated_by_vlob(backend, alice, alice_backend_sock, realm):
 
     for last_checkpoint in (0, 1):
         rep = await vlob_poll_changes(alice_backend_sock, realm, last_checkpoint)
-        assert rep == {"status": "ok", "current_checkpoint": 2, "changes": {VLOB_ID: 2}}
+        assert rep == {
+            "status": "ok",
+            "current_checkpoint": 2,
+            "changes": {VLOB_ID: 2},
+            "has_more": False,
+        }
 
 
 @pytest.mark.trio
@@ -78,7 +83,65 @@ async def test_vlob_poll_changes_checkpoint_up_to_date(backend, alice, alice_bac
     )
 
     rep = await vlob_poll_changes(alice_backend_sock, realm, 2)
-    assert rep == {"status": "ok", "current_checkpoint": 2, "changes": {}}
+    assert rep == {"status": "ok", "current_checkpoint": 2, "changes": {}, "has_more": False}
+
+
+@pytest.mark.trio
+async def test_vlob_poll_changes_paginated(backend, alice, alice_backend_sock, realm):
+    for vlob_id in (VLOB_ID, OTHER_VLOB_ID, YET_ANOTHER_VLOB_ID):
+        await backend.vlob.create(
+            organization_id=alice.organization_id,
+            author=alice.device_id,
+            realm_id=realm,
+            encryption_revision=1,
+            vlob_id=vlob_id,
+            timestamp=NOW,
+            blob=b"v1",
+        )
+    # Checkpoints: VLOB_ID v1 -> 1, OTHER_VLOB_ID v1 -> 2, YET_ANOTHER_VLOB_ID v1 -> 3
+    # and VLOB_ID v2 -> 4
+    await backend.vlob.update(
+        organization_id=alice.organization_id,
+        author=alice.device_id,
+        encryption_revision=1,
+        vlob_id=VLOB_ID,
+        version=2,
+        timestamp=NOW,
+        blob=b"v2",
+    )
+
+    # Consume the changes page by page
+    rep = await vlob_poll_changes(alice_backend_sock, realm, 0, limit=2)
+    assert rep["status"] == "ok"
+    assert rep["has_more"] is True
+    # Memory backend only keeps the last change of each vlob
+    assert rep["current_checkpoint"] in (2, 3)
+    changes = rep["changes"]
+    while rep["has_more"]:
+        rep = await vlob_poll_changes(alice_backend_sock, realm, rep["current_checkpoint"], limit=2)
+        assert rep["status"] == "ok"
+        assert len(rep["changes"]) <= 2
+        changes.update(rep["changes"])
+    assert rep["current_checkpoint"] == 4
+    assert changes == {VLOB_ID: 2, OTHER_VLOB_ID: 1, YET_ANOTHER_VLOB_ID: 1}
+
+    rep = await vlob_poll_changes(alice_backend_sock, realm, 3, limit=1)
+    assert rep == {
+        "status": "ok",
+        "current_checkpoint": 4,
+        "changes": {VLOB_ID: 2},
+        "has_more": False,
+    }
+
+    rep = await vlob_poll_changes(alice_backend_sock, realm, 4, limit=1)
+    assert rep == {"status": "ok", "current_checkpoint": 4, "changes": {}, "has_more": False}
+
+
+@pytest.mark.trio
+@pytest.mark.parametrize("limit", [0, -1, VLOB_POLL_CHANGES_MAX_LIMIT + 1])
+async def test_vlob_poll_changes_bad_limit(alice_backend_sock, realm, limit):
+    rep = await vlob_poll_changes(alice_backend_sock, realm, 0, limit=limit)
+    assert rep["status"] == "bad_message"
 
 
 @pytest.mark.trio
@@ -118,7 +181,12 @@ async def test_vlob_poll_changes(backend, alice, bob, alice_backend_sock, bob_ba
     assert rep == {"status": "ok"}
 
     rep = await vlob_poll_changes(bob_backend_sock, realm, 1)
-    assert rep == {"status": "ok", "current_checkpoint": 2, "changes": {VLOB_ID: 2}}
+    assert rep == {
+        "status": "ok",
+        "current_checkpoint": 2,
+        "changes": {VLOB_ID: 2},
+        "has_more": False,
+    }
 
     # Change Bob with read only right
 
@@ -131,7 +199,12 @@ async def test_vlob_poll_changes(backend, alice, bob, alice_backend_sock, bob_ba
     assert rep == {"status": "not_allowed"}
 
     rep = await vlob_poll_changes(bob_backend_sock, realm, 1)
-    assert rep == {"status": "ok", "current_checkpoint": 2, "changes": {VLOB_ID: 2}}
+    assert rep == {
+        "status": "ok",
+        "current_checkpoint": 2,
+        "changes": {VLOB_ID: 2},
+        "has_more": False,
+    }
 
     # Finally remove all rights from Bob
 
@@ -4,8 +4,8 @@ import pytest
 from uuid import uuid4
 from unittest.mock import ANY
 
-from parsec.api.protocol import apiv1_organization_stats_serializer
-from tests.backend.common import vlob_create, block_create
+from parsec.api.protocol import OrganizationID, apiv1_organization_stats_serializer
+from tests.backend.common import vlob_create, vlob_update, block_create
 
 
 async def organization_stats(sock, organization_id):
@@ -49,3 +49,42 @@ async def test_organization_stats(coolorg, alice_backend_sock, administration_ba
 async def test_stats_unknown_organization(administration_backend_sock):
     rep = await organization_stats(administration_backend_sock, organization_id="dummy")
     assert rep == {"status": "not_found"}
+
+
+@pytest.mark.trio
+@pytest.mark.postgresql
+async def test_organization_stats_counters_match_data(
+    coolorg, backend, alice, alice_backend_sock, administration_backend_sock, realm
+):
+    vlob_id = uuid4()
+    await vlob_create(alice_backend_sock, realm_id=realm, vlob_id=vlob_id, blob=b"1234")
+    await vlob_update(alice_backend_sock, vlob_id=vlob_id, version=2, blob=b"123456")
+    await block_create(alice_backend_sock, realm_id=realm, block_id=uuid4(), block=b"1234")
+    await backend.organization.create(OrganizationID("EmptyOrg"), bootstrap_token="123")
+
+    # Stats are maintained incrementally, so they must match a full recount
+    async with backend.organization.dbh.pool.acquire() as conn:
+        rows = await conn.fetch(
+            """
+SELECT
+    organization_id,
+    (SELECT COUNT(*) FROM user_ WHERE user_.organization = organization._id) users,
+    (
+        SELECT COALESCE(SUM(size), 0)
+        FROM vlob_atom
+        WHERE vlob_atom.organization = organization._id
+    ) metadata_size,
+    (
+        SELECT COALESCE(SUM(size), 0)
+        FROM block
+        WHERE block.organization = organization._id
+    ) data_size
+FROM organization
+"""
+        )
+    assert {row["organization_id"] for row in rows} >= {coolorg.organization_id, "EmptyOrg"}
+    for row in rows:
+        stats = await backend.organization.stats(OrganizationID(row["organization_id"]))
+        assert stats.users == row["users"]
+        assert stats.metadata_size == row["metadata_size"]
+        assert stats.data_size == row["data_size"]
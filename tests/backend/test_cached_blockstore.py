@@ -0,0 +1,117 @@
+# Parsec Cloud (https://parsec.cloud) Copyright (c) AGPLv3 2019 Scille SAS
+
+import pytest
+import logging
+from uuid import uuid4, UUID
+from pendulum import Pendulum
+
+from parsec.backend.block import BlockNotFoundError
+from parsec.backend.cached_blockstore import CachedBlockStoreComponent
+from parsec.backend.memory import MemoryBlockStoreComponent
+
+from tests.backend.common import block_create, block_read
+
+
+@pytest.mark.trio
+async def test_cached_blockstore():
+    blockstore = MemoryBlockStoreComponent()
+    cached = CachedBlockStoreComponent(blockstore, max_size=10)
+    block_id_1, block_id_2, block_id_3 = uuid4(), uuid4(), uuid4()
+    await blockstore.create("org42", block_id_1, b"1111")
+    await blockstore.create("org42", block_id_2, b"2222")
+    await blockstore.create("org42", block_id_3, b"3333")
+
+    with pytest.raises(BlockNotFoundError):
+        await cached.read("org42", uuid4())
+    assert await cached.read("org42", block_id_1) == b"1111"
+    assert await cached.read("org42", block_id_1) == b"1111"
+    assert (cached.hits, cached.misses, cached.size) == (1, 2, 4)
+    # Cache is per-organization
+    with pytest.raises(BlockNotFoundError):
+        await cached.read("org43", block_id_1)
+
+    # Least recently used block is evicted once max size is reached
+    assert await cached.read("org42", block_id_2) == b"2222"
+    assert await cached.read("org42", block_id_1) == b"1111"
+    assert await cached.read("org42", block_id_3) == b"3333"
+    assert (cached.size, cached.evictions) == (8, 1)
+    assert await cached.read("org42", block_id_1) == b"1111"
+    assert await cached.read("org42", block_id_2) == b"2222"
+    assert (cached.hits, cached.misses) == (3, 6)
+    assert cached.hit_ratio == 3 / 9
+
+    # Newly created blocks are only cached once read, blocks too big are never cached
+    new_block_id, big_block_id = uuid4(), uuid4()
+    await cached.create("org42", new_block_id, b"new")
+    await cached.create("org42", big_block_id, b"too big to be cached")
+    assert await blockstore.read("org42", new_block_id) == b"new"
+    assert await cached.read("org42", new_block_id) == b"new"
+    assert await cached.read("org42", new_block_id) == b"new"
+    assert await cached.read("org42", big_block_id) == b"too big to be cached"
+    assert (cached.hits, cached.misses) == (4, 8)
+    assert cached.size <= 10
+
+
+@pytest.mark.trio
+async def test_cached_blockstore_rejected_create_not_cached():
+    class IdempotentBlockStoreComponent(MemoryBlockStoreComponent):
+        # Like the S3 blockstore, an already existing block is left untouched
+        async def create(self, organization_id, id, block):
+            if (organization_id, id) not in self._blocks:
+                await super().create(organization_id, id, block)
+
+    blockstore = IdempotentBlockStoreComponent()
+    cached = CachedBlockStoreComponent(blockstore, max_size=10)
+    block_id = uuid4()
+    await cached.create("org42", block_id, b"winner")
+    # The losing concurrent create never reaches the block metadata
+    await cached.create("org42", block_id, b"loser")
+    assert cached.size == 0
+    assert await cached.read("org42", block_id) == b"winner"
+    assert await cached.read("org42", block_id) == b"winner"
+
+
+@pytest.mark.trio
+async def test_cached_blockstore_stats_logged(monkeypatch, caplog):
+    caplog.set_level(logging.INFO)
+    monkeypatch.setattr("parsec.backend.cached_blockstore.CACHE_STATS_LOG_INTERVAL", 2)
+    blockstore = MemoryBlockStoreComponent()
+    cached = CachedBlockStoreComponent(blockstore, max_size=10)
+    block_id = uuid4()
+    await blockstore.create("org42", block_id, b"data")
+
+    await cached.read("org42", block_id)
+    assert not any("Blockstore cache stats" in str(r.msg) for r in caplog.records)
+    await cached.read("org42", block_id)
+    assert cached.stats() == {
+        "hits": 1,
+        "misses": 1,
+        "hit_ratio": 0.5,
+        "evictions": 0,
+        "size": 4,
+        "max_size": 10,
+    }
+    caplog.assert_occured("Blockstore cache stats")
+
+
+@pytest.mark.trio
+async def test_cached_blockstore_still_checks_access(
+    backend_factory, backend_sock_factory, realm_factory, alice, bob
+):
+    block_id = uuid4()
+    async with backend_factory(config={"blockstore_cache_size": 1024}) as backend:
+        assert isinstance(backend.blockstore, CachedBlockStoreComponent)
+        realm_id = UUID("A0000000000000000000000000000000")
+        await realm_factory(backend, alice, realm_id, Pendulum(2000, 1, 2))
+
+        async with backend_sock_factory(backend, alice) as alice_sock:
+            await block_create(alice_sock, block_id, realm_id, b"data")
+            for _ in range(2):
+                rep = await block_read(alice_sock, block_id)
+                assert rep == {"status": "ok", "block": b"data"}
+
+        async with backend_sock_factory(backend, bob) as bob_sock:
+            rep = await block_read(bob_sock, block_id)
+            assert rep == {"status": "not_allowed"}
+
+        assert backend.blockstore.hits == 1
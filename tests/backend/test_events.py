@@ -2,9 +2,12 @@
 
 import pytest
 import trio
+import time
+from uuid import uuid4
+from structlog import get_logger
 
 from tests.backend.common import events_subscribe, events_listen, events_listen_nowait, ping
-from parsec.api.protocol import APIEvent
+from parsec.api.protocol import APIEvent, OrganizationID, DeviceID, RealmRole
 from parsec.backend.backend_events import BackendEvent
 
 
@@ -86,4 +89,168 @@ async def test_cross_backend_event(backend_factory, backend_sock_factory, alice,
             assert rep == {"status": "no_events"}
 
 
+@pytest.mark.trio
+async def test_events_unsubscribed_on_disconnect(backend, backend_sock_factory, alice, realm):
+    async with backend_sock_factory(backend, alice) as alice_sock:
+        await events_subscribe(alice_sock)
+        assert backend.events._organization_subscribers.keys() == {alice.organization_id}
+        assert (alice.organization_id, realm) in backend.events._realm_subscribers
+
+    assert not backend.events._organization_subscribers
+    assert not backend.events._user_subscribers
+    assert not backend.events._realm_subscribers
+
+
+class SimulatedListener:
+    """
+    Stand-in for an authenticated client context subscribed to the events.
+    """
+
+    def __init__(self, organization_id, device_id):
+        self.organization_id = organization_id
+        self.device_id = device_id
+        self.user_id = device_id.user_id
+        self.realms = set()
+        self.logger = get_logger()
+        self.send_events_channel, self.receive_events_channel = trio.open_memory_channel(100)
+
+    def received_events(self):
+        events = []
+        while True:
+            try:
+                events.append(self.receive_events_channel.receive_nowait())
+            except trio.WouldBlock:
+                return events
+
+
+async def _simulate_listeners(backend, nb_organizations, nb_listeners_per_organization):
+    listeners = []
+    for org_index in range(nb_organizations):
+        organization_id = OrganizationID(f"Org{org_index}")
+        for user_index in range(nb_listeners_per_organization):
+            listener = SimulatedListener(organization_id, DeviceID(f"user{user_index}@dev1"))
+            await backend.events.api_events_subscribe(listener, {"cmd": "events_subscribe"})
+            # Each user has a realm of its own
+            realm_id = uuid4()
+            backend.event_bus.send(
+                BackendEvent.REALM_ROLES_UPDATED,
+                organization_id=organization_id,
+                author=listener.device_id,
+                realm_id=realm_id,
+                user=listener.user_id,
+                role=RealmRole.OWNER,
+            )
+            assert listener.received_events() == [
+                {
+                    "event": APIEvent.REALM_ROLES_UPDATED,
+                    "realm_id": realm_id,
+                    "role": RealmRole.OWNER,
+                }
+            ]
+            listeners.append((listener, realm_id))
+    return listeners
+
+
+def _send_vlobs_updated(backend, listener, realm_id, checkpoint):
+    backend.event_bus.send(
+        BackendEvent.REALM_VLOBS_UPDATED,
+        organization_id=listener.organization_id,
+        author=DeviceID("someone@else"),
+        realm_id=realm_id,
+        checkpoint=checkpoint,
+        src_id=realm_id,
+        src_version=1,
+    )
+
+
+@pytest.mark.trio
+async def test_events_routed_to_subscribers_only(backend):
+    listeners = await _simulate_listeners(
+        backend, nb_organizations=10, nb_listeners_per_organization=200
+    )
+
+    for checkpoint, (listener, realm_id) in enumerate(listeners):
+        _send_vlobs_updated(backend, listener, realm_id, checkpoint)
+
+    for checkpoint, (listener, realm_id) in enumerate(listeners):
+        assert listener.received_events() == [
+            {
+                "event": APIEvent.REALM_VLOBS_UPDATED,
+                "realm_id": realm_id,
+                "checkpoint": checkpoint,
+                "src_id": realm_id,
+                "src_version": 1,
+            }
+        ]
+
+    # Losing access to the realm stops the routing of its events
+    listener, realm_id = listeners[0]
+    backend.event_bus.send(
+        BackendEvent.REALM_ROLES_UPDATED,
+        organization_id=listener.organization_id,
+        author=DeviceID("someone@else"),
+        realm_id=realm_id,
+        user=listener.user_id,
+        role=None,
+    )
+    assert listener.received_events() == [
+        {"event": APIEvent.REALM_ROLES_UPDATED, "realm_id": realm_id, "role": None}
+    ]
+    _send_vlobs_updated(backend, listener, realm_id, 42)
+    assert listener.received_events() == []
+
+    # Pings are routed to the whole organization
+    backend.event_bus.send(
+        BackendEvent.PINGED,
+        organization_id=listener.organization_id,
+        author=listener.device_id,
+        ping="foo",
+    )
+    for other_listener, _ in listeners:
+        received = other_listener.received_events()
+        if other_listener.organization_id != listener.organization_id or other_listener is listener:
+            assert received == []
+        else:
+            assert received == [{"event": APIEvent.PINGED, "ping": "foo"}]
+
+    for listener, _ in listeners:
+        backend.events.unsubscribe(listener)
+    assert not backend.events._organization_subscribers
+    assert not backend.events._user_subscribers
+    assert not backend.events._realm_subscribers
+
+
+@pytest.mark.trio
+async def test_events_callbacks_disconnected_on_teardown(backend_factory, event_bus_factory):
+    event_bus = event_bus_factory()
+    for _ in range(2):
+        async with backend_factory(populated=False, event_bus=event_bus):
+            assert len(event_bus._event_handlers[BackendEvent.PINGED]) == 1
+    assert not event_bus._event_handlers[BackendEvent.PINGED]
+    assert not event_bus._event_handlers[BackendEvent.REALM_VLOBS_UPDATED]
+
+
+@pytest.mark.slow
+@pytest.mark.trio
+@pytest.mark.parametrize("nb_listeners", [1000, 10000])
+async def test_bench_events_dispatch(backend, nb_listeners):
+    listeners = await _simulate_listeners(
+        backend, nb_organizations=10, nb_listeners_per_organization=nb_listeners // 10
+    )
+
+    nb_events = 10000
+    before = time.monotonic()
+    for checkpoint in range(nb_events):
+        listener, realm_id = listeners[checkpoint % len(listeners)]
+        _send_vlobs_updated(backend, listener, realm_id, checkpoint)
+        # Only the listener of the realm should have been notified
+        assert len(listener.received_events()) == 1
+    elapsed = time.monotonic() - before
+
+    print(
+        f"{nb_events} events dispatched to {nb_listeners} listeners in {elapsed:.3f}s "
+        f"({nb_events / elapsed:.0f} events/s)"
+    )
+
+
 # TODO: test message.received and beacon.updated events
@@ -1,6 +1,7 @@
 # Parsec Cloud (https://parsec.cloud) Copyright (c) AGPLv3 2019 Scille SAS
 
 import pytest
+import trio
 from uuid import uuid4
 
 from parsec.api.protocol import packb, unpackb, OrganizationID
@@ -13,6 +14,8 @@ from parsec.api.protocol import (
     HandshakeRVKMismatch,
     HandshakeBadIdentity,
     HandshakeOrganizationExpired,
+    pack_multiplexed_message,
+    unpack_multiplexed_message,
 )
 
 
@@ -81,6 +84,105 @@ async def test_authenticated_handshake_good(backend, server_factory, alice):
         assert ch.backend_api_version == API_VERSION
 
 
+@pytest.mark.trio
+async def test_authenticated_handshake_multiplexing(backend, server_factory, alice):
+    ch = AuthenticatedClientHandshake(
+        organization_id=alice.organization_id,
+        device_id=alice.device_id,
+        user_signkey=alice.signing_key,
+        root_verify_key=alice.root_verify_key,
+        multiplexing=True,
+    )
+
+    async with server_factory(backend.handle_client) as server:
+        stream = server.connection_factory()
+        transport = await Transport.init_for_client(stream, server.addr.hostname)
+
+        challenge_req = await transport.recv()
+        answer_req = ch.process_challenge_req(challenge_req)
+
+        await transport.send(answer_req)
+        result_req = await transport.recv()
+        ch.process_result_req(result_req)
+        assert ch.multiplexing
+
+        # Long request doesn't prevent other requests from being processed
+        await transport.send(
+            pack_multiplexed_message(1, packb({"cmd": "events_listen", "wait": True}))
+        )
+        await transport.send(pack_multiplexed_message(2, packb({"cmd": "ping", "ping": "foo"})))
+        req_id, raw_rep = unpack_multiplexed_message(await transport.recv())
+        assert req_id == 2
+        assert unpackb(raw_rep) == {"status": "ok", "pong": "foo"}
+
+        # Empty request cancels the long request, hence no reply is sent for it
+        await transport.send(pack_multiplexed_message(1, b""))
+        await transport.send(pack_multiplexed_message(3, packb({"cmd": "ping", "ping": "bar"})))
+        req_id, raw_rep = unpack_multiplexed_message(await transport.recv())
+        assert req_id == 3
+        assert unpackb(raw_rep) == {"status": "ok", "pong": "bar"}
+
+
+@pytest.mark.trio
+async def test_multiplexing_cancel_frees_limiter(monkeypatch, backend, server_factory, alice):
+    monkeypatch.setattr("parsec.backend.app.MAX_CONCURRENT_MULTIPLEXED_REQUESTS", 2)
+    ch = AuthenticatedClientHandshake(
+        organization_id=alice.organization_id,
+        device_id=alice.device_id,
+        user_signkey=alice.signing_key,
+        root_verify_key=alice.root_verify_key,
+        multiplexing=True,
+    )
+
+    async with server_factory(backend.handle_client) as server:
+        stream = server.connection_factory()
+        transport = await Transport.init_for_client(stream, server.addr.hostname)
+        await transport.send(ch.process_challenge_req(await transport.recv()))
+        ch.process_result_req(await transport.recv())
+
+        # Long requests use all the processing slots
+        for req_id in (1, 2):
+            await transport.send(
+                pack_multiplexed_message(req_id, packb({"cmd": "events_listen", "wait": True}))
+            )
+        await transport.send(pack_multiplexed_message(3, packb({"cmd": "ping", "ping": "foo"})))
+
+        # The cancellation is received while the ping waits for a slot
+        await transport.send(pack_multiplexed_message(1, b""))
+        with trio.fail_after(1):
+            req_id, raw_rep = unpack_multiplexed_message(await transport.recv())
+        assert req_id == 3
+        assert unpackb(raw_rep) == {"status": "ok", "pong": "foo"}
+
+
+@pytest.mark.trio
+async def test_authenticated_handshake_multiplexing_not_requested(backend, server_factory, alice):
+    ch = AuthenticatedClientHandshake(
+        organization_id=alice.organization_id,
+        device_id=alice.device_id,
+        user_signkey=alice.signing_key,
+        root_verify_key=alice.root_verify_key,
+    )
+
+    async with server_factory(backend.handle_client) as server:
+        stream = server.connection_factory()
+        transport = await Transport.init_for_client(stream, server.addr.hostname)
+
+        challenge_req = await transport.recv()
+        answer_req = ch.process_challenge_req(challenge_req)
+        assert "multiplexing" not in unpackb(answer_req)
+
+        await transport.send(answer_req)
+        result_req = await transport.recv()
+        assert "multiplexing" not in unpackb(result_req)
+        ch.process_result_req(result_req)
+        assert not ch.multiplexing
+
+        # Plain messages are still used
+        await transport.send(packb({"cmd": "ping", "ping": "foo"}))
+        assert unpackb(await transport.recv()) == {"status": "ok", "pong": "foo"}
+
+
 @pytest.mark.trio
 async def test_authenticated_handshake_bad_rvk(backend, server_factory, alice, otherorg):
     ch = AuthenticatedClientHandshake(
@@ -0,0 +1,118 @@
+# Parsec Cloud (https://parsec.cloud) Copyright (c) AGPLv3 2019 Scille SAS
+
+import ast
+import trio
+import time
+import pytest
+import inspect
+from uuid import uuid4
+from pypika import Parameter
+from pendulum import now as pendulum_now
+
+from parsec.backend.postgresql import vlob as pg_vlob, block as pg_block
+from parsec.backend.postgresql.queries import Q
+from parsec.backend.postgresql.tables import q_device, q_vlob_encryption_revision_internal_id
+
+
+def _per_call_q_vlob_read(organization_id, realm_id, encryption_revision, vlob_id):
+    # Baseline: how the vlob read query used to be built on each request
+    query = """
+SELECT
+    version,
+    blob,
+    ({}) as author,
+    created_on
+FROM vlob_atom
+WHERE
+    vlob_encryption_revision = ({})
+    AND vlob_id = $4
+ORDER BY version DESC
+LIMIT 1
+""".format(
+        q_device(_id=Parameter("author")).select("device_id"),
+        q_vlob_encryption_revision_internal_id(
+            organization_id=Parameter("$1"),
+            realm_id=Parameter("$2"),
+            encryption_revision=Parameter("$3"),
+        ),
+    )
+    return [query, organization_id, realm_id, encryption_revision, vlob_id]
+
+
+@pytest.mark.parametrize("module", [pg_vlob, pg_block], ids=["vlob", "block"])
+def test_queries_are_built_at_import_time(module):
+    module_queries = {name for name, value in vars(module).items() if isinstance(value, Q)}
+    tree = ast.parse(inspect.getsource(module))
+    requests_count = 0
+    for node in ast.walk(tree):
+        if not isinstance(node, ast.Call) or not isinstance(node.func, ast.Attribute):
+            continue
+        if node.func.attr not in ("fetch", "fetchrow", "fetchval", "execute"):
+            continue
+        # Each request must be of the form `conn.fetch(*_q_xxx(...))` with
+        # `_q_xxx` a query defined once at module level
+        requests_count += 1
+        assert len(node.args) == 1 and not node.keywords, ast.dump(node)
+        assert isinstance(node.args[0], ast.Starred), ast.dump(node)
+        query_call = node.args[0].value
+        assert isinstance(query_call, ast.Call), ast.dump(node)
+        assert query_call.func.id in module_queries, ast.dump(node)
+    assert requests_count
+
+
+@pytest.mark.trio
+@pytest.mark.postgresql
+async def test_no_query_built_per_request(monkeypatch, backend, alice, realm, vlobs):
+    def _query_built(*args, **kwargs):
+        raise AssertionError("Query built while handling a request")
+
+    monkeypatch.setattr(Q, "__init__", _query_built)
+
+    await backend.vlob.read(alice.organization_id, alice.device_id, 1, vlobs[0])
+    await backend.vlob.read(alice.organization_id, alice.device_id, 1, vlobs[0], version=1)
+    await backend.vlob.read(
+        alice.organization_id, alice.device_id, 1, vlobs[0], timestamp=pendulum_now()
+    )
+    await backend.vlob.poll_changes(alice.organization_id, alice.device_id, realm, 0)
+    await backend.vlob.list_versions(alice.organization_id, alice.device_id, vlobs[0])
+    await backend.vlob.create(
+        alice.organization_id, alice.device_id, realm, 1, uuid4(), pendulum_now(), b"data"
+    )
+
+
+@pytest.mark.slow
+def test_bench_vlob_read_query_building():
+    kwargs = {
+        "organization_id": "Org",
+        "realm_id": uuid4(),
+        "encryption_revision": 1,
+        "vlob_id": uuid4(),
+    }
+    calls_count = 1000
+    timings = {}
+    for name, q in [("per call", _per_call_q_vlob_read), ("import time", pg_vlob._q_vlob_read)]:
+        start = time.perf_counter()
+        for _ in range(calls_count):
+            q(**kwargs)
+        timings[name] = time.perf_counter() - start
+        print(f"{calls_count} vlob read queries built {name} in {timings[name] * 1000:.1f}ms")
+    assert timings["import time"] < timings["per call"]
+
+
+@pytest.mark.slow
+@pytest.mark.trio
+@pytest.mark.postgresql
+async def test_bench_vlob_read(monkeypatch, backend, alice, vlobs):
+    async def _bench(name):
+        reads_count = 1000
+        start = trio.current_time()
+        for _ in range(reads_count):
+            await backend.vlob.read(alice.organization_id, alice.device_id, 1, vlobs[0])
+        elapsed = trio.current_time() - start
+        print(
+            f"{reads_count} vlob reads ({name}) in {elapsed:.2f}s ({reads_count / elapsed:.0f} reads/s)"
+        )
+
+    await _bench("queries built at import time")
+    monkeypatch.setattr(pg_vlob, "_q_vlob_read", _per_call_q_vlob_read)
+    await _bench("queries built per call")
@@ -1,5 +1,9 @@
 # Parsec Cloud (https://parsec.cloud) Copyright (c) AGPLv3 2019 Scille SAS
 
+import trio
+import boto3
+import threading
+from uuid import uuid4
 from unittest.mock import Mock
 from unittest import mock
 
@@ -10,7 +14,7 @@ from botocore.exceptions import (
 import pytest
 
 from parsec.backend.s3_blockstore import S3BlockStoreComponent
-from parsec.backend.block import BlockAlreadyExistsError, BlockNotFoundError, BlockTimeoutError
+from parsec.backend.block import BlockNotFoundError, BlockTimeoutError
 
 
 @pytest.mark.trio
@@ -57,10 +61,9 @@ async def test_s3_create():
             Bucket="parsec", Key="org42/123", Body="content"
         )
         client_mock().put_object.reset_mock()
-        # Already exist
+        # Already exist is idempotent, and doesn't modify the block
         client_mock().head_object.side_effect = None
-        with pytest.raises(BlockAlreadyExistsError):
-            await blockstore.create("org42", 123, "content")
+        await blockstore.create("org42", 123, "other content")
         client_mock().put_object.assert_not_called()
         # Connection error at HEAD
         client_mock().head_object.side_effect = S3EndpointConnectionError(endpoint_url="url")
@@ -73,6 +76,7 @@ async def test_s3_create():
         )
         with pytest.raises(BlockTimeoutError):
             await blockstore.create("org42", 123, "content")
+        client_mock().put_object.assert_not_called()
         # Connection error at PUT
         client_mock().head_object.side_effect = S3ClientError(
             error_response={"Error": {"Code": "404"}}, operation_name="HEAD"
@@ -86,3 +90,75 @@ async def test_s3_create():
         )
         with pytest.raises(BlockTimeoutError):
             await blockstore.create("org42", 123, "content")
+
+
+@pytest.mark.trio
+async def test_s3_read_doesnt_block_event_loop():
+    with mock.patch("boto3.client") as client_mock:
+        client_mock.return_value = Mock()
+        blockstore = S3BlockStoreComponent(
+            "europe", "parsec", "john", "secret", s3_max_concurrency=2
+        )
+        release_reads = threading.Event()
+        reads_in_progress = 0
+        max_reads_in_progress = 0
+        lock = threading.Lock()
+
+        def _slow_read():
+            nonlocal reads_in_progress, max_reads_in_progress
+            with lock:
+                reads_in_progress += 1
+                max_reads_in_progress = max(max_reads_in_progress, reads_in_progress)
+            release_reads.wait()
+            with lock:
+                reads_in_progress -= 1
+            return b"content"
+
+        response_mock = Mock()
+        response_mock.read.side_effect = _slow_read
+        client_mock().get_object.return_value = {"Body": response_mock}
+
+        results = []
+
+        async def _read():
+            results.append(await blockstore.read("org42", 123))
+
+        async with trio.open_nursery() as nursery:
+            for _ in range(4):
+                nursery.start_soon(_read)
+            # Event loop is still responsive while the reads are stuck
+            with trio.fail_after(1):
+                while reads_in_progress < 2:
+                    await trio.sleep(0.01)
+            release_reads.set()
+
+        assert results == [b"content"] * 4
+        # Concurrency is bounded
+        assert max_reads_in_progress == 2
+
+
+@pytest.mark.trio
+async def test_s3_against_local_server():
+    moto = pytest.importorskip("moto")
+
+    with moto.mock_s3():
+        boto3.client(
+            "s3", region_name="us-east-1", aws_access_key_id="john", aws_secret_access_key="secret"
+        ).create_bucket(Bucket="parsec")
+        blockstore = S3BlockStoreComponent("us-east-1", "parsec", "john", "secret")
+
+        with pytest.raises(BlockNotFoundError):
+            await blockstore.read("org42", uuid4())
+
+        block_ids = [uuid4() for _ in range(10)]
+        async with trio.open_nursery() as nursery:
+            for i, block_id in enumerate(block_ids):
+                nursery.start_soon(blockstore.create, "org42", block_id, f"content {i}".encode())
+
+        # Create is idempotent and doesn't change the stored data
+        await blockstore.create("org42", block_ids[0], b"other content")
+
+        for i, block_id in enumerate(block_ids):
+            assert await blockstore.read("org42", block_id) == f"content {i}".encode()
+        with pytest.raises(BlockNotFoundError):
+            await blockstore.read("org43", block_ids[0])
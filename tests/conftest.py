@@ -384,15 +384,18 @@ def persistent_mockup(monkeypatch):
         storage_set.add(storage)
         return mockup_context.get(storage.path)
 
+    async def _create_read_connection(storage):
+        # In-memory databases cannot be shared, so readers use the same connection
+        return mockup_context.get(storage.path)
+
     async def _close(storage):
         # Idempotent operation
         storage_set.discard(storage)
         storage._conn = None
+        storage._readers.clear()
 
     @asynccontextmanager
     async def thread_pool_runner(max_workers):
-        assert max_workers == 1
-
         async def run_in_thread(fn, *args):
             return fn(*args)
 
@@ -400,6 +403,7 @@ def persistent_mockup(monkeypatch):
 
     monkeypatch.setattr(local_database, "thread_pool_runner", thread_pool_runner)
     monkeypatch.setattr(LocalDatabase, "_create_connection", _create_connection)
+    monkeypatch.setattr(LocalDatabase, "_create_read_connection", _create_read_connection)
     monkeypatch.setattr(LocalDatabase, "_close", _close)
 
     yield mockup_context
@@ -4,7 +4,9 @@ import pytest
 import trio
 
 from parsec.backend.backend_events import BackendEvent
-from parsec.api.protocol import RealmRole
+from parsec.api.protocol import RealmRole, HandshakeType
+from parsec.api.transport import TransportError
+from parsec.core.backend_connection import authenticated, cmds
 from parsec.core.backend_connection import (
     BackendAuthenticatedConn,
     BackendConnStatus,
@@ -207,6 +209,150 @@ async def test_concurrency_sends(running_backend, alice, event_bus):
             await work_all_done.wait()
 
 
+@pytest.mark.trio
+async def test_multiplexed_concurrency_sends(monkeypatch, running_backend, alice, event_bus):
+    CONCURRENCY = 10
+    connections = []
+    vanilla_connect_as_authenticated = authenticated.connect_as_authenticated
+
+    async def _connect_as_authenticated(*args, **kwargs):
+        transport = await vanilla_connect_as_authenticated(*args, **kwargs)
+        connections.append(transport)
+        return transport
+
+    monkeypatch.setattr(authenticated, "connect_as_authenticated", _connect_as_authenticated)
+
+    async def sender(cmds, x):
+        rep = await cmds.ping(x)
+        assert rep == {"status": "ok", "pong": x}
+
+    conn = BackendAuthenticatedConn(
+        alice.organization_addr,
+        alice.device_id,
+        alice.signing_key,
+        event_bus,
+        max_pool=CONCURRENCY // 2,
+        multiplexing=True,
+    )
+    with event_bus.listen() as spy:
+        async with conn.run():
+            await spy.wait_with_timeout(
+                CoreEvent.BACKEND_CONNECTION_CHANGED,
+                {"status": BackendConnStatus.READY, "status_exc": None},
+            )
+
+            with trio.fail_after(1):
+                async with trio.open_service_nursery() as nursery:
+                    for x in range(CONCURRENCY):
+                        nursery.start_soon(sender, conn.cmds, str(x))
+
+            # Events are still received while other commands are sent
+            running_backend.backend.event_bus.send(
+                BackendEvent.PINGED,
+                organization_id=alice.organization_id,
+                author="bob@test",
+                ping="foo",
+            )
+            await spy.wait_with_timeout(CoreEvent.BACKEND_PINGED, {"ping": "foo"})
+
+    # Event listener and commands all share the same connection
+    assert len(connections) == 1
+    assert connections[0].multiplexed
+
+
+@pytest.mark.trio
+async def test_multiplexed_force_fresh_only_reconnects_closed_connection(
+    monkeypatch, running_backend, alice, event_bus
+):
+    connections = []
+    vanilla_connect_as_authenticated = authenticated.connect_as_authenticated
+
+    async def _connect_as_authenticated(*args, **kwargs):
+        transport = await vanilla_connect_as_authenticated(*args, **kwargs)
+        connections.append(transport)
+        return transport
+
+    monkeypatch.setattr(authenticated, "connect_as_authenticated", _connect_as_authenticated)
+
+    conn = BackendAuthenticatedConn(
+        alice.organization_addr, alice.device_id, alice.signing_key, event_bus, multiplexing=True
+    )
+    with event_bus.listen() as spy:
+        async with conn.run():
+            await spy.wait_with_timeout(
+                CoreEvent.BACKEND_CONNECTION_CHANGED,
+                {"status": BackendConnStatus.READY, "status_exc": None},
+            )
+
+            # A fresh channel on the shared connection while it is alive
+            async with conn._acquire_transport(force_fresh=True) as transport:
+                await cmds.ping(transport, "foo")
+            assert len(connections) == 1
+
+            # A new connection once the shared one is closed
+            async def _connection_lost(*args, **kwargs):
+                raise TransportError("Connection lost")
+
+            connections[0].send = _connection_lost
+            with pytest.raises(BackendNotAvailable):
+                async with conn._acquire_transport(
+                    force_fresh=True, allow_not_available=True
+                ) as transport:
+                    await cmds.ping(transport, "foo")
+            async with conn._acquire_transport(force_fresh=True, ignore_status=True) as transport:
+                rep = await cmds.ping(transport, "foo")
+            assert rep == {"status": "ok", "pong": "foo"}
+            assert len(connections) >= 2
+
+
+@pytest.mark.trio
+async def test_multiplexed_commands_not_bounded_by_max_pool(running_backend, alice, event_bus):
+    CONCURRENCY = 10
+    in_flight = 0
+    all_in_flight = trio.Event()
+
+    # Backend only replies once all the commands are being processed
+    api_cmds = running_backend.backend.apis[HandshakeType.AUTHENTICATED]
+    vanilla_ping = api_cmds["ping"]
+
+    async def _ping(client_ctx, msg):
+        nonlocal in_flight
+        in_flight += 1
+        if in_flight == CONCURRENCY:
+            all_in_flight.set()
+        await all_in_flight.wait()
+        return await vanilla_ping(client_ctx, msg)
+
+    api_cmds["ping"] = _ping
+
+    async def sender(cmds, x):
+        rep = await cmds.ping(x)
+        assert rep == {"status": "ok", "pong": x}
+
+    conn = BackendAuthenticatedConn(
+        alice.organization_addr,
+        alice.device_id,
+        alice.signing_key,
+        event_bus,
+        max_pool=4,
+        multiplexing=True,
+    )
+    try:
+        with event_bus.listen() as spy:
+            async with conn.run():
+                await spy.wait_with_timeout(
+                    CoreEvent.BACKEND_CONNECTION_CHANGED,
+                    {"status": BackendConnStatus.READY, "status_exc": None},
+                )
+
+                with trio.fail_after(1):
+                    async with trio.open_service_nursery() as nursery:
+                        for x in range(CONCURRENCY):
+                            nursery.start_soon(sender, conn.cmds, str(x))
+    finally:
+        api_cmds["ping"] = vanilla_ping
+
+
 @pytest.mark.trio
 async def test_realm_notif_on_new_entry_sync(running_backend, alice_backend_conn, alice2_user_fs):
     wid = await alice2_user_fs.workspace_create("foo")
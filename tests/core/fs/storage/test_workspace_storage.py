@@ -1,20 +1,26 @@
 # Parsec Cloud (https://parsec.cloud) Copyright (c) AGPLv3 2019 Scille SAS
 
+import threading
 from pathlib import Path
 
 import pytest
+import trio
 from pendulum import now
 
-from parsec.core.fs.storage import WorkspaceStorage
+from parsec.api.data import DataError
+from parsec.core.fs.storage import WorkspaceStorage, LocalDatabase, ManifestStorage
+from parsec.core.fs.storage.manifest_storage import estimate_manifest_size
 from parsec.core.fs import FSError, FSInvalidFileDescriptor
 from parsec.core.fs.exceptions import FSLocalMissError
 from parsec.core.types import (
     DEFAULT_BLOCK_SIZE,
+    LocalManifest,
     LocalUserManifest,
     LocalWorkspaceManifest,
     LocalFolderManifest,
     LocalFileManifest,
     EntryID,
+    BlockID,
     Chunk,
 )
 
@@ -280,6 +286,22 @@ async def test_realm_checkpoint(alice_workspace_storage):
     assert await aws.get_need_sync_entries() == (set(), set([manifest.id]))
 
 
+@pytest.mark.trio
+async def test_need_sync_entries_use_indexes(alice_workspace_storage):
+    aws = alice_workspace_storage
+    async with aws.data_localdb.open_read_cursor() as cursor:
+        for query, index in [
+            ("SELECT vlob_id FROM vlobs WHERE need_sync = 1", "vlobs_need_sync"),
+            (
+                "SELECT vlob_id FROM vlobs WHERE base_version != remote_version",
+                "vlobs_remote_changes",
+            ),
+        ]:
+            await cursor.execute(f"EXPLAIN QUERY PLAN {query}")
+            (plan,) = await cursor.fetchall()
+            assert f"USING INDEX {index}" in plan[-1]
+
+
 @pytest.mark.trio
 async def test_lock_manifest(tmpdir, alice, workspace_id):
     manifest = create_manifest(alice, LocalFileManifest)
@@ -431,6 +453,292 @@ async def test_internal_connections(tmpdir, alice, workspace_id):
     await aws.cache_localdb._close()
 
 
+@pytest.mark.trio
+async def test_queries_run_in_worker_thread(tmpdir, alice, workspace_id):
+    async with WorkspaceStorage.run(alice, tmpdir, workspace_id) as aws:
+        aws.data_localdb._conn.create_function("current_thread", 0, threading.get_ident)
+
+        async with aws.data_localdb.open_cursor() as cursor:
+            await cursor.execute("SELECT current_thread()")
+            thread_ident, = await cursor.fetchone()
+
+        assert thread_ident != threading.get_ident()
+
+
+@pytest.mark.trio
+async def test_cancelled_read_releases_reader_once_done(tmpdir):
+    async with LocalDatabase.run(Path(tmpdir) / "db.sqlite") as localdb:
+        async with localdb.open_cursor() as cursor:
+            await cursor.execute("CREATE TABLE foo (bar INTEGER)")
+        async with localdb.open_read_cursor():
+            pass
+        (reader,) = localdb._readers
+        started = threading.Event()
+        release = threading.Event()
+
+        def _slow_function():
+            started.set()
+            release.wait()
+            return 1
+
+        reader.create_function("slow", 0, _slow_function)
+
+        async def _read(task_status=trio.TASK_STATUS_IGNORED):
+            with trio.CancelScope() as cancel_scope:
+                task_status.started(cancel_scope)
+                async with localdb.open_read_cursor() as cursor:
+                    await cursor.execute("SELECT slow()")
+
+        async with trio.open_nursery() as nursery:
+            cancel_scope = await nursery.start(_read)
+            await trio.to_thread.run_sync(started.wait)
+            cancel_scope.cancel()
+
+            # The reader is not given back while the statement is running
+            try:
+                await trio.sleep(0.1)
+                assert not localdb._readers
+            finally:
+                release.set()
+
+        assert localdb._readers == [reader]
+
+
+@pytest.mark.trio
+async def test_concurrent_reads_use_reader_connections(tmpdir, alice, workspace_id):
+    async with WorkspaceStorage.run(alice, tmpdir, workspace_id) as aws:
+        localdb = aws.cache_localdb
+        chunk = Chunk.new(0, 4)
+        await aws.set_clean_block(BlockID(chunk.id), b"abcd")
+
+        # Writer connection is busy: reads are not blocked
+        async with localdb._lock:
+            with trio.fail_after(1):
+                async with trio.open_nursery() as nursery:
+                    for _ in range(2 * localdb._read_pool_size):
+                        nursery.start_soon(aws.is_clean_block, BlockID(chunk.id))
+        assert 0 < len(localdb._readers) <= localdb._read_pool_size
+
+        # Uncommitted chunks are still visible from the read methods
+        chunk2 = Chunk.new(0, 4)
+        await aws.set_chunk(chunk2.id, b"efgh")
+        assert aws.data_localdb._conn.in_transaction
+        assert await aws.get_chunk(chunk2.id) == b"efgh"
+        assert await aws.get_dirty_block(BlockID(chunk2.id)) == b"efgh"
+
+
+@pytest.mark.trio
+async def test_chunk_memory_cache(tmpdir, alice, workspace_id):
+    chunks = [Chunk.new(0, 4) for _ in range(3)]
+    async with WorkspaceStorage.run(alice, tmpdir, workspace_id, memory_cache_size=8) as aws:
+        cache = aws.chunk_memory_cache
+
+        # Dirty chunks and clean blocks are both cached
+        await aws.set_chunk(chunks[0].id, b"abcd")
+        await aws.set_clean_block(BlockID(chunks[1].id), b"efgh")
+        assert await aws.get_chunk(chunks[0].id) == b"abcd"
+        assert await aws.get_chunk(chunks[1].id) == b"efgh"
+        assert (cache.hits, cache.misses) == (0, 2)
+        assert await aws.get_chunk(chunks[0].id) == b"abcd"
+        assert await aws.get_chunk(chunks[1].id) == b"efgh"
+        assert (cache.hits, cache.misses) == (2, 2)
+
+        # Least recently used chunk is evicted
+        await aws.set_chunk(chunks[2].id, b"ijkl")
+        assert await aws.get_chunk(chunks[2].id) == b"ijkl"
+        assert len(cache) == 2
+        assert cache.size == 8
+        assert await aws.get_chunk(chunks[1].id) == b"efgh"
+        assert (cache.hits, cache.misses) == (3, 3)
+
+        # Cache is invalidated on modification
+        await aws.set_chunk(chunks[2].id, b"mnop")
+        assert await aws.get_chunk(chunks[2].id) == b"mnop"
+        await aws.clear_chunk(chunks[2].id)
+        with pytest.raises(FSLocalMissError):
+            await aws.get_chunk(chunks[2].id)
+        await aws.clear_clean_block(BlockID(chunks[1].id))
+        with pytest.raises(FSLocalMissError):
+            await aws.get_chunk(chunks[1].id)
+
+
+@pytest.mark.trio
+async def test_get_missing_manifest_ids(tmpdir, alice, workspace_id, monkeypatch):
+    monkeypatch.setattr(
+        "parsec.core.fs.storage.manifest_storage.MISSING_MANIFEST_IDS_BATCH_SIZE", 2
+    )
+    manifests = [create_manifest(alice) for _ in range(5)]
+    missing_ids = [EntryID() for _ in range(3)]
+    async with WorkspaceStorage.run(alice, tmpdir, workspace_id) as aws:
+        for manifest in manifests:
+            async with aws.lock_entry_id(manifest.id):
+                await aws.set_manifest(manifest.id, manifest)
+        entry_ids = [manifest.id for manifest in manifests] + missing_ids
+        assert await aws.get_missing_manifest_ids(entry_ids) == missing_ids
+
+        # Manifests that are only in the database are found as well
+        await aws.clear_memory_cache()
+        assert await aws.get_missing_manifest_ids(entry_ids) == missing_ids
+        assert aws.manifest_storage.cache_misses == 0
+
+
+@pytest.mark.trio
+async def test_manifest_memory_cache(tmpdir, alice, workspace_id):
+    manifests = [create_manifest(alice, LocalFolderManifest) for _ in range(4)]
+    manifest_size = estimate_manifest_size(manifests[0])
+    async with WorkspaceStorage.run(
+        alice, tmpdir, workspace_id, manifest_cache_size=2 * manifest_size
+    ) as aws:
+        storage = aws.manifest_storage
+
+        # Manifests not yet in the localdb are never evicted
+        for manifest in manifests[:3]:
+            async with aws.lock_entry_id(manifest.id):
+                await aws.set_manifest(manifest.id, manifest, cache_only=True)
+        assert storage.cache_size == 3 * manifest_size
+        assert storage.cache_evictions == 0
+
+        # Flushing make them evictable, least recently used first
+        assert await aws.get_manifest(manifests[0].id) == manifests[0]
+        for manifest in manifests[:3]:
+            async with aws.lock_entry_id(manifest.id):
+                await aws.ensure_manifest_persistent(manifest.id)
+        assert storage.cache_size == 2 * manifest_size
+        assert storage.cache_evictions == 1
+        assert manifests[0].id not in storage._cache
+
+        # Evicted manifests are loaded back from the localdb
+        assert (storage.cache_hits, storage.cache_misses) == (1, 0)
+        assert await aws.get_manifest(manifests[0].id) == manifests[0]
+        assert (storage.cache_hits, storage.cache_misses) == (1, 1)
+        assert manifests[1].id not in storage._cache
+
+        # Modified manifests are pinned again until flushed
+        async with aws.lock_entry_id(manifests[3].id):
+            await aws.set_manifest(manifests[3].id, manifests[3], cache_only=True)
+        assert storage.cache_size == 3 * manifest_size
+        async with aws.lock_entry_id(manifests[0].id):
+            await aws.set_manifest(manifests[0].id, manifests[0])
+        assert manifests[2].id not in storage._cache
+        assert storage.cache_size == 2 * manifest_size
+
+        # Memory stays flat no matter how many manifests are accessed
+        for manifest in manifests:
+            assert await aws.get_manifest(manifest.id) == manifest
+            assert storage.cache_size <= 2 * manifest_size
+
+    async with WorkspaceStorage.run(alice, tmpdir, workspace_id) as aws:
+        for manifest in manifests:
+            assert await aws.get_manifest(manifest.id) == manifest
+
+
+async def _count_folder_deltas(aws):
+    async with aws.data_localdb.open_read_cursor() as cursor:
+        # Not counting the base manifests moved along with the deltas
+        await cursor.execute("SELECT COUNT(*) - COUNT(DISTINCT vlob_id) FROM vlob_deltas")
+        (count,) = await cursor.fetchone()
+        return count
+
+
+@pytest.mark.trio
+async def test_large_folder_with_deltas_not_readable_as_is(
+    tmpdir, alice, workspace_id, monkeypatch
+):
+    monkeypatch.setattr("parsec.core.fs.storage.manifest_storage.FOLDER_DELTA_MIN_CHILDREN", 8)
+    manifest = create_manifest(alice, LocalFolderManifest)
+    manifest = manifest.evolve_children({f"file-{i}.txt": EntryID() for i in range(40)})
+
+    # Simulate a crash: the deltas are not compacted when closing
+    async def _no_compaction(self):
+        pass
+
+    with monkeypatch.context() as m:
+        m.setattr(ManifestStorage, "_compact_folder_deltas", _no_compaction)
+        async with WorkspaceStorage.run(alice, tmpdir, workspace_id) as aws:
+            async with aws.lock_entry_id(manifest.id):
+                await aws.set_manifest(manifest.id, manifest)
+            manifest = manifest.evolve_children_and_mark_updated({"new.txt": EntryID()})
+            async with aws.lock_entry_id(manifest.id):
+                await aws.set_manifest(manifest.id, manifest)
+            assert await _count_folder_deltas(aws) == 1
+
+            # A reader unaware of the deltas cannot load an outdated manifest
+            async with aws.data_localdb.open_read_cursor() as cursor:
+                await cursor.execute(
+                    "SELECT blob, need_sync FROM vlobs WHERE vlob_id = ?", (manifest.id.bytes,)
+                )
+                blob, need_sync = await cursor.fetchone()
+            assert need_sync
+            with pytest.raises(DataError):
+                LocalManifest.decrypt_and_load(blob, key=alice.local_symkey)
+
+    # Deltas are compacted when opening the storage
+    async with WorkspaceStorage.run(alice, tmpdir, workspace_id) as aws:
+        async with aws.data_localdb.open_read_cursor() as cursor:
+            await cursor.execute("SELECT blob FROM vlobs WHERE vlob_id = ?", (manifest.id.bytes,))
+            (blob,) = await cursor.fetchone()
+            await cursor.execute("SELECT COUNT(*) FROM vlob_deltas")
+            assert await cursor.fetchone() == (0,)
+        assert LocalManifest.decrypt_and_load(blob, key=alice.local_symkey) == manifest
+        assert await aws.get_manifest(manifest.id) == manifest
+
+
+@pytest.mark.trio
+async def test_large_folder_persisted_incrementally(tmpdir, alice, workspace_id, monkeypatch):
+    monkeypatch.setattr("parsec.core.fs.storage.manifest_storage.FOLDER_DELTA_MIN_CHILDREN", 8)
+    manifest = create_manifest(alice, LocalFolderManifest)
+    manifest = manifest.evolve_children({f"file-{i}.txt": EntryID() for i in range(40)})
+
+    async with WorkspaceStorage.run(alice, tmpdir, workspace_id) as aws:
+        async with aws.lock_entry_id(manifest.id):
+            await aws.set_manifest(manifest.id, manifest)
+        assert await _count_folder_deltas(aws) == 0
+
+        # Only the changes are written
+        for i in range(5):
+            manifest = manifest.evolve_children_and_mark_updated(
+                {f"new-{i}.txt": EntryID(), f"file-{i}.txt": None}
+            )
+            async with aws.lock_entry_id(manifest.id):
+                await aws.set_manifest(manifest.id, manifest)
+        assert await _count_folder_deltas(aws) == 5
+        assert await aws.get_need_sync_entries() == ({manifest.id}, set())
+
+        # Deltas are applied when loading the manifest
+        await aws.clear_memory_cache()
+        assert await aws.get_manifest(manifest.id) == manifest
+
+        # Deltas are compacted once too big compared to the folder
+        manifest = manifest.evolve_children_and_mark_updated(
+            {f"file-{i}.txt": None for i in range(5, 10)}
+        )
+        async with aws.lock_entry_id(manifest.id):
+            await aws.set_manifest(manifest.id, manifest)
+        assert await _count_folder_deltas(aws) == 0
+
+        manifest = manifest.evolve_children_and_mark_updated({"last.txt": EntryID()})
+        async with aws.lock_entry_id(manifest.id):
+            await aws.set_manifest(manifest.id, manifest)
+        assert await _count_folder_deltas(aws) == 1
+
+    # Deltas are compacted when closing the storage
+    async with WorkspaceStorage.run(alice, tmpdir, workspace_id) as aws:
+        assert await _count_folder_deltas(aws) == 0
+        assert await aws.get_manifest(manifest.id) == manifest
+
+        # Even for a folder that is no longer in the cache
+        manifest = await aws.get_manifest(manifest.id)
+        manifest = manifest.evolve_children_and_mark_updated({"evicted.txt": EntryID()})
+        async with aws.lock_entry_id(manifest.id):
+            await aws.set_manifest(manifest.id, manifest)
+        assert await _count_folder_deltas(aws) == 1
+        await aws.clear_memory_cache()
+
+    async with WorkspaceStorage.run(alice, tmpdir, workspace_id) as aws:
+        assert await _count_folder_deltas(aws) == 0
+        assert await aws.get_manifest(manifest.id) == manifest
+
+
 @pytest.mark.trio
 async def test_vacuum(tmpdir, alice, workspace_id):
     data_size = 1 * 1024 * 1024
@@ -443,6 +751,10 @@ async def test_vacuum(tmpdir, alice, workspace_id):
         data = b"\x00" * data_size
         assert aws.data_localdb.get_disk_usage() < data_size
 
+        # Reader connections don't prevent the disk usage from shrinking
+        await aws.get_need_sync_entries()
+        assert aws.data_localdb._readers
+
         # Set and commit a chunk of 1MB
         await aws.set_chunk(chunk.id, data)
         await aws.data_localdb.commit()
@@ -495,6 +807,60 @@ async def test_garbage_collection(tmpdir, alice, workspace_id):
         assert await aws.block_storage.get_nb_blocks() == 0
 
 
+@pytest.mark.trio
+async def test_garbage_collection_evicts_least_recently_accessed(tmpdir, alice, workspace_id):
+    block_size = DEFAULT_BLOCK_SIZE
+    data = b"\x00" * block_size
+    chunks = [Chunk.new(0, block_size).evolve_as_block(data) for _ in range(4)]
+
+    async with WorkspaceStorage.run(alice, tmpdir, workspace_id, cache_size=3 * block_size) as aws:
+        for chunk in chunks[:3]:
+            await aws.set_clean_block(chunk.access.id, data)
+        assert await aws.block_storage.get_nb_blocks() == 3
+
+        # Reading a block doesn't write to the database
+        await aws.get_chunk(chunks[0].id)
+        assert not aws.cache_localdb._conn.in_transaction
+
+        # The access times are flushed before eviction
+        await aws.set_clean_block(chunks[3].access.id, data)
+        assert await aws.block_storage.get_nb_blocks() == 3
+        assert await aws.is_clean_block(chunks[0].access.id)
+        assert not await aws.is_clean_block(chunks[1].access.id)
+        assert await aws.is_clean_block(chunks[2].access.id)
+        assert await aws.is_clean_block(chunks[3].access.id)
+
+    # Bookkeeping is restored from the database
+    async with WorkspaceStorage.run(alice, tmpdir, workspace_id) as aws:
+        assert await aws.block_storage.get_nb_blocks() == 3
+        total_size = await aws.block_storage.get_total_size()
+        assert total_size > 3 * block_size
+        await aws.clear_clean_block(chunks[2].access.id)
+        assert await aws.block_storage.get_nb_blocks() == 2
+        assert await aws.block_storage.get_total_size() < total_size
+
+
+@pytest.mark.trio
+async def test_garbage_collection_accounts_memory_cache_hits(tmpdir, alice, workspace_id):
+    block_size = DEFAULT_BLOCK_SIZE
+    data = b"\x00" * block_size
+    chunks = [Chunk.new(0, block_size).evolve_as_block(data) for _ in range(4)]
+
+    async with WorkspaceStorage.run(alice, tmpdir, workspace_id, cache_size=3 * block_size) as aws:
+        for chunk in chunks[:3]:
+            await aws.set_clean_block(chunk.access.id, data)
+        for chunk in chunks[:3]:
+            await aws.get_chunk(chunk.id)
+
+        # Served from the memory cache, but still the most recent access
+        await aws.get_chunk(chunks[0].id)
+        assert aws.chunk_memory_cache.hits == 1
+
+        await aws.set_clean_block(chunks[3].access.id, data)
+        assert await aws.is_clean_block(chunks[0].access.id)
+        assert not await aws.is_clean_block(chunks[1].access.id)
+
+
 @pytest.mark.trio
 async def test_storage_file_tree(alice, tmpdir, workspace_id):
     path = Path(tmpdir)
@@ -1,11 +1,13 @@
 # Parsec Cloud (https://parsec.cloud) Copyright (c) AGPLv3 2019 Scille SAS
 
 from parsec.core.core_events import CoreEvent
+import trio
+import trio.testing
 import pytest
 from pendulum import Pendulum
 from unittest.mock import ANY
 
-from parsec.core.types import WorkspaceEntry, WorkspaceRole
+from parsec.core.types import WorkspaceEntry, WorkspaceRole, ChunkID, DEFAULT_BLOCK_SIZE
 from parsec.core.backend_connection import BackendNotAvailable
 from parsec.core.fs.exceptions import FSBackendOfflineError
 
@@ -613,4 +615,170 @@ async def test_sync_data_before_workspace(running_backend, alice_user_fs):
     }
 
 
+@pytest.mark.trio
+async def test_load_blocks_concurrently(running_backend, alice_user_fs, alice2_user_fs):
+    with freeze_time("2000-01-01"):
+        wid = await create_shared_workspace("w", alice_user_fs, alice2_user_fs)
+    workspace = alice_user_fs.get_workspace(wid)
+    workspace2 = alice2_user_fs.get_workspace(wid)
+    await workspace2.path_info("/")
+
+    data = b"".join(bytes([i]) * DEFAULT_BLOCK_SIZE for i in range(6))
+    with freeze_time("2000-01-02"):
+        await workspace.touch("/foo.txt")
+        await workspace.write_bytes("/foo.txt", data)
+    with freeze_time("2000-01-03"):
+        await workspace.sync()
+    with freeze_time("2000-01-04"):
+        await workspace2.sync()
+    foo_id = await workspace2.path_id("/foo.txt")
+    manifest = await workspace2.local_storage.get_manifest(foo_id)
+    accesses = [chunk.access for chunks in manifest.blocks for chunk in chunks]
+    assert len(accesses) == 6
+
+    remote_loader = workspace2.remote_loader
+    vanilla_block_read = remote_loader.backend_cmds.block_read
+    in_flight = 0
+    max_in_flight = 0
+
+    async def mocked_block_read(*args, **kwargs):
+        nonlocal in_flight, max_in_flight
+        in_flight += 1
+        max_in_flight = max(in_flight, max_in_flight)
+        try:
+            await trio.sleep(0.01)
+            return await vanilla_block_read(*args, **kwargs)
+        finally:
+            in_flight -= 1
+
+    remote_loader.backend_cmds.block_read = mocked_block_read
+    try:
+        # Duplicated accesses should only be downloaded once
+        await remote_loader.load_blocks([*accesses, accesses[0]])
+    finally:
+        del remote_loader.backend_cmds.block_read
+
+    assert max_in_flight > 1
+    for access in accesses:
+        assert await workspace2.local_storage.get_chunk(ChunkID(access.id))
+    assert await workspace2.read_bytes("/foo.txt") == data
+
+
+@pytest.mark.trio
+async def test_read_ahead_on_sequential_reads(running_backend, alice_user_fs, alice2_user_fs):
+    with freeze_time("2000-01-01"):
+        wid = await create_shared_workspace("w", alice_user_fs, alice2_user_fs)
+    workspace = alice_user_fs.get_workspace(wid)
+    workspace2 = alice2_user_fs.get_workspace(wid)
+    await workspace2.path_info("/")
+
+    data = b"".join(bytes([i]) * DEFAULT_BLOCK_SIZE for i in range(8))
+    with freeze_time("2000-01-02"):
+        await workspace.touch("/foo.txt")
+        await workspace.write_bytes("/foo.txt", data)
+    with freeze_time("2000-01-03"):
+        await workspace.sync()
+    with freeze_time("2000-01-04"):
+        await workspace2.sync()
+
+    foo_id = await workspace2.path_id("/foo.txt")
+    manifest = await workspace2.local_storage.get_manifest(foo_id)
+    accesses = [chunk.access for chunks in manifest.blocks for chunk in chunks]
+    assert len(accesses) == 8
+    local_storage = workspace2.local_storage
+    read_size = DEFAULT_BLOCK_SIZE // 4
+
+    # Random access doesn't trigger any read-ahead
+    async with await workspace2.open_file("/foo.txt", "rb") as f:
+        await f.seek(6 * DEFAULT_BLOCK_SIZE)
+        assert await f.read(read_size) == data[6 * DEFAULT_BLOCK_SIZE :][:read_size]
+    await trio.testing.wait_all_tasks_blocked()
+    assert [await local_storage.is_clean_block(access.id) for access in accesses] == [
+        False,
+        False,
+        False,
+        False,
+        False,
+        False,
+        True,
+        False,
+    ]
+
+    # Sequential reads fetch the next blocks in the background
+    async with await workspace2.open_file("/foo.txt", "rb") as f:
+        for i in range(3):
+            assert await f.read(read_size) == data[i * read_size : (i + 1) * read_size]
+
+        with trio.fail_after(1):
+            while not all(
+                [await local_storage.is_clean_block(access.id) for access in accesses[:5]]
+            ):
+                await trio.sleep(0.01)
+
+        # The read-ahead window is bounded
+        assert not await local_storage.is_clean_block(accesses[7].id)
+        assert await f.read() == data[3 * read_size :]
+
+
+@pytest.mark.trio
+async def test_upload_blocks_concurrently(running_backend, alice_user_fs, alice2_user_fs):
+    with freeze_time("2000-01-01"):
+        wid = await create_shared_workspace("w", alice_user_fs, alice2_user_fs)
+    workspace = alice_user_fs.get_workspace(wid)
+
+    data = b"".join(bytes([i]) * DEFAULT_BLOCK_SIZE for i in range(6))
+    with freeze_time("2000-01-02"):
+        await workspace.touch("/foo.txt")
+        await workspace.write_bytes("/foo.txt", data)
+
+    remote_loader = workspace.remote_loader
+    vanilla_block_create = remote_loader.backend_cmds.block_create
+    uploaded = []
+    calls = 0
+    offline = True
+    in_flight = 0
+    max_in_flight = 0
+
+    async def mocked_block_create(block_id, *args, **kwargs):
+        nonlocal in_flight, max_in_flight, calls
+        calls += 1
+        in_flight += 1
+        max_in_flight = max(in_flight, max_in_flight)
+        try:
+            # Simulate a connection lost in the middle of the upload
+            if offline and calls > 4:
+                raise BackendNotAvailable()
+            await trio.sleep(0.01)
+            rep = await vanilla_block_create(block_id, *args, **kwargs)
+            uploaded.append(block_id)
+            return rep
+        finally:
+            in_flight -= 1
+
+    remote_loader.backend_cmds.block_create = mocked_block_create
+    try:
+        with freeze_time("2000-01-03"):
+            with pytest.raises(FSBackendOfflineError):
+                await workspace.sync()
+        assert max_in_flight > 1
+        partially_uploaded = list(uploaded)
+        assert 0 < len(partially_uploaded) < 6
+
+        # The next sync only uploads the remaining blocks
+        offline = False
+        uploaded.clear()
+        with freeze_time("2000-01-04"):
+            await workspace.sync()
+    finally:
+        del remote_loader.backend_cmds.block_create
+
+    assert len(partially_uploaded) + len(uploaded) == 6
+    assert not set(partially_uploaded) & set(uploaded)
+
+    workspace2 = alice2_user_fs.get_workspace(wid)
+    with freeze_time("2000-01-05"):
+        await workspace2.sync()
+    assert await workspace2.read_bytes("/foo.txt") == data
+
+
 # TODO: test data/manifest updated between failed and new syncs
@@ -1,9 +1,11 @@
 # Parsec Cloud (https://parsec.cloud) Copyright (c) AGPLv3 2019 Scille SAS
 
 import pytest
+import trio
 from uuid import uuid4
 from pendulum import Pendulum
 from unittest.mock import ANY
+from async_generator import asynccontextmanager
 
 from parsec.api.data import UserManifest
 from parsec.core.types import (
@@ -11,8 +13,12 @@ from parsec.core.types import (
     WorkspaceRole,
     LocalUserManifest,
     LocalWorkspaceManifest,
+    LocalFileManifest,
+    BlockID,
 )
 from parsec.core.fs import FSWorkspaceNotFoundError, FSBackendOfflineError
+from parsec.core.fs.storage import WorkspaceStorage
+from parsec.core.fs.exceptions import FSInvalidFileDescriptor, FSLocalMissError
 
 from tests.common import freeze_time
 
@@ -124,6 +130,139 @@ async def test_create_workspace_same_name(alice_user_fs):
     assert [(x.id, x.name) for x in um.workspaces] == [(w1id, "w"), (w2id, "w")]
 
 
+@pytest.mark.trio
+async def test_workspace_storages_opened_lazily(user_fs_factory, alice):
+    async with user_fs_factory(alice) as user_fs:
+        w1id = await user_fs.workspace_create("w1")
+        w2id = await user_fs.workspace_create("w2")
+        w3id = await user_fs.workspace_create("w3")
+
+    async with user_fs_factory(alice) as user_fs:
+        workspaces = [user_fs.get_workspace(wid) for wid in (w1id, w2id, w3id)]
+        assert not any(w.local_storage.is_loaded for w in workspaces)
+
+        # First access opens the storage
+        assert await workspaces[0].listdir("/") == []
+        assert [w.local_storage.is_loaded for w in workspaces] == [True, False, False]
+
+        # Warm-up opens the remaining ones
+        await user_fs.load_workspace_storages([w2id, w3id])
+        assert all(w.local_storage.is_loaded for w in workspaces)
+        assert await workspaces[2].listdir("/") == []
+
+
+@pytest.mark.trio
+async def test_workspace_storages_opened_concurrently_with_bound(
+    monkeypatch, user_fs_factory, alice
+):
+    monkeypatch.setattr("parsec.core.fs.userfs.userfs.MAX_CONCURRENT_WORKSPACE_STORAGE_LOADS", 2)
+    async with user_fs_factory(alice) as user_fs:
+        wids = [await user_fs.workspace_create(f"w{i}") for i in range(5)]
+
+    opening = max_opening = 0
+    vanilla_run = WorkspaceStorage.run
+
+    @asynccontextmanager
+    async def _run(*args, **kwargs):
+        nonlocal opening, max_opening
+        opening += 1
+        max_opening = max(opening, max_opening)
+        await trio.sleep(0.01)
+        async with vanilla_run(*args, **kwargs) as storage:
+            opening -= 1
+            yield storage
+
+    monkeypatch.setattr(WorkspaceStorage, "run", _run)
+    async with user_fs_factory(alice) as user_fs:
+        workspaces = [user_fs.get_workspace(wid) for wid in wids]
+
+        # Both lazy loading and warm-up share the same bound
+        async with trio.open_nursery() as nursery:
+            nursery.start_soon(user_fs.load_workspace_storages, wids[:3])
+            for workspace in workspaces[3:]:
+                nursery.start_soon(workspace.path_info, "/")
+        assert all(w.local_storage.is_loaded for w in workspaces)
+        assert max_opening == 2
+
+
+@pytest.mark.trio
+async def test_workspace_storage_entry_points_with_unloaded_storage(user_fs_factory, alice):
+    async with user_fs_factory(alice) as user_fs:
+        wid = await user_fs.workspace_create("w")
+
+    async def _check(user_fs, call):
+        local_storage = user_fs.get_workspace(wid).local_storage
+        assert not local_storage.is_loaded
+        result = await call(local_storage)
+        assert local_storage.is_loaded
+        return result
+
+    async def _get_realm_checkpoint(local_storage):
+        assert await local_storage.get_realm_checkpoint() == 0
+
+    async def _get_need_sync_entries(local_storage):
+        assert await local_storage.get_need_sync_entries() == ({wid}, set())
+
+    async def _get_manifest(local_storage):
+        assert (await local_storage.get_manifest(wid)).id == wid
+
+    async def _get_missing_manifest_ids(local_storage):
+        assert await local_storage.get_missing_manifest_ids([wid]) == []
+
+    async def _lock_manifest(local_storage):
+        async with local_storage.lock_manifest(wid) as manifest:
+            await local_storage.set_manifest(wid, manifest)
+            await local_storage.ensure_manifest_persistent(wid)
+
+    async def _is_clean_block(local_storage):
+        assert not await local_storage.is_clean_block(BlockID())
+
+    async def _run_vacuum(local_storage):
+        await local_storage.run_vacuum()
+
+    async def _clear_memory_cache(local_storage):
+        await local_storage.clear_memory_cache()
+
+    async def _to_timestamped(local_storage):
+        timestamped = local_storage.to_timestamped(Pendulum.now())
+        assert not local_storage.is_loaded
+        # Timestamped manifests are only fetched from the backend
+        with pytest.raises(FSLocalMissError):
+            await timestamped.get_manifest(wid)
+        assert timestamped.is_loaded
+
+    for call in (
+        _get_realm_checkpoint,
+        _get_need_sync_entries,
+        _get_manifest,
+        _get_missing_manifest_ids,
+        _lock_manifest,
+        _is_clean_block,
+        _run_vacuum,
+        _clear_memory_cache,
+        _to_timestamped,
+    ):
+        async with user_fs_factory(alice) as user_fs:
+            await _check(user_fs, call)
+
+    # File descriptors do not need the storage to be loaded
+    async with user_fs_factory(alice) as user_fs:
+        local_storage = user_fs.get_workspace(wid).local_storage
+        manifest = LocalFileManifest.new_placeholder(parent=wid)
+        fd = local_storage.create_file_descriptor(manifest)
+        local_storage.remove_file_descriptor(fd)
+        with pytest.raises(FSInvalidFileDescriptor):
+            local_storage.remove_file_descriptor(fd)
+        with pytest.raises(FSInvalidFileDescriptor):
+            await local_storage.load_file_descriptor(fd)
+        assert not local_storage.is_loaded
+
+        fd = local_storage.create_file_descriptor(manifest)
+        async with local_storage.lock_entry_id(manifest.id):
+            await local_storage.set_manifest(manifest.id, manifest)
+        assert await local_storage.load_file_descriptor(fd) == manifest
+
+
 @pytest.mark.trio
 async def test_sync_offline(running_backend, alice_user_fs):
     with freeze_time("2000-01-02"):
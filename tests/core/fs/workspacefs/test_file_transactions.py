@@ -161,6 +161,37 @@ async def test_flush_file(alice_file_transactions, foo_txt):
     )
 
 
+@pytest.mark.trio
+async def test_read_decrypts_chunks_once(alice_file_transactions, foo_txt):
+    file_transactions = alice_file_transactions
+    local_storage = file_transactions.local_storage
+    fd = foo_txt.open()
+    await file_transactions.fd_write(fd, b"hello world !", 0)
+
+    get_chunk_calls = []
+    vanilla_get_chunk = local_storage.get_chunk
+
+    async def _get_chunk(chunk_id):
+        get_chunk_calls.append(chunk_id)
+        return await vanilla_get_chunk(chunk_id)
+
+    local_storage.get_chunk = _get_chunk
+
+    # Repeated reads within the same chunk are served from the file descriptor cache
+    data = await file_transactions.fd_read(fd, 5, 0)
+    assert data == b"hello"
+    assert isinstance(data, bytes)
+    assert await file_transactions.fd_read(fd, 8, 5) == b" world !"
+    assert len(get_chunk_calls) == 1
+
+    # The cache is bound to the file descriptor
+    await file_transactions.fd_close(fd)
+    fd = foo_txt.open()
+    assert await file_transactions.fd_read(fd, 13, 0) == b"hello world !"
+    assert len(get_chunk_calls) == 2
+    await file_transactions.fd_close(fd)
+
+
 @pytest.mark.trio
 async def test_block_not_loaded_entry(alice_file_transactions, foo_txt):
     file_transactions = alice_file_transactions
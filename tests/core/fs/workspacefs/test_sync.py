@@ -93,3 +93,122 @@ async def test_sync_by_id_couple(alice_workspace, bob_workspace):
     expected = [FsPath("/a"), FsPath("/b")]
     assert await bob_workspace.listdir("/") == expected
     assert await alice_workspace.listdir("/") == expected
+
+
+@pytest.fixture
+def bob_backend_cmds_spy(monkeypatch, bob_workspace):
+    cmds = []
+    vanilla_backend_cmds = bob_workspace.remote_loader._backend_cmds
+
+    async def _backend_cmds(cmd, *args, **kwargs):
+        if cmd.startswith(("vlob_", "block_")):
+            cmds.append(cmd)
+        return await vanilla_backend_cmds(cmd, *args, **kwargs)
+
+    monkeypatch.setattr(bob_workspace.remote_loader, "_backend_cmds", _backend_cmds)
+    return cmds
+
+
+@pytest.mark.trio
+async def test_manifests_and_blocks_loaded_in_batch(
+    alice_workspace, bob_workspace, bob_backend_cmds_spy
+):
+    names = [f"f{i}" for i in range(10)]
+    await alice_workspace.mkdir("/d")
+    for name in names:
+        await alice_workspace.touch(f"/d/{name}")
+        await alice_workspace.write_bytes(f"/d/{name}", name.encode())
+    await alice_workspace.sync()
+
+    # Bob lists the cold directories
+    assert await bob_workspace.listdir("/") == [FsPath("/d")]
+    assert bob_backend_cmds_spy == ["vlob_read", "vlob_read_batch"]
+    bob_backend_cmds_spy.clear()
+    assert await bob_workspace.listdir("/d") == [FsPath(f"/d/{name}") for name in names]
+    assert bob_backend_cmds_spy == ["vlob_read_batch"]
+
+    # Children have been fetched along with the listing
+    bob_backend_cmds_spy.clear()
+    for name in names:
+        assert await bob_workspace.is_file(f"/d/{name}")
+    assert bob_backend_cmds_spy == []
+
+    # Listing a warm directory doesn't load each child manifest
+    d_id = await bob_workspace.path_id("/d")
+    loaded = []
+    vanilla_get_manifest = bob_workspace.local_storage.get_manifest
+
+    async def _get_manifest(entry_id):
+        loaded.append(entry_id)
+        return await vanilla_get_manifest(entry_id)
+
+    bob_workspace.local_storage.get_manifest = _get_manifest
+    try:
+        assert await bob_workspace.listdir("/d") == [FsPath(f"/d/{name}") for name in names]
+    finally:
+        del bob_workspace.local_storage.get_manifest
+    assert set(loaded) == {bob_workspace.workspace_id, d_id}
+    assert bob_backend_cmds_spy == []
+
+    # Small blocks are downloaded together
+    manifests = await bob_workspace.remote_loader.load_manifests(
+        [await bob_workspace.path_id(f"/d/{name}") for name in names]
+    )
+    accesses = [access for manifest in manifests.values() for access in manifest.blocks]
+    bob_backend_cmds_spy.clear()
+    await bob_workspace.remote_loader.load_blocks(accesses)
+    assert bob_backend_cmds_spy == ["block_read_batch"]
+    for name in names:
+        assert await bob_workspace.read_bytes(f"/d/{name}") == name.encode()
+
+    # Recursive sync loads the children manifests in batch
+    for name in names:
+        await alice_workspace.write_bytes(f"/d/{name}", b"updated")
+    await alice_workspace.sync()
+    bob_backend_cmds_spy.clear()
+    await bob_workspace.sync()
+    assert bob_backend_cmds_spy == ["vlob_read", "vlob_read_batch", "vlob_read_batch"]
+    for name in names:
+        assert await bob_workspace.read_bytes(f"/d/{name}") == b"updated"
+
+
+@pytest.mark.trio
+async def test_sync_with_outdated_prefetched_manifest(alice_workspace, bob_workspace, monkeypatch):
+    await alice_workspace.mkdir("/d")
+    await alice_workspace.touch("/d/f")
+    await alice_workspace.write_bytes("/d/f", b"v1")
+    await alice_workspace.sync()
+    await bob_workspace.sync()
+    f_id = await bob_workspace.path_id("/d/f")
+
+    await alice_workspace.write_bytes("/d/f", b"v2")
+    await alice_workspace.sync()
+    vanilla_load_manifests = bob_workspace.remote_loader.load_manifests
+
+    async def _load_manifests(entry_ids):
+        manifests = await vanilla_load_manifests(entry_ids)
+        if f_id in manifests:
+            # Entry gets synchronized with a newer version once the batch is downloaded
+            await alice_workspace.write_bytes("/d/f", b"v3")
+            await alice_workspace.sync()
+            await bob_workspace.sync_by_id(f_id)
+        return manifests
+
+    synced_manifests = []
+    vanilla_sync_by_id = bob_workspace._sync_by_id
+
+    async def _sync_by_id(entry_id, *args, **kwargs):
+        manifest = await vanilla_sync_by_id(entry_id, *args, **kwargs)
+        if entry_id == f_id:
+            synced_manifests.append(manifest)
+        return manifest
+
+    monkeypatch.setattr(bob_workspace.remote_loader, "load_manifests", _load_manifests)
+    monkeypatch.setattr(bob_workspace, "_sync_by_id", _sync_by_id)
+    await bob_workspace.sync()
+    assert await bob_workspace.read_bytes("/d/f") == b"v3"
+    f_manifest = await bob_workspace.local_storage.get_manifest(f_id)
+    assert not f_manifest.need_sync
+
+    # The outdated prefetched manifest has been downloaded again
+    assert [manifest.version for manifest in synced_manifests] == [f_manifest.base_version] * 2
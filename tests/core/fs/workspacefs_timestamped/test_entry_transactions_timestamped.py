@@ -61,7 +61,8 @@ async def test_rename(alice_workspace_t4):
 @pytest.mark.trio
 async def test_access_not_loaded_entry(alice_workspace_t4):
     entry_id = alice_workspace_t4.transactions.get_workspace_entry().id
-    alice_workspace_t4.transactions.local_storage._cache.clear()
+    local_storage = await alice_workspace_t4.transactions.local_storage.load()
+    local_storage._cache.clear()
     with pytest.raises(FSLocalMissError):
         await alice_workspace_t4.transactions.local_storage.get_manifest(entry_id)
     await alice_workspace_t4.transactions.entry_info(FsPath("/"))
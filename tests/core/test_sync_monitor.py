@@ -2,9 +2,12 @@
 
 import trio
 import pytest
+from time import perf_counter
 from unittest.mock import ANY
 
+from parsec.core.types import EntryID
 from parsec.core.backend_connection import BackendConnStatus
+from parsec.core.sync_monitor import SyncContext, MIN_WAIT, TICK_MAX_DURATION
 from parsec.backend.backend_events import BackendEvent
 from parsec.core.core_events import CoreEvent
 
@@ -152,9 +155,14 @@ async def test_autosync_on_remote_modifications(
 
 
 @pytest.mark.trio
+@pytest.mark.parametrize("paginated", [False, True])
 async def test_reconnect_with_remote_changes(
-    autojump_clock, alice2, running_backend, alice_core, alice2_user_fs
+    autojump_clock, monkeypatch, alice2, running_backend, alice_core, alice2_user_fs, paginated
 ):
+    if paginated:
+        # Changes are fetched one at a time
+        monkeypatch.setattr("parsec.core.sync_monitor.VLOB_POLL_CHANGES_MAX_LIMIT", 1)
+
     wid = await alice_core.user_fs.workspace_create("w")
     alice_w = alice_core.user_fs.get_workspace(wid)
     await alice_w.mkdir("/foo")
@@ -231,3 +239,158 @@ async def test_reconnect_with_remote_changes(
             in_order=False,
             timeout=60,  # autojump, so not *really* 60s
         )
+
+
+class SyncContextTester(SyncContext):
+    """
+    Sync context with no workspace behind it, only recording the sync calls
+    """
+
+    def __init__(self, max_concurrency):
+        super().__init__(user_fs=None, id=EntryID(), max_concurrency=max_concurrency)
+        self._changes_loaded = True
+        self.durations = {}
+        self.started = []
+        self.synced = []
+        self.running = 0
+        self.max_running = 0
+        self.vacuumed = 0
+
+    async def _sync(self, entry_id):
+        self.started.append(entry_id)
+        self.running += 1
+        self.max_running = max(self.max_running, self.running)
+        await trio.sleep(self.durations.get(entry_id, 0.1))
+        self.running -= 1
+        self.synced.append(entry_id)
+
+    def _get_local_storage(self):
+        return self
+
+    async def run_vacuum(self):
+        self.vacuumed += 1
+
+
+@pytest.mark.trio
+async def test_sync_context_concurrent_tick(autojump_clock):
+    ctx = SyncContextTester(max_concurrency=3)
+    local_ids = [EntryID() for _ in range(4)]
+    remote_id = EntryID()
+    for entry_id in local_ids:
+        ctx.set_local_change(entry_id)
+        await trio.sleep(0.01)
+    ctx.set_remote_change(remote_id)
+    assert ctx.queue_depth == 5
+
+    # Remote change is due right away, local changes are not yet due
+    await ctx.tick()
+    assert ctx.synced == [remote_id]
+    assert ctx.queue_depth == 4
+
+    await trio.sleep(MIN_WAIT)
+    await ctx.tick()
+    assert ctx.max_running == 3
+    # Local changes are synced according to their due time
+    assert ctx.started[1:] == local_ids
+    assert ctx.queue_depth == 0
+    assert ctx.vacuumed == 1
+    assert ctx.synced_count == 5
+    assert ctx.throughput > 0
+
+
+@pytest.mark.trio
+async def test_sync_context_remote_changes_before_local_changes(autojump_clock):
+    ctx = SyncContextTester(max_concurrency=2)
+    local_id = EntryID()
+    ctx.set_local_change(local_id)
+    await trio.sleep(MIN_WAIT)
+    remote_ids = {EntryID() for _ in range(3)}
+    for entry_id in remote_ids:
+        ctx.set_remote_change(entry_id)
+
+    await ctx.tick()
+    assert set(ctx.started[:3]) == remote_ids
+    assert ctx.started[3] == local_id
+    assert set(ctx.synced) == {*remote_ids, local_id}
+
+
+@pytest.mark.trio
+async def test_sync_context_slow_entry_does_not_hold_others(autojump_clock):
+    ctx = SyncContextTester(max_concurrency=2)
+    slow_id = EntryID()
+    ctx.durations[slow_id] = 0.5
+    ctx.set_local_change(slow_id)
+    await trio.sleep(0.01)
+    fast_ids = [EntryID() for _ in range(4)]
+    for entry_id in fast_ids:
+        ctx.set_local_change(entry_id)
+    await trio.sleep(MIN_WAIT)
+
+    # The other worker keeps pulling the due entries meanwhile
+    start = trio.current_time()
+    await ctx.tick()
+    assert trio.current_time() - start == pytest.approx(0.5)
+    assert set(ctx.synced[:4]) == set(fast_ids)
+    assert ctx.synced[4] == slow_id
+    assert ctx.queue_depth == 0
+
+
+@pytest.mark.trio
+async def test_sync_context_tick_duration_is_bounded(autojump_clock):
+    ctx = SyncContextTester(max_concurrency=1)
+    entry_ids = [EntryID() for _ in range(2 * int(TICK_MAX_DURATION / 0.1))]
+    for entry_id in entry_ids:
+        ctx.set_local_change(entry_id)
+    await trio.sleep(MIN_WAIT)
+
+    # Due entries are left to the next tick once the tick has lasted long enough
+    await ctx.tick()
+    assert 0 < ctx.queue_depth < len(entry_ids)
+    assert await ctx.tick() == float("inf")
+    assert set(ctx.synced) == set(entry_ids)
+
+
+@pytest.mark.trio
+async def test_sync_context_postponed_local_change(autojump_clock):
+    ctx = SyncContextTester(max_concurrency=1)
+    first_id = EntryID()
+    second_id = EntryID()
+    ctx.set_local_change(first_id)
+    ctx.set_local_change(second_id)
+
+    # Modifying an entry postpones its sync
+    await trio.sleep(MIN_WAIT / 2)
+    ctx.set_local_change(first_id)
+    await trio.sleep(MIN_WAIT / 2)
+    assert await ctx.tick() > trio.current_time()
+    assert ctx.synced == [second_id]
+
+    await trio.sleep(MIN_WAIT / 2)
+    assert await ctx.tick() == float("inf")
+    assert ctx.synced == [second_id, first_id]
+
+
+@pytest.mark.slow
+@pytest.mark.trio
+@pytest.mark.parametrize("max_concurrency", [1, 8])
+async def test_bench_sync_context_scheduling(autojump_clock, max_concurrency):
+    # Bulk import of many files: scheduling cost must not grow with the queue
+    entries_count = 50000
+
+    ctx = SyncContextTester(max_concurrency=max_concurrency)
+    for _ in range(entries_count):
+        ctx.set_local_change(EntryID())
+    await trio.sleep(MIN_WAIT)
+
+    ticks = 0
+    start = perf_counter()
+    while ctx.queue_depth:
+        await ctx.tick()
+        ticks += 1
+    duration = perf_counter() - start
+
+    assert len(ctx.synced) == entries_count
+    print(
+        f"max_concurrency={max_concurrency}: {ticks} ticks in {duration:.2f}s "
+        f"({entries_count / duration:.0f} entries/s)"
+    )
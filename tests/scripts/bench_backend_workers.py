@@ -0,0 +1,132 @@
+#! /usr/bin/env python3
+# Parsec Cloud (https://parsec.cloud) Copyright (c) AGPLv3 2019 Scille SAS
+
+"""
+Benchmark of the backend connection and request throughput depending on
+the number of backend worker processes (i.e. `parsec backend run --workers N`).
+
+    $ python tests/scripts/bench_backend_workers.py --db postgresql://<...> [--workers 1,2,4]
+
+The database must have been migrated (see `parsec backend migrate`). The load
+is generated by multiple processes to avoid the client being the bottleneck.
+"""
+
+import os
+import sys
+import trio
+import socket
+import argparse
+import subprocess
+import multiprocessing
+from time import sleep, monotonic
+
+from parsec.logging import configure_logging
+from parsec.api.protocol import OrganizationID
+from parsec.core.types import BackendAddr
+from parsec.core.backend_connection import apiv1_backend_administration_cmds_factory
+
+
+ADMINISTRATION_TOKEN = "s3cr3t"
+# Unknown organization, so the requests are cheap for the database
+ORGANIZATION_ID = OrganizationID("BenchOrg")
+
+
+async def _load(addr, clients, duration, reuse_connection):
+    done = 0
+    deadline = trio.current_time() + duration
+
+    async def _client():
+        nonlocal done
+        if reuse_connection:
+            async with apiv1_backend_administration_cmds_factory(
+                addr, ADMINISTRATION_TOKEN
+            ) as cmds:
+                while trio.current_time() < deadline:
+                    await cmds.organization_status(ORGANIZATION_ID)
+                    done += 1
+        else:
+            while trio.current_time() < deadline:
+                async with apiv1_backend_administration_cmds_factory(
+                    addr, ADMINISTRATION_TOKEN
+                ) as cmds:
+                    await cmds.organization_status(ORGANIZATION_ID)
+                done += 1
+
+    async with trio.open_nursery() as nursery:
+        for _ in range(clients):
+            nursery.start_soon(_client)
+    return done
+
+
+def _run_load_process(args):
+    url, clients, duration, reuse_connection = args
+    configure_logging(log_level="WARNING")
+    return trio.run(_load, BackendAddr.from_url(url), clients, duration, reuse_connection)
+
+
+def _wait_for_port(port, timeout=30):
+    before = monotonic()
+    while True:
+        try:
+            with socket.create_connection(("127.0.0.1", port)):
+                return
+        except OSError:
+            if monotonic() - before > timeout:
+                raise RuntimeError("Backend took too much time to start")
+            sleep(0.1)
+
+
+def bench(db, workers, port, client_processes, clients, duration):
+    cmd = [
+        sys.executable,
+        "-m",
+        "parsec.cli",
+        "backend",
+        "run",
+        f"--db={db}",
+        "--blockstore=POSTGRESQL",
+        f"--administration-token={ADMINISTRATION_TOKEN}",
+        f"--port={port}",
+        f"--workers={workers}",
+    ]
+    backend = subprocess.Popen(cmd, stdout=subprocess.DEVNULL)
+    try:
+        _wait_for_port(port)
+        url = f"parsec://127.0.0.1:{port}?no_ssl=true"
+        clients_per_process = max(clients // client_processes, 1)
+        results = {}
+        with multiprocessing.get_context("spawn").Pool(client_processes) as pool:
+            for name, reuse_connection in (("connections", False), ("requests", True)):
+                counts = pool.map(
+                    _run_load_process,
+                    [(url, clients_per_process, duration, reuse_connection)] * client_processes,
+                )
+                results[name] = sum(counts) / duration
+        return results
+
+    finally:
+        backend.terminate()
+        backend.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backend workers throughput benchmark")
+    parser.add_argument("--db", required=True, help="PostgreSQL url")
+    parser.add_argument("--workers", default=f"1,{os.cpu_count()}")
+    parser.add_argument("--port", type=int, default=6888)
+    parser.add_argument("--client-processes", type=int, default=os.cpu_count())
+    parser.add_argument("--clients", type=int, default=64)
+    parser.add_argument("--duration", type=float, default=5)
+    args = parser.parse_args()
+
+    print(f"{args.clients} clients for {args.duration}s on {os.cpu_count()} cores")
+    print(f"{'workers':>8} {'connections/s':>14} {'requests/s':>12}")
+    for workers in sorted({int(x) for x in args.workers.split(",")}):
+        results = bench(
+            args.db, workers, args.port, args.client_processes, args.clients, args.duration
+        )
+        print(f"{workers:>8} {results['connections']:>14.0f} {results['requests']:>12.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+#! /usr/bin/env python3
+# Parsec Cloud (https://parsec.cloud) Copyright (c) AGPLv3 2019 Scille SAS
+
+"""
+Benchmark of the logged core startup for a user with many workspaces.
+
+    $ python tests/scripts/bench_core_startup.py [--workspaces 10,100,300]
+
+A mocked backend is run in the same process. Are measured:
+- offline: `logged_core_factory` startup when the backend is not reachable
+- startup: `logged_core_factory` startup with the backend reachable
+- ready: time until the backend connection is ready, i.e. the sync monitor
+  has bootstrapped all the workspaces (which requires their local storage)
+- idle: time until the monitors are done processing the initial changes
+"""
+
+import trio
+import argparse
+import tempfile
+from pathlib import Path
+from functools import partial
+from time import perf_counter
+
+from parsec.logging import configure_logging
+from parsec.api.protocol import OrganizationID
+from parsec.backend.app import backend_app_factory
+from parsec.backend.config import BackendConfig, MockedBlockStoreConfig
+from parsec.core.types import BackendAddr, BackendOrganizationAddr
+from parsec.core.types import BackendOrganizationBootstrapAddr
+from parsec.core.config import config_factory
+from parsec.core.core_events import CoreEvent
+from parsec.core.backend_connection import BackendConnStatus, apiv1_backend_anonymous_cmds_factory
+from parsec.core.invite import bootstrap_organization
+from parsec.core.logged_core import logged_core_factory
+
+
+ORGANIZATION_ID = OrganizationID("BenchOrg")
+BOOTSTRAP_TOKEN = "123456"
+BACKEND_CONFIG = BackendConfig(
+    administration_token="s3cr3t",
+    db_url="MOCKED",
+    db_drop_deleted_data=False,
+    db_min_connections=1,
+    db_max_connections=1,
+    blockstore_config=MockedBlockStoreConfig(),
+    email_config=None,
+    backend_addr=None,
+    debug=False,
+)
+
+
+async def _bootstrap_device(backend, backend_addr):
+    await backend.organization.create(ORGANIZATION_ID, BOOTSTRAP_TOKEN, expiration_date=None)
+    bootstrap_addr = BackendOrganizationBootstrapAddr.build(
+        backend_addr, ORGANIZATION_ID, BOOTSTRAP_TOKEN
+    )
+    async with apiv1_backend_anonymous_cmds_factory(bootstrap_addr) as cmds:
+        return await bootstrap_organization(cmds, human_handle=None, device_label=None)
+
+
+async def _wait_ready(core):
+    ready = trio.Event()
+
+    def _on_connection_changed(event, status, status_exc):
+        if status == BackendConnStatus.READY:
+            ready.set()
+
+    with core.event_bus.connect_in_context(
+        (CoreEvent.BACKEND_CONNECTION_CHANGED, _on_connection_changed)
+    ):
+        if core.backend_status != BackendConnStatus.READY:
+            await ready.wait()
+
+
+async def _wait_idle(core):
+    await _wait_ready(core)
+    await core.wait_idle_monitors()
+
+
+async def bench(path, nb_workspaces):
+    config = config_factory(
+        config_dir=path / "config", data_base_dir=path / "data", cache_base_dir=path / "cache"
+    )
+    results = {}
+
+    async with backend_app_factory(BACKEND_CONFIG) as backend:
+        async with trio.open_service_nursery() as nursery:
+            listeners = await nursery.start(
+                partial(trio.serve_tcp, backend.handle_client, 0, host="127.0.0.1")
+            )
+            port = listeners[0].socket.getsockname()[1]
+            backend_addr = BackendAddr.from_url(f"parsec://127.0.0.1:{port}?no_ssl=true")
+            device = await _bootstrap_device(backend, backend_addr)
+
+            async with logged_core_factory(config, device) as core:
+                for i in range(nb_workspaces):
+                    await core.user_fs.workspace_create(f"w{i}")
+                await core.user_fs.sync()
+                await _wait_idle(core)
+
+            # Same device, with a backend that cannot be reached
+            offline_device = device.evolve(
+                organization_addr=BackendOrganizationAddr.build(
+                    BackendAddr.from_url("parsec://127.0.0.1:1?no_ssl=true"),
+                    ORGANIZATION_ID,
+                    device.root_verify_key,
+                )
+            )
+            start = perf_counter()
+            async with logged_core_factory(config, offline_device):
+                results["offline"] = perf_counter() - start
+
+            start = perf_counter()
+            async with logged_core_factory(config, device) as core:
+                results["startup"] = perf_counter() - start
+                await _wait_ready(core)
+                results["ready"] = perf_counter() - start
+                await _wait_idle(core)
+                results["idle"] = perf_counter() - start
+
+            nursery.cancel_scope.cancel()
+
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Logged core startup benchmark")
+    parser.add_argument("--workspaces", default="10,100,300")
+    args = parser.parse_args()
+
+    configure_logging(log_level="WARNING")
+    print(f"{'workspaces':>10} {'offline':>10} {'startup':>10} {'ready':>10} {'idle':>10}")
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for nb_workspaces in map(int, args.workspaces.split(",")):
+            path = Path(tmpdir) / str(nb_workspaces)
+            results = trio.run(bench, path, nb_workspaces)
+            print(
+                f"{nb_workspaces:>10} "
+                + " ".join(
+                    f"{results[name] * 1000:>7.0f} ms"
+                    for name in ("offline", "startup", "ready", "idle")
+                )
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+#! /usr/bin/env python3
+# Parsec Cloud (https://parsec.cloud) Copyright (c) AGPLv3 2019 Scille SAS
+
+"""
+Benchmark of the local persistence of a modification in a large folder.
+
+    $ python tests/scripts/bench_folder_manifest.py [--sizes 1000,10000,100000,1000000]
+
+For each folder size, a child is added then persisted a few times, with the
+incremental (delta) persistence and with a full rewrite of the manifest. The
+remote flattening (i.e. building the remote manifest to upload) is measured
+as well.
+"""
+
+import trio
+import argparse
+import tempfile
+from pathlib import Path
+from time import perf_counter
+
+from parsec.crypto import SigningKey
+from parsec.api.protocol import DeviceID, OrganizationID
+from parsec.core.types import EntryID, LocalFolderManifest, BackendAddr, BackendOrganizationAddr
+from parsec.core.local_device import generate_new_device
+from parsec.core.fs.storage import LocalDatabase, ManifestStorage
+from parsec.core.fs.storage import manifest_storage
+
+
+ORGANIZATION_ADDR = BackendOrganizationAddr.build(
+    BackendAddr.from_url("parsec://127.0.0.1"),
+    OrganizationID("BenchOrg"),
+    SigningKey.generate().verify_key,
+)
+
+
+async def bench(path, device, size, changes, incremental):
+    manifest = LocalFolderManifest.new_placeholder(EntryID())
+    manifest = manifest.evolve_children({f"file-{i:07}.txt": EntryID() for i in range(size)})
+    manifest_storage.FOLDER_DELTA_MIN_CHILDREN = 1000 if incremental else float("inf")
+
+    async with LocalDatabase.run(path) as localdb:
+        # No cache limit, otherwise the largest folders would be evicted (and
+        # hence fully rewritten) as soon as they are persisted
+        async with ManifestStorage.run(device, localdb, EntryID(), cache_size=None) as storage:
+            await storage.set_manifest(manifest.id, manifest)
+
+            persist_time = 0
+            flatten_time = 0
+            for i in range(changes):
+                manifest = manifest.evolve_children_and_mark_updated({f"new-{i}.txt": EntryID()})
+                start = perf_counter()
+                await storage.set_manifest(manifest.id, manifest)
+                persist_time += perf_counter() - start
+
+                start = perf_counter()
+                manifest.to_remote(author=device.device_id).dump_and_sign(device.signing_key)
+                flatten_time += perf_counter() - start
+
+            return persist_time / changes, flatten_time / changes
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Large folder manifest benchmark")
+    parser.add_argument("--sizes", default="1000,10000,100000,1000000")
+    parser.add_argument("--changes", type=int, default=10)
+    args = parser.parse_args()
+
+    device = generate_new_device(DeviceID("alice@laptop"), ORGANIZATION_ADDR)
+    print(f"Average over {args.changes} single child changes")
+    print(f"{'children':>10} {'full rewrite':>14} {'incremental':>14} {'flattening':>14}")
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for size in map(int, args.sizes.split(",")):
+            results = {}
+            for incremental in (False, True):
+                path = Path(tmpdir) / f"{size}-{incremental}.sqlite"
+                results[incremental] = trio.run(
+                    bench, path, device, size, args.changes, incremental
+                )
+            full, _ = results[False]
+            incremental, flattening = results[True]
+            print(
+                f"{size:>10} {full * 1000:>11.1f} ms {incremental * 1000:>11.1f} ms "
+                f"{flattening * 1000:>11.1f} ms"
+            )
+
+
+if __name__ == "__main__":
+    main()
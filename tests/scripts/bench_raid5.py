@@ -0,0 +1,68 @@
+#! /usr/bin/env python3
+# Parsec Cloud (https://parsec.cloud) Copyright (c) AGPLv3 2019 Scille SAS
+
+"""
+Micro-benchmark of the RAID5 blockstore parity engine.
+
+    $ python tests/scripts/bench_raid5.py [--repeat 20]
+
+Install numpy to benchmark the vectorized parity computation.
+"""
+
+import os
+import argparse
+from timeit import timeit
+
+from parsec.backend import raid5_blockstore
+from parsec.backend.raid5_blockstore import (
+    split_block_in_chunks,
+    generate_checksum_chunk,
+    rebuild_block_from_chunks,
+)
+
+
+BLOCK_SIZES = [4 * 1024, 64 * 1024, 512 * 1024, 4 * 1024 * 1024]
+NB_BLOCKSTORES = [3, 5, 9]
+
+
+def bench(block_size, nb_blockstores, repeat):
+    block = os.urandom(block_size)
+    nb_chunks = nb_blockstores - 1
+    chunks = split_block_in_chunks(block, nb_chunks)
+    checksum_chunk = generate_checksum_chunk(chunks)
+    partial_chunks = [None, *chunks[1:]]
+
+    def _rebuild():
+        rebuild_block_from_chunks(partial_chunks.copy(), checksum_chunk)
+
+    return {
+        "split": timeit(lambda: split_block_in_chunks(block, nb_chunks), number=repeat),
+        "checksum": timeit(lambda: generate_checksum_chunk(chunks), number=repeat),
+        "rebuild": timeit(_rebuild, number=repeat),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="RAID5 parity micro-benchmark")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    engine = "numpy" if raid5_blockstore.numpy is not None else "int"
+    print(f"Parity engine: {engine}, {args.repeat} runs per measure")
+    print(f"{'block size':>12} {'blockstores':>12} {'split':>12} {'checksum':>12} {'rebuild':>12}")
+    for block_size in BLOCK_SIZES:
+        for nb_blockstores in NB_BLOCKSTORES:
+            results = bench(block_size, nb_blockstores, args.repeat)
+            # Throughput in MB/s of block data processed
+            throughputs = [
+                block_size * args.repeat / results[name] / 1e6
+                for name in ("split", "checksum", "rebuild")
+            ]
+            print(
+                f"{block_size // 1024:>10}KB {nb_blockstores:>12} "
+                + " ".join(f"{throughput:>7.0f} MB/s" for throughput in throughputs)
+            )
+
+
+if __name__ == "__main__":
+    main()
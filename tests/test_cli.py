@@ -216,6 +216,49 @@ def test_migrate_backend(postgresql_url, unused_tcp_port):
         assert "100003_migration3.sql (already applied)" in result.output
 
 
+@pytest.mark.parametrize(
+    "db,blockstore",
+    [("MOCKED", "MOCKED"), ("postgresql://foo", "MOCKED"), ("MOCKED", "POSTGRESQL")],
+)
+def test_backend_workers_require_shared_storage(db, blockstore):
+    runner = CliRunner()
+    args = (
+        f"backend run --db={db} --blockstore={blockstore}"
+        " --administration-token=s3cr3t --workers=2"
+    )
+    result = runner.invoke(cli, args)
+    assert result.exit_code == 1
+    assert "--workers" in result.output
+
+
+@pytest.mark.slow
+@pytest.mark.skipif(os.name == "nt", reason="Hard to test on Windows...")
+def test_backend_run_with_workers(postgresql_url, unused_tcp_port):
+    administration_token = "9e57754ddfe62f7f8780edc0"
+    with _running(
+        (
+            f"backend run --db={postgresql_url} --blockstore=POSTGRESQL"
+            f" --administration-token={administration_token}"
+            f" --port={unused_tcp_port} --workers=2"
+        ),
+        wait_for="Starting Parsec Backend",
+    ):
+        # Give some time for the workers to start
+        sleep(2)
+        admin_url = f"parsec://localhost:{unused_tcp_port}?no_ssl=true"
+        _run(
+            f"core create_organization org --addr={admin_url}"
+            f" --administration-token={administration_token}"
+        )
+        # Each connection is served by any of the workers, which all share the same data
+        for _ in range(4):
+            p = _run(
+                f"core status_organization org --addr={admin_url}"
+                f" --administration-token={administration_token}"
+            )
+            assert "is_bootstrapped: False" in p.stdout.decode()
+
+
 @pytest.fixture(params=(False, True), ids=("no_ssl", "ssl"))
 def ssl_conf(request):
     @attr.s